@@ -0,0 +1,169 @@
+import os
+import re
+from collections import namedtuple
+
+# ------------ Types ------------
+# `pattern` is a regex without capturing groups (use (?:...)); per-rule flags go
+# inline, e.g. (?i:...). Patterns are only tried where no word character
+# precedes (see Anonymizer), so they should match from the start of a token.
+Rule = namedtuple("Rule", "name pattern replacement")
+# start/end index the input text, out_start/out_end the redacted text
+Span = namedtuple("Span", "rule start end original replacement out_start out_end")
+Redaction = namedtuple("Redaction", "text spans")
+
+# ------------ Rule builders ------------
+def _char_pattern(ch: str) -> str:
+    # explicit [xX] classes: sre's IGNORECASE matching is markedly slower
+    if ch.lower() != ch.upper():
+        return f"[{re.escape(ch.lower())}{re.escape(ch.upper())}]"
+    return re.escape(ch)
+
+def _trie_pattern(words) -> str:
+    """
+    Case-insensitive regex alternation factored as a prefix trie, so a long
+    word list costs one character test per position instead of one attempt
+    per word (the Aho-Corasick idea, within a single regex).
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w.lower():
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        ends_here = "" in node
+        alts = [_char_pattern(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if ends_here else body
+
+    return build(trie)
+
+def word_list_rule(name: str, words, replacement: str) -> Rule:
+    """Case-insensitive whole-word match against a dictionary (locations, names, ...)."""
+    words = [w.strip() for w in words if w and w.strip()]
+    return Rule(name, rf"\b{_trie_pattern(words)}\b", replacement)
+
+def load_word_list(path: str) -> list:
+    """One entry per line; blank lines and #comments ignored."""
+    with open(path, encoding="utf-8") as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+
+# ------------ Rule sets ------------
+LOCATION_WORDS = (
+    "qatar", "india", "germany", "usa", "u.s.a", "uk", "u.k", "england", "canada", "uae",
+    "dubai", "saudi", "australia", "singapore", "france", "italy", "spain",
+)
+
+EXTENDED_LOCATION_WORDS = (
+    "pakistan", "bangladesh", "nigeria", "egypt", "kenya", "south africa", "brazil", "mexico",
+    "argentina", "china", "japan", "korea", "philippines", "indonesia", "vietnam", "turkey",
+    "russia", "ukraine", "poland", "netherlands", "ireland", "scotland", "sweden", "norway",
+    "london", "new york", "bangalore", "bengaluru", "mumbai", "delhi", "doha", "abu dhabi",
+    "riyadh", "toronto", "sydney", "berlin", "paris", "madrid",
+)
+
+# Order matters: at the same position, earlier rules win.
+DEFAULT_RULES = (
+    Rule("email", r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", "[EMAIL]"),
+    Rule("profile", r"(?i:https?://(?:www\.)?(?:linkedin|github|gitlab|twitter|x)\.[^\s]+)", "[PROFILE]"),
+    Rule("phone", r"\+?\d[\d\s().-]{7,}\d", "[PHONE]"),
+    Rule("year", r"\b(?:19|20)\d{2}\b", "[YEAR]"),
+    word_list_rule("location", LOCATION_WORDS, "[LOCATION]"),
+    Rule("name", r"\b[A-Z][a-z]{2,15}\s[A-Z][a-z]{2,15}\b", "Candidate"),
+)
+
+RULE_SETS = {
+    "default": DEFAULT_RULES,
+    "extended_locations": (word_list_rule("location", EXTENDED_LOCATION_WORDS, "[LOCATION]"),),
+}
+
+def register_rule_set(name: str, rules) -> None:
+    """Make a rule set selectable through ANON_RULE_SETS."""
+    RULE_SETS[name] = tuple(rules)
+
+# ------------ Engine ------------
+_FIRST_LINE_NAME = re.compile(r"\s*[A-Z][\w'.-]+(?:\s+[A-Z][\w'.-]+){1,3}\s*")
+
+class Anonymizer:
+    """
+    Single-pass redaction: every rule is merged into one compiled alternation
+    and the input is scanned once. Rules are tried in the order given, and
+    only at positions not preceded by a word character; that gate lets the
+    scanner skip the inside of words (most of the text) with one check.
+    """
+
+    def __init__(self, rules, *, first_line_name: bool = True):
+        self.rules = tuple(rules)
+        self.first_line_name = first_line_name
+        self._by_group = {}
+        parts = []
+        for i, rule in enumerate(self.rules):
+            group = f"r{i}"
+            self._by_group[group] = rule
+            parts.append(f"(?P<{group}>{rule.pattern})")
+        self._regex = re.compile(r"(?<!\w)(?:" + "|".join(parts) + ")") if parts else None
+
+    def redact(self, text: str) -> Redaction:
+        spans = []
+        out = []
+        pos = 0
+        out_len = 0
+
+        if self.first_line_name and text:
+            # resumes open with the candidate's name; only redact a line that looks like one
+            end = text.find("\n")
+            end = len(text) if end == -1 else end
+            if _FIRST_LINE_NAME.fullmatch(text[:end]) and not any(c.isdigit() for c in text[:end]):
+                out.append("Candidate")
+                spans.append(Span("first_line_name", 0, end, text[:end], "Candidate", 0, 9))
+                pos = end
+                out_len = 9
+
+        if self._regex is not None:
+            by_group = self._by_group
+            for m in self._regex.finditer(text, pos):
+                rule = by_group[m.lastgroup]
+                start, end = m.span()
+                if start > pos:
+                    out.append(text[pos:start])
+                    out_len += start - pos
+                out.append(rule.replacement)
+                spans.append(Span(rule.name, start, end, m.group(), rule.replacement,
+                                  out_len, out_len + len(rule.replacement)))
+                out_len += len(rule.replacement)
+                pos = end
+        out.append(text[pos:])
+        return Redaction("".join(out), spans)
+
+    def __call__(self, text: str) -> str:
+        return self.redact(text).text
+
+def build_anonymizer(rule_sets=("default",), *, name_dictionary: str = None, first_line_name: bool = True) -> Anonymizer:
+    """
+    Combine named rule sets (see RULE_SETS) and an optional first-name
+    dictionary file into one engine.
+    """
+    rules = []
+    for name in rule_sets:
+        if name not in RULE_SETS:
+            raise ValueError(f"Unknown anonymizer rule set: {name}")
+        rules.extend(RULE_SETS[name])
+    if name_dictionary:
+        rules.append(word_list_rule("name_dictionary", load_word_list(name_dictionary), "Candidate"))
+    # the generic "Firstname Lastname" pattern would shadow dictionary entries
+    # such as "New York", so it always goes last
+    rules = [r for r in rules if r.name != "name"] + [r for r in rules if r.name == "name"]
+    return Anonymizer(rules, first_line_name=first_line_name)
+
+# ------------ Default engine ------------
+ANON_RULE_SETS = [n.strip() for n in os.getenv("ANON_RULE_SETS", "default").split(",") if n.strip()]
+ANON_NAME_DICTIONARY = os.getenv("ANON_NAME_DICTIONARY", "")
+
+default_anonymizer = build_anonymizer(ANON_RULE_SETS, name_dictionary=ANON_NAME_DICTIONARY or None)
+
+def anonymize(text: str) -> Redaction:
+    """Redact PII with the configured engine -> Redaction(text, spans)."""
+    return default_anonymizer.redact(text)
@@ -0,0 +1,429 @@
+import os
+import json
+import math
+import time
+import asyncio
+import hashlib
+import logging
+import re
+import datetime
+import itertools
+from collections import namedtuple
+
+from backend import database
+from backend.anonymizer import default_anonymizer
+
+# ------------ Config ------------
+AUDIT_CONCURRENCY = int(os.getenv("AUDIT_CONCURRENCY", "4"))          # candidates in flight per audit
+AUDIT_AGGREGATE_EVERY = int(os.getenv("AUDIT_AGGREGATE_EVERY", "25"))  # candidates between aggregate lines
+EXACT_PERMUTATION_MAX = 12  # enumerate every sign flip up to this many non-zero deltas
+
+DIMENSIONS = ("name", "location", "year", "redacted")
+# Substitutes, chosen to span perceived gender, ethnicity and region
+COUNTERFACTUAL_NAMES = (
+    "Emily Walsh", "Greg Baker", "Lakisha Washington", "Jamal Jones",
+    "Wei Zhang", "Priya Sharma", "Mohammed Haddad", "Maria Garcia",
+)
+COUNTERFACTUAL_LOCATIONS = ("USA", "UK", "Germany", "India", "Nigeria", "Pakistan", "Brazil", "Philippines")
+YEAR_SHIFTS = (-10, -5, 5)  # every year moved together: the same career, a different age
+# Redacted in the baseline and every variant, since they leak the identity being swapped
+CONTACT_RULES = ("email", "profile", "phone")
+NAME_RULES = ("first_line_name", "name", "name_dictionary")
+FINISHED = ("done", "cancelled", "failed")  # terminal audit states
+
+log = logging.getLogger(__name__)
+
+Variant = namedtuple("Variant", "dimension label text")
+
+# ------------ Counterfactuals ------------
+def _rebuild(text: str, spans, replace) -> str:
+    """`text` with each redaction span replaced by replace(span); None keeps the original."""
+    out, pos = [], 0
+    for span in spans:
+        out.append(text[pos:span.start])
+        new = replace(span)
+        out.append(span.original if new is None else new)
+        pos = span.end
+    out.append(text[pos:])
+    return "".join(out)
+
+# the phone rule also swallows ranges such as "2015 - 2019"; they are dates, not contacts
+_YEAR_RANGE = re.compile(r"(?:19|20)\d{2}\s*[-–]\s*(?:19|20)\d{2}")
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+
+def _is_year(span) -> bool:
+    return span.rule == "year" or (span.rule == "phone" and _YEAR_RANGE.fullmatch(span.original) is not None)
+
+def _contact(span):
+    return span.replacement if span.rule in CONTACT_RULES and not _is_year(span) else None
+
+def _shift_year(match, shift: int) -> str:
+    year = int(match.group()) + shift
+    if not 1950 <= year <= datetime.date.today().year:
+        raise ValueError(year)
+    return str(year)
+
+def counterfactuals(text: str, dimensions=DIMENSIONS) -> tuple:
+    """
+    Counterfactual versions of a resume from the anonymizer's redaction spans
+    -> (baseline, [Variant]). The baseline has contact details redacted;
+    each variant differs from it in one dimension only. Variants a resume
+    gives no handle for (no location, a year shift into the future, an
+    unnamed candidate) are left out rather than scored as identical.
+    """
+    spans = default_anonymizer.redact(text).spans
+    base = _rebuild(text, spans, _contact)
+    variants = []
+
+    if "name" in dimensions:
+        # only the first-line name is known to be the candidate's; the generic
+        # "Firstname Lastname" rule also matches job titles
+        name = next((s.original.strip() for s in spans if s.rule == "first_line_name"), None)
+        for sub in COUNTERFACTUAL_NAMES if name else ():
+            if sub.lower() != name.lower():
+                variants.append(Variant("name", sub, _rebuild(text, spans, lambda s, sub=sub: (
+                    s.original.replace(name, sub) if s.rule in NAME_RULES and s.original.strip() == name
+                    else _contact(s)
+                ))))
+
+    if "location" in dimensions and any(s.rule == "location" for s in spans):
+        for sub in COUNTERFACTUAL_LOCATIONS:
+            variants.append(Variant("location", sub, _rebuild(text, spans, lambda s, sub=sub: (
+                sub if s.rule == "location" else _contact(s)
+            ))))
+
+    if "year" in dimensions and any(_is_year(s) for s in spans):
+        for shift in YEAR_SHIFTS:
+            try:
+                variants.append(Variant("year", f"{shift:+d}y", _rebuild(text, spans, lambda s, shift=shift: (
+                    _YEAR.sub(lambda m: _shift_year(m, shift), s.original) if _is_year(s) else _contact(s)
+                ))))
+            except ValueError:
+                continue
+
+    if "redacted" in dimensions:
+        variants.append(Variant("redacted", "anonymized", default_anonymizer(text)))
+
+    return base, [v for v in variants if v.text != base]
+
+# ------------ Statistics ------------
+_BINS = ((-math.inf, -10, "<=-10"), (-9, -5, "-9..-5"), (-4, -1, "-4..-1"), (0, 0, "0"),
+         (1, 4, "1..4"), (5, 9, "5..9"), (10, math.inf, ">=10"))
+
+def sign_flip_p(deltas: list) -> float:
+    """
+    Two-sided p-value for "mean delta is 0" under the paired sign-flip
+    permutation test: exact for up to EXACT_PERMUTATION_MAX non-zero deltas,
+    the normal approximation of the same null distribution above.
+    """
+    xs = [d for d in deltas if d]
+    if not xs:
+        return 1.0
+    observed = abs(sum(xs))
+    if len(xs) <= EXACT_PERMUTATION_MAX:
+        hits = sum(
+            1 for signs in itertools.product((1, -1), repeat=len(xs))
+            if abs(sum(s * x for s, x in zip(signs, xs))) >= observed - 1e-9
+        )
+        return hits / 2 ** len(xs)
+    return math.erfc(observed / math.sqrt(2 * sum(x * x for x in xs)))
+
+def delta_stats(deltas: list) -> dict:
+    """Distribution of score deltas (variant - baseline) and whether their mean differs from 0."""
+    n = len(deltas)
+    if not n:
+        return {"n": 0}
+    ordered = sorted(deltas)
+    mean = sum(deltas) / n
+    sd = math.sqrt(sum((d - mean) ** 2 for d in deltas) / (n - 1)) if n > 1 else 0.0
+    half = 1.96 * sd / math.sqrt(n) if n > 1 else None
+    mid = n // 2
+    return {
+        "n": n,
+        "mean": round(mean, 2),
+        "sd": round(sd, 2),
+        "median": ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2,
+        "min": ordered[0],
+        "max": ordered[-1],
+        "ci95": [round(mean - half, 2), round(mean + half, 2)] if half is not None else None,
+        "changed_share": round(sum(1 for d in deltas if d) / n, 3),
+        "histogram": {label: sum(1 for d in deltas if lo <= d <= hi) for lo, hi, label in _BINS},
+        "p_value": round(sign_flip_p(deltas), 6),
+    }
+
+def _holm(rows: list) -> None:
+    # Holm-Bonferroni over every variant tested, so "significant" survives the many comparisons
+    tested = sorted((r for r in rows if r.get("n")), key=lambda r: r["p_value"])
+    running = 0.0
+    for rank, row in enumerate(tested):
+        running = max(running, min(1.0, row["p_value"] * (len(tested) - rank)))
+        row["p_adjusted"] = round(running, 6)
+        row["significant"] = running < 0.05
+
+def aggregate(results: list) -> dict:
+    """
+    Audit-wide statistics from per-candidate results. Per dimension the unit
+    is the candidate (their mean delta over that dimension's variants), so
+    candidates with more variants do not weigh more; per variant it is every
+    candidate the variant applied to. Variants dropped because their prompt
+    matched the baseline's are counted per dimension, not scored as 0.
+    """
+    by_dimension, by_variant, dropped = {}, {}, {}
+    for r in results:
+        for dim, d in r["dimensions"].items():
+            by_dimension.setdefault(dim, []).append(d["mean_delta"])
+        for v in r["variants"]:
+            if v.get("dropped"):
+                dropped[v["dimension"]] = dropped.get(v["dimension"], 0) + 1
+            elif v["delta"] is not None:
+                by_variant.setdefault((v["dimension"], v["label"]), []).append(v["delta"])
+    variants = [{"dimension": dim, "label": label, **delta_stats(ds)} for (dim, label), ds in by_variant.items()]
+    _holm(variants)
+    variants.sort(key=lambda r: (-abs(r["mean"]), r["dimension"], r["label"]))
+    dimensions = {dim: delta_stats(ds) for dim, ds in sorted(by_dimension.items())}
+    _holm(list(dimensions.values()))
+    return {"candidates": len(results), "dimensions": dimensions, "variants": variants,
+            "dropped": dict(sorted(dropped.items()))}
+
+# ------------ Audit ------------
+def audit_id(params: dict) -> str:
+    """Stable id: submitting the same audit again resumes it."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+class Audit:
+    """
+    One audit run: its checkpointed and live per-candidate results, and the
+    NDJSON lines emitted so far, which any number of followers can replay.
+    """
+
+    def __init__(self, audit_id: str, params: dict, done: list):
+        self.id = audit_id
+        self.params = params
+        self.results = {r["index"]: r for r in done}
+        self.errors = 0
+        self.generations = 0  # distinct prompts scored in this run
+        self.variants = 0     # variant scores those prompts stood for
+        self.status = "running"
+        self.started = time.time()
+        self.task = None
+        self.stopping = False
+        self.lines = []
+        self._signal = asyncio.Event()
+        self._shared = {}  # prompt digest -> scoring task
+        self._emit({"type": "meta", **self.view(stats=False)})
+        for r in done:
+            self._emit({**r, "resumed": True})
+        if done:
+            self._emit(self._aggregate_line())
+
+    @property
+    def total(self) -> int:
+        return len(self.params["resume_ids"])
+
+    def _emit(self, line: dict) -> None:
+        self.lines.append(line)
+        self._signal.set()
+        self._signal = asyncio.Event()
+
+    def _aggregate_line(self) -> dict:
+        return {"type": "aggregate", "done": len(self.results), "total": self.total,
+                **aggregate(list(self.results.values()))}
+
+    async def follow(self):
+        """Every line so far, then live ones until the audit ends."""
+        i = 0
+        while True:
+            signal = self._signal
+            while i < len(self.lines):
+                yield self.lines[i]
+                i += 1
+            if self.status in FINISHED or self.stopping:
+                return
+            await signal.wait()
+
+    def view(self, stats: bool = True) -> dict:
+        out = {
+            "audit_id": self.id,
+            "status": self.status,
+            "job_title": self.params["job_title"],
+            "dimensions": self.params["dimensions"],
+            "model": self.params["model"],
+            "total": self.total,
+            "done": len(self.results),
+            "errors": self.errors,
+            "generations": self.generations,
+            "variants_scored": self.variants,
+            "started_at": round(self.started, 3),
+            "links": {"self": f"/resume/audit/{self.id}", "stream": f"/resume/audit/{self.id}/stream"},
+        }
+        if stats:
+            out["stats"] = aggregate(list(self.results.values()))
+        return out
+
+class AuditManager:
+    """
+    Runs counterfactual bias audits over stored resumes in the background.
+    `load(resume_id)` returns (resume text, filename); `pack(text,
+    job_description)` fits one variant of it into the prompt and
+    `score(packed, job_description)` scores it -> (result, cache_source) with
+    a "score". Variants are built from the full text (the name is found on its
+    first line), so one whose packed text equals the baseline's is dropped and
+    reported. Identical prompts are scored once per run (and through the score
+    cache across runs); finished candidates are checkpointed in SQLite so a
+    stopped audit resumes where it left off.
+    """
+
+    def __init__(self, *, load, pack, score, concurrency: int = AUDIT_CONCURRENCY):
+        self.load = load
+        self.pack = pack
+        self.score = score
+        self.concurrency = max(1, concurrency)
+        self.audits = {}
+
+    # ---- lifecycle
+    async def start(self, params: dict) -> tuple:
+        """Start, rejoin or resume the audit for `params` -> (Audit, resumed)."""
+        key = audit_id(params)
+        audit = self.audits.get(key)
+        if audit is not None and audit.status == "running":
+            return audit, False
+        row = await asyncio.to_thread(database.audit_get, key)
+        done = await asyncio.to_thread(database.audit_results, key) if row is not None else []
+        audit = Audit(key, params, done)
+        self.audits[key] = audit
+        await asyncio.to_thread(database.audit_put, key, params, "running")
+        audit.task = asyncio.ensure_future(self._run(audit))
+        return audit, bool(done)
+
+    async def resume_pending(self) -> None:
+        """Restart audits a previous process left running."""
+        for row in await asyncio.to_thread(database.audit_list, status="running"):
+            full = await asyncio.to_thread(database.audit_get, row["id"])
+            audit, _ = await self.start(json.loads(full["params"]))
+            log.info("Resuming audit %s (%d/%d candidates done)", audit.id, len(audit.results), audit.total)
+
+    async def get(self, key: str):
+        """A live audit, or a stopped one rebuilt from its checkpoint (not restarted); None if unknown."""
+        if key in self.audits:
+            return self.audits[key]
+        row = await asyncio.to_thread(database.audit_get, key)
+        if row is None:
+            return None
+        audit = Audit(key, json.loads(row["params"]), await asyncio.to_thread(database.audit_results, key))
+        audit.status = row["status"] if row["status"] in FINISHED else "stopped"
+        return audit
+
+    async def cancel(self, audit: Audit) -> bool:
+        if audit.status != "running" or audit.task is None:
+            return False
+        audit.task.cancel()
+        await asyncio.gather(audit.task, return_exceptions=True)
+        return True
+
+    async def stop(self) -> None:
+        """Shutdown: stop every run but leave it "running" in the database, to resume on restart."""
+        running = [a for a in self.audits.values() if a.task is not None and not a.task.done()]
+        for audit in running:
+            audit.stopping = True
+            audit.task.cancel()
+        await asyncio.gather(*(a.task for a in running), return_exceptions=True)
+
+    # ---- running
+    async def _score_once(self, audit: Audit, text: str):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        task = audit._shared.get(digest)
+        if task is None:
+            task = audit._shared[digest] = asyncio.ensure_future(self.score(text, audit.params["job_description"]))
+            audit.generations += 1
+        result, _ = await asyncio.shield(task)
+        if "Unable to parse" in str(result.get("summary", "")):
+            return None
+        try:
+            return int(result.get("score"))
+        except (TypeError, ValueError):
+            return None
+
+    async def _candidate(self, audit: Audit, index: int, resume_id: int) -> dict:
+        text, filename = await self.load(resume_id)
+        base, variants = counterfactuals(text, audit.params["dimensions"])
+        jd = audit.params["job_description"]
+        base = self.pack(base, jd)
+        packed = [self.pack(v.text, jd) for v in variants]
+        # sorted, so prompts that follow each other share a long prefix
+        prompts = sorted({base, *(p for p in packed if p != base)})
+        scores = dict(zip(prompts, await asyncio.gather(*(self._score_once(audit, p) for p in prompts))))
+        audit.variants += sum(1 for p in packed if p != base) + 1
+        base_score = scores[base]
+        if base_score is None:
+            raise RuntimeError("Baseline could not be scored.")
+
+        rows, by_dimension = [], {}
+        for v, prompt in zip(variants, packed):
+            if prompt == base:
+                # the change did not survive packing: the model would see the baseline again
+                rows.append({"dimension": v.dimension, "label": v.label, "score": None, "delta": None,
+                             "dropped": "packed prompt identical to the baseline"})
+                continue
+            score = scores[prompt]
+            delta = None if score is None else score - base_score
+            rows.append({"dimension": v.dimension, "label": v.label, "score": score, "delta": delta})
+            if delta is not None:
+                by_dimension.setdefault(v.dimension, []).append(delta)
+        return {
+            "type": "candidate",
+            "index": index,
+            "resume_id": resume_id,
+            "filename": filename,
+            "base_score": base_score,
+            "variants": rows,
+            "dimensions": {
+                dim: {"n": len(ds), "mean_delta": round(sum(ds) / len(ds), 2), "max_abs_delta": max(map(abs, ds))}
+                for dim, ds in by_dimension.items()
+            },
+            "prompts": len(prompts),
+        }
+
+    async def _run(self, audit: Audit) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def one(index, resume_id):
+            async with slots:
+                try:
+                    return await self._candidate(audit, index, resume_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # not checkpointed: a resumed audit tries the candidate again
+                    return {"type": "error", "index": index, "resume_id": resume_id, "error": str(e)}
+
+        pending = [(i, rid) for i, rid in enumerate(audit.params["resume_ids"]) if i not in audit.results]
+        tasks = [asyncio.ensure_future(one(i, rid)) for i, rid in pending]
+        status = "failed"
+        try:
+            for fut in asyncio.as_completed(tasks):
+                line = await fut
+                if line["type"] == "candidate":
+                    audit.results[line["index"]] = line
+                    await asyncio.to_thread(database.audit_save_result, audit.id, line["index"], line)
+                else:
+                    audit.errors += 1
+                audit._emit(line)
+                if line["type"] == "candidate" and len(audit.results) % AUDIT_AGGREGATE_EVERY == 0:
+                    # statistics over the whole pool so far: off the event loop
+                    audit._emit(await asyncio.to_thread(audit._aggregate_line))
+            status = "done"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            log.warning("Audit %s failed: %s", audit.id, e)
+        finally:
+            for t in tasks:
+                t.cancel()
+            for t in audit._shared.values():
+                t.cancel()
+            audit._shared.clear()
+            if not audit.stopping:
+                await asyncio.to_thread(database.audit_put, audit.id, audit.params, status)
+            audit.status = "stopped" if audit.stopping else status
+            audit._emit({"type": "summary", **await asyncio.to_thread(audit.view)})
@@ -0,0 +1,358 @@
+"""
+Load test: replay a request mix against the backend at rising concurrency and
+report latency percentiles, throughput and the server's event-loop lag.
+
+    python -m backend.benchmarks.bench_load --spawn [--concurrency 1,2,4,8] [--requests 40]
+    python -m backend.benchmarks.bench_load --url http://127.0.0.1:8000 --corpus mix.jsonl
+    python -m backend.benchmarks.bench_load --spawn --pdfs "cvs/*.pdf" --mix upload=6,compare=3,warmup=1
+    python -m backend.benchmarks.bench_load --spawn --save perf/main.json
+    python -m backend.benchmarks.bench_load --spawn --baseline perf/main.json [--tolerance 0.25]
+
+--spawn starts backend.benchmarks.fake_ollama and the backend on free ports
+(fresh database, no warmup) and stops both afterwards; its latency model is
+set with --prefill-tps, --decode-tps, --load and --parallel. Without it the
+driver targets --url as is.
+
+A corpus is JSONL, one request per line:
+    {"endpoint": "upload", "file": "cv1.pdf", "job_title": "...", "job_description": "...", "anonymize": false}
+endpoint is upload, compare or warmup (no other fields needed). Without
+--corpus, requests are drawn from --pdfs (or synthetic .txt resumes) in
+the --mix proportions; each synthetic resume is distinct, so the score
+cache does not hide model time. A corpus is replayed in order, cycling.
+
+Event-loop lag comes from the backend's /metrics, diffed around each level.
+--save writes the results as JSON; --baseline compares p95 per endpoint and
+requests/s per level against a saved run and exits 1 on a regression beyond
+--tolerance.
+"""
+import os
+import re
+import sys
+import json
+import glob
+import math
+import time
+import socket
+import asyncio
+import argparse
+import itertools
+import subprocess
+import tempfile
+
+import httpx
+
+from backend.benchmarks.bench_anon import make_resume
+
+JOB_TITLE = "Senior DevOps Engineer"
+JOB_DESCRIPTION = (
+    "Requirements:\n- 5+ years Linux\n- Kubernetes and Helm\n- CI/CD with GitHub Actions\n"
+    "- Terraform, Ansible\n- Monitoring with Prometheus\nNice to have: Go, AWS"
+)
+ENDPOINTS = {"upload": "/resume/upload", "compare": "/resume/compare", "warmup": "/resume/warmup"}
+
+# ------------ Request mix ------------
+def _parse_mix(spec: str) -> list:
+    weights = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint in --mix: {name}")
+        weights.append((name.strip(), int(weight or 1)))
+    return weights
+
+def load_corpus(path: str) -> list:
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                if item.get("file") and not os.path.isabs(item["file"]):
+                    item["file"] = os.path.join(base, item["file"])
+                items.append(item)
+    return items
+
+def request_stream(args):
+    """Endless iterator of request dicts (endpoint, file or text, form fields)."""
+    if args.corpus:
+        yield from itertools.cycle(load_corpus(args.corpus))
+        return
+    pdfs = sorted(glob.glob(args.pdfs)) if args.pdfs else []
+    if args.pdfs and not pdfs:
+        raise SystemExit(f"no files match {args.pdfs}")
+    wheel = [name for name, weight in _parse_mix(args.mix) for _ in range(weight)]
+    for n in itertools.count():
+        item = {"endpoint": wheel[n % len(wheel)], "job_title": JOB_TITLE, "job_description": JOB_DESCRIPTION}
+        if pdfs:
+            item["file"] = pdfs[n % len(pdfs)]
+        else:
+            item["text"] = make_resume(1_500 + (n * 389) % 4_000, seed=args.seed * 1_000_003 + n)
+        yield item
+
+def _form(item: dict) -> tuple:
+    if item["endpoint"] == "warmup":
+        return None, None
+    data = {
+        "job_title": item.get("job_title", JOB_TITLE),
+        "job_description": item.get("job_description", JOB_DESCRIPTION),
+    }
+    if item["endpoint"] == "upload":
+        data["anonymize"] = str(bool(item.get("anonymize", False))).lower()
+    if item.get("file"):
+        with open(item["file"], "rb") as f:
+            body = f.read()
+        ctype = "text/plain" if item["file"].lower().endswith(".txt") else "application/pdf"
+        files = {"file": (os.path.basename(item["file"]), body, ctype)}
+    else:
+        files = {"file": ("resume.txt", item["text"].encode("utf-8"), "text/plain")}
+    return data, files
+
+# ------------ Driver ------------
+def percentile(sorted_values: list, p: float):
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+_LAG_LINE = re.compile(r'^event_loop_lag_seconds_(bucket\{le="([^"]+)"\}|sum|count) (\S+)$', re.MULTILINE)
+
+async def scrape_loop_lag(client: httpx.AsyncClient) -> dict:
+    """{"buckets": {le: n}, "sum": s, "count": n} from /metrics; empty if unavailable."""
+    try:
+        text = (await client.get("/metrics")).text
+    except httpx.HTTPError:
+        return {}
+    lag = {"buckets": {}}
+    for kind, le, value in _LAG_LINE.findall(text):
+        if le:
+            lag["buckets"][le] = float(value)
+        else:
+            lag[kind] = float(value)
+    return lag
+
+def lag_summary(before: dict, after: dict) -> dict:
+    """Mean and p99 (bucket upper bound) of the lag samples taken between two scrapes."""
+    if not before or not after or not after.get("count"):
+        return {"lag_mean_ms": None, "lag_p99_ms": None}
+    count = after["count"] - before.get("count", 0)
+    if count <= 0:
+        return {"lag_mean_ms": None, "lag_p99_ms": None}
+    mean = (after["sum"] - before.get("sum", 0)) / count
+    p99 = None
+    for le, n in sorted(after["buckets"].items(), key=lambda kv: float(kv[0])):
+        if n - before["buckets"].get(le, 0) >= 0.99 * count:
+            p99 = float(le)
+            break
+    return {"lag_mean_ms": round(mean * 1000, 2), "lag_p99_ms": None if p99 is None else p99 * 1000}
+
+async def run_level(client: httpx.AsyncClient, requests, concurrency: int, total: int) -> dict:
+    samples = {}  # endpoint -> [seconds]
+    errors = {}
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(next(requests))
+
+    async def worker():
+        while not queue.empty():
+            item = queue.get_nowait()
+            data, files = _form(item)
+            started = time.perf_counter()
+            try:
+                r = await client.post(ENDPOINTS[item["endpoint"]], data=data, files=files)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if ok:
+                samples.setdefault(item["endpoint"], []).append(elapsed)
+            else:
+                errors[item["endpoint"]] = errors.get(item["endpoint"], 0) + 1
+
+    lag_before = await scrape_loop_lag(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    lag_after = await scrape_loop_lag(client)
+
+    def stats(values):
+        values = sorted(values)
+        return {
+            "n": len(values),
+            **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) if values else None for p in (50, 95, 99)},
+        }
+
+    every = [v for values in samples.values() for v in values]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": sum(errors.values()),
+        "wall_s": round(wall, 2),
+        "rps": round(len(every) / wall, 2) if wall else None,
+        "all": stats(every),
+        "endpoints": {name: {**stats(values), "errors": errors.get(name, 0)} for name, values in sorted(samples.items())},
+        **lag_summary(lag_before, lag_after),
+    }
+
+def print_level(level: dict) -> None:
+    print(f"\nconcurrency {level['concurrency']}: {level['requests']} requests in {level['wall_s']} s, "
+          f"{level['rps']} req/s, {level['errors']} errors, event-loop lag mean {level['lag_mean_ms']} ms "
+          f"p99 <= {level['lag_p99_ms']} ms")
+    print(f"  {'endpoint':>9} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, s in [("all", {**level["all"], "errors": level["errors"]}), *level["endpoints"].items()]:
+        print(f"  {name:>9} {s['n']:>5} {s['p50_ms'] or '-':>9} {s['p95_ms'] or '-':>9} {s['p99_ms'] or '-':>9} "
+              f"{s['errors']:>7}")
+
+# ------------ Regression check ------------
+def regressions(current: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable list of levels/endpoints worse than `baseline` by more than `tolerance`."""
+    found = []
+    old_levels = {lvl["concurrency"]: lvl for lvl in baseline["levels"]}
+    for lvl in current["levels"]:
+        old = old_levels.get(lvl["concurrency"])
+        if old is None:
+            continue
+        c = lvl["concurrency"]
+        if old["rps"] and lvl["rps"] is not None and lvl["rps"] < old["rps"] * (1 - tolerance):
+            found.append(f"c={c}: {lvl['rps']} req/s vs {old['rps']} baseline")
+        for name, s in lvl["endpoints"].items():
+            before = old["endpoints"].get(name, {}).get("p95_ms")
+            if before and s["p95_ms"] is not None and s["p95_ms"] > before * (1 + tolerance):
+                found.append(f"c={c} {name}: p95 {s['p95_ms']} ms vs {before} ms baseline")
+        if lvl["errors"] > old["errors"]:
+            found.append(f"c={c}: {lvl['errors']} errors vs {old['errors']} baseline")
+    return found
+
+# ------------ Spawned stack ------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_until_up(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{url} exited during startup ({proc.returncode})")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up in {timeout:.0f} s")
+
+def spawn_stack(args, workdir: str) -> tuple:
+    """Start fake Ollama and the backend -> (backend url, [processes])."""
+    ollama_port, api_port = _free_port(), _free_port()
+    fake = subprocess.Popen([
+        sys.executable, "-m", "backend.benchmarks.fake_ollama", "--port", str(ollama_port),
+        "--models", args.model, "--prefill-tps", str(args.prefill_tps), "--decode-tps", str(args.decode_tps),
+        "--load", str(args.load), "--parallel", str(args.parallel), "--seed", str(args.seed),
+    ])
+    env = {
+        **os.environ,
+        "OLLAMA_URL": f"http://127.0.0.1:{ollama_port}",
+        "OLLAMA_URLS": "",
+        "MODEL": args.model,
+        "MODEL_COMPARE": args.model,
+        "OLLAMA_MAX_CONCURRENCY": str(args.parallel),
+        "AUTO_WARMUP": "0",
+        "SCORE_CACHE_PERSIST": "0",
+        "DATABASE_PATH": os.path.join(workdir, "bench.db"),
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(api_port), "--log-level", "warning"],
+        env=env,
+    )
+    procs = [fake, api]
+    try:
+        _wait_until_up(f"http://127.0.0.1:{ollama_port}/api/version", fake)
+        _wait_until_up(f"http://127.0.0.1:{api_port}/health", api)
+    except BaseException:
+        stop_stack(procs)
+        raise
+    return f"http://127.0.0.1:{api_port}", procs
+
+def stop_stack(procs: list) -> None:
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+# ------------ Main ------------
+async def run(args, url: str) -> dict:
+    levels = []
+    requests = request_stream(args)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 2)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        if args.prime:
+            # first generation pays the model load; keep it out of the first level
+            status = (await client.post(ENDPOINTS["warmup"])).json().get("status")
+            deadline = time.monotonic() + args.timeout
+            while status != "ok" and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+                status = (await client.get(ENDPOINTS["warmup"])).json().get("status")
+        for c in args.concurrency:
+            level = await run_level(client, requests, c, args.requests)
+            print_level(level)
+            levels.append(level)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": "spawned fake Ollama" if args.spawn else url,
+        "settings": {k: v for k, v in vars(args).items() if k not in ("save", "baseline")},
+        "levels": levels,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--spawn", action="store_true", help="start fake Ollama + backend for the run")
+    ap.add_argument("--corpus", help="JSONL request mix to replay")
+    ap.add_argument("--pdfs", help='glob of resumes to upload, e.g. "cvs/*.pdf"')
+    ap.add_argument("--mix", default="upload=6,compare=3,warmup=1", help="endpoint weights without --corpus")
+    ap.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4, 8])
+    ap.add_argument("--requests", type=int, default=40, help="requests per concurrency level")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--no-prime", dest="prime", action="store_false", help="skip the warmup before measuring")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--save", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    spawned = ap.add_argument_group("--spawn latency model (see fake_ollama)")
+    spawned.add_argument("--model", default=os.getenv("MODEL", "llama3.2:3b"))
+    spawned.add_argument("--prefill-tps", type=float, default=400.0)
+    spawned.add_argument("--decode-tps", type=float, default=40.0)
+    spawned.add_argument("--load", type=float, default=2.0)
+    spawned.add_argument("--parallel", type=int, default=1)
+    args = ap.parse_args()
+
+    procs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        url = args.url
+        if args.spawn:
+            url, procs = spawn_stack(args, workdir)
+        try:
+            results = asyncio.run(run(args, url))
+        finally:
+            stop_stack(procs)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nsaved {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%} worse than {args.baseline}):")
+            for line in found:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
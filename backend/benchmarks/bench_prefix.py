@@ -0,0 +1,154 @@
+"""
+Prefix reuse: how many prompt tokens consecutive requests share (and so how
+much prefill Ollama can skip via its KV cache) for N candidates scored
+against one job description, old prompt layout vs the stable-prefix layout.
+
+    python -m backend.benchmarks.bench_prefix [--workload batch|session] [--candidates 50] [--prefill-tps 350]
+    python -m backend.benchmarks.bench_prefix --live [--model llama3.2:3b]
+
+Offline mode counts estimated tokens of the common prefix of consecutive
+prompts; saved time is that count divided by --prefill-tps (measure yours
+with --live). Live mode sends both layouts to OLLAMA_URL and reports Ollama's
+own prompt_eval_count / prompt_eval_duration, which only count the tokens it
+had to evaluate.
+"""
+import os
+import time
+import argparse
+
+import requests
+
+from backend.anonymizer import anonymize
+from backend.benchmarks.bench_anon import make_resume
+from backend.ollama_client import (
+    CTX_RESERVE, JD_MAX_SHARE, NUM_PREDICT, SYSTEM, _fit_prompt, _payload,
+)
+from backend.prompt_packer import estimate_tokens, pack_resume, truncate_tokens
+
+JD = """Senior DevOps Engineer
+
+Requirements:
+ • 5+ years of Linux administration
+ • Kubernetes (EKS/AKS) and Helm in production
+ • CI/CD pipelines (GitHub Actions, Jenkins); Docker
+ • Infrastructure as code with Terraform and Ansible
+ • Monitoring with Prometheus, Grafana; on-call experience
+ • Security basics: IAM, secrets management, network policies
+
+Nice to have: Go, Python, cost optimisation on AWS or Azure.
+We offer a hybrid role, a learning budget and a friendly team."""
+
+# ------------ Old layout (verbatim, for comparison) ------------
+def _legacy_explained(resume_text, job_description):
+    return (
+        f"{SYSTEM}\n"
+        "Task: Score how well the RESUME matches the JOB DESCRIPTION.\n"
+        "Rules: score is integer 0-100; summary <= 160 chars; evidence <= 3 items; risks <= 2 items. "
+        "Use short phrases for evidence.match and risks. Return EXACTLY these keys.\n\n"
+        f"JOB DESCRIPTION:\n{job_description}\n\n"
+        f"RESUME:\n{resume_text}\n\n"
+        'Output example: {"score": 85, "summary": "…", '
+        '"evidence": [{"requirement":"Kubernetes","match":"2y AKS ops"}], '
+        '"risks": ["No Terraform"]}'
+    )
+
+def _legacy_quick(resume_text, job_description):
+    return (
+        f"{SYSTEM}\n"
+        "Task: Score RESUME vs JOB DESCRIPTION.\n"
+        "Return compact JSON: score(int 0-100), summary(<=120 chars), evidence(max 2), risks(max 1).\n\n"
+        f"JOB DESCRIPTION:\n{job_description}\n\n"
+        f"RESUME:\n{resume_text}\n\n"
+        'Expected: {"score": 82, "summary": "…", "evidence":[{"requirement":"Kubernetes","match":"AKS"}], "risks":["No Terraform"]}'
+    )
+
+_LEGACY = {"explained": _legacy_explained, "quick": _legacy_quick}
+
+def legacy_prompt(variant, *, num_ctx, job_description, resume):
+    build = _LEGACY[variant]
+    overhead = estimate_tokens(build("", ""))
+    available = max(0, num_ctx - NUM_PREDICT[variant] - overhead - CTX_RESERVE)
+    jd_tokens, resume_tokens = estimate_tokens(job_description), estimate_tokens(resume)
+    jd_budget = min(jd_tokens, max(int(available * JD_MAX_SHARE), available - resume_tokens))
+    return build(truncate_tokens(resume, available - jd_budget), truncate_tokens(job_description, jd_budget))
+
+def stable_prompt(variant, *, num_ctx, job_description, resume):
+    return _fit_prompt(variant, num_ctx=num_ctx, job_description=job_description, resumes=[resume])
+
+# ------------ Workload ------------
+def workload(kind: str, candidates: int, compare_ctx: int) -> list:
+    """
+    (variant, num_ctx, resume) in the order the API issues them for one JD.
+    batch: /resume/batch, explained per candidate. session: /upload
+    (explained) then /compare (quick on the original and on the anonymized
+    copy) per candidate. compare_ctx was 900 before the layout change.
+    """
+    calls = []
+    for i in range(candidates):
+        # varied lengths: short resumes used to change how much JD was kept
+        raw = make_resume(300 + (i * 397) % 6_000, seed=i)
+        calls.append(("explained", 1024, pack_resume(raw, max_chars=40_000)))
+        if kind == "session":
+            small = pack_resume(raw, max_chars=1_600)
+            calls.append(("quick", compare_ctx, small))
+            calls.append(("quick", compare_ctx, anonymize(small).text))
+    return calls
+
+def _common_prefix(a: str, b: str) -> str:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return a[:i]
+
+_LAYOUTS = (("legacy", legacy_prompt, 900), ("stable", stable_prompt, 1024))
+
+def offline(args) -> None:
+    print(f"{args.workload}: one JD, {args.candidates} candidates; prefill at {args.prefill_tps:.0f} tok/s\n")
+    print(f"{'layout':>8} {'JD tok':>7} {'prompt tok':>11} {'reused tok':>11} {'reuse %':>8} {'saved ms/req':>13}")
+    for name, build, compare_ctx in _LAYOUTS:
+        calls = workload(args.workload, args.candidates, compare_ctx)
+        prev = ""
+        total = reused = 0
+        for variant, num_ctx, resume in calls:
+            prompt = build(variant, num_ctx=num_ctx, job_description=JD, resume=resume)
+            total += estimate_tokens(prompt)
+            # one runner slot keeps the last prompt's KV cache; it is only
+            # reusable when num_ctx (and so the loaded runner) is unchanged
+            reused += estimate_tokens(_common_prefix(prev[1], prompt)) if prev and prev[0] == num_ctx else 0
+            prev = (num_ctx, prompt)
+        jd_tok = estimate_tokens(JD) if name == "legacy" else estimate_tokens(
+            _fit_prompt("quick", num_ctx=compare_ctx, job_description=JD, resumes=[""]).split("\n\n")[1])
+        saved_ms = reused / len(calls) / args.prefill_tps * 1e3
+        print(f"{name:>8} {jd_tok:>7} {total / len(calls):>11.0f} {reused / len(calls):>11.0f} "
+              f"{100 * reused / total:>7.1f}% {saved_ms:>13.1f}")
+
+def live(args) -> None:
+    url = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434") + "/api/generate"
+    print(f"{args.workload}: {args.candidates} candidates against {url} ({args.model})\n")
+    print(f"{'layout':>8} {'evaluated tok/req':>18} {'prefill ms/req':>15} {'wall s':>8}")
+    for name, build, compare_ctx in _LAYOUTS:
+        calls = workload(args.workload, args.candidates, compare_ctx)
+        evaluated = prefill_ns = 0
+        t0 = time.perf_counter()
+        for variant, num_ctx, resume in calls:
+            prompt = build(variant, num_ctx=num_ctx, job_description=JD, resume=resume)
+            payload = _payload(prompt, model=args.model, num_ctx=num_ctx, num_predict=1)
+            data = requests.post(url, json=payload, timeout=300).json()
+            evaluated += data.get("prompt_eval_count", 0)
+            prefill_ns += data.get("prompt_eval_duration", 0)
+        wall = time.perf_counter() - t0
+        print(f"{name:>8} {evaluated / len(calls):>18.0f} {prefill_ns / len(calls) / 1e6:>15.1f} {wall:>8.1f}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workload", choices=("batch", "session"), default="batch")
+    ap.add_argument("--candidates", type=int, default=50)
+    ap.add_argument("--prefill-tps", type=float, default=350.0, help="prompt tokens/s of your setup")
+    ap.add_argument("--live", action="store_true", help="measure against a running Ollama")
+    ap.add_argument("--model", default=os.getenv("MODEL", "llama3.2:3b"))
+    args = ap.parse_args()
+    live(args) if args.live else offline(args)
+
+if __name__ == "__main__":
+    main()
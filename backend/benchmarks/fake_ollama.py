@@ -0,0 +1,235 @@
+"""
+Deterministic stand-in for an Ollama server, for exercising and load-testing
+the backend without a GPU: /api/generate (streaming and not), /api/ps and
+/api/tags, with a latency model and an optional share of failed requests.
+
+    python -m backend.benchmarks.fake_ollama [--port 11434] [--models llama3.2:3b]
+        [--prefill-tps 400] [--decode-tps 40] [--load 2.0] [--parallel 1]
+        [--delay 0] [--jitter 0.1] [--fail-rate 0] [--seed 7] [--model-size-mb 2048]
+        [--json-padding 0] [--malformed-rate 0]
+
+A generation takes prompt tokens / --prefill-tps (minus the prefix shared
+with the previous prompt, like Ollama's KV cache) + output tokens /
+--decode-tps, plus --load the first time a model is used. --parallel
+generations run at once per model; the rest queue, as in Ollama with
+OLLAMA_NUM_PARALLEL. Answers and jitter depend only on the prompt and
+--seed, so runs are reproducible.
+
+Answers longer than num_predict are cut off (done_reason "length"). With
+format "json" (not a schema) --json-padding whitespace tokens follow the
+object, as a model in JSON mode may emit; --malformed-rate of the answers
+lose their closing brace, and repair prompts get the object back whole.
+
+Several instances on different ports make a cluster for OLLAMA_URLS.
+A model not listed in --models gets a 404, like a real node without it.
+"""
+import json
+import math
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import namedtuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from backend.prompt_packer import estimate_tokens
+
+# seconds = load (cold only) + delay + prefill + decode, each scaled by up to ±jitter
+LatencyModel = namedtuple("LatencyModel", "prefill_tps decode_tps load delay jitter parallel")
+DEFAULT_LATENCY = LatencyModel(prefill_tps=400.0, decode_tps=40.0, load=2.0, delay=0.0, jitter=0.1, parallel=1)
+
+def _verdicts(prompt: str, rng: random.Random) -> dict:
+    # "yes" when a word of the requirement occurs in the resume, else partial or no
+    head, _, listed = prompt.rpartition("REQUIREMENTS:\n")
+    resume = head.lower()
+    out = []
+    for i, line in enumerate(filter(None, listed.split("\n")), start=1):
+        words = [w for w in line.partition(". ")[2].lower().split() if len(w) > 2]
+        hit = next((w for w in words if w in resume), None)
+        met = "yes" if hit else rng.choice(("partial", "no"))
+        out.append({"id": i, "met": met, "match": f"mentions {hit}" if hit else ""})
+    return {"requirements": out}
+
+def _repaired(prompt: str, rng: random.Random) -> dict:
+    broken = prompt.rpartition("TEXT:\n")[2].strip()
+    try:
+        return json.loads(broken + "}" * (broken.count("{") - broken.count("}")))
+    except ValueError:
+        return _answer(prompt.partition("TEXT:\n")[0], rng)
+
+def _answer(prompt: str, rng: random.Random) -> dict:
+    if "was meant to be one JSON object" in prompt:
+        return _repaired(prompt, rng)
+    if "\nREQUIREMENTS:\n1. " in prompt:
+        return _verdicts(prompt, rng)
+    if "ORIGINAL (A)" in prompt:
+        a = rng.randint(55, 90)
+        b = a - rng.randint(0, 6)
+        return {"original": {"score": a, "summary": "Solid match"},
+                "anonymized": {"score": b, "summary": "Solid match"}, "delta": a - b}
+    return {
+        "score": rng.randint(40, 95),
+        "summary": "Solid match on the core platform skills.",
+        "evidence": [{"requirement": "Kubernetes", "match": "AKS"}, {"requirement": "Terraform", "match": "2y IaC"}],
+        "risks": ["No Go"],
+    }
+
+def _logprobs(text: str, rng: random.Random) -> list:
+    # one entry per score digit, the rest of the text as a single token
+    head, _, tail = text.partition('"score": ')
+    digits = "".join(c for c in tail[:3] if c.isdigit())
+    if not digits:
+        return []
+    conf = rng.uniform(0.4, 0.99)
+    return ([{"token": head + '"score": ', "logprob": 0.0}]
+            + [{"token": d, "logprob": math.log(conf) / len(digits)} for d in digits]
+            + [{"token": tail[len(digits):], "logprob": 0.0}])
+
+def _shared_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def create_app(models: list, latency: LatencyModel = DEFAULT_LATENCY, fail_rate: float = 0.0, seed: int = 7,
+               model_size_mb: int = 2048, json_padding: int = 0, malformed_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    loaded = set()
+    last_prompt = {}  # model -> previous prompt (one KV-cache slot per model)
+    slots = {}
+    counts = {"requests": 0, "failed": 0, "cold_loads": 0}
+
+    def _tag(name):
+        return {"name": name, "model": name, "size": model_size_mb * 2**20}
+
+    def _slot(model):
+        if model not in slots:
+            slots[model] = asyncio.Semaphore(max(1, latency.parallel))
+        return slots[model]
+
+    def _plan(model: str, prompt: str, rng: random.Random, output_tokens: int) -> dict:
+        """Durations (seconds) for one generation, consuming the model's warm/cached state."""
+        def scaled(seconds):
+            return seconds * (1 + rng.uniform(-latency.jitter, latency.jitter))
+        cold = model not in loaded
+        loaded.add(model)
+        if cold:
+            counts["cold_loads"] += 1
+        prompt_tokens = estimate_tokens(prompt)
+        cached = estimate_tokens(prompt[:_shared_prefix(last_prompt.get(model, ""), prompt)])
+        last_prompt[model] = prompt
+        evaluated = max(1, prompt_tokens - cached)
+        return {
+            "load": scaled(latency.load) if cold else 0.001,
+            "delay": scaled(latency.delay),
+            "prefill": scaled(evaluated / latency.prefill_tps),
+            "decode": scaled(output_tokens / latency.decode_tps),
+            "prompt_eval_count": evaluated,
+            "eval_count": output_tokens,
+        }
+
+    def _stats(model: str, plan: dict, done_reason: str) -> dict:
+        ns = lambda s: int(s * 1e9)
+        return {
+            "done": True, "model": model, "done_reason": done_reason,
+            "total_duration": ns(plan["load"] + plan["delay"] + plan["prefill"] + plan["decode"]),
+            "load_duration": ns(plan["load"]),
+            "prompt_eval_count": plan["prompt_eval_count"], "prompt_eval_duration": ns(plan["prefill"]),
+            "eval_count": plan["eval_count"], "eval_duration": ns(plan["decode"]),
+        }
+
+    @app.post("/api/generate")
+    async def generate(req: Request):
+        body = await req.json()
+        model = body.get("model", "")
+        prompt = body.get("prompt", "")
+        counts["requests"] += 1
+        if body.get("keep_alive") in (0, "0", "0s"):
+            loaded.discard(model)  # unload request
+            return {"model": model, "response": "", "done": True, "done_reason": "unload"}
+        rng = random.Random(hashlib.sha256(f"{seed}:{model}:{prompt}".encode()).digest())
+        if model not in models and f"{model}:latest" not in models:
+            return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+        if rng.random() < fail_rate:
+            counts["failed"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        text = json.dumps(_answer(prompt, rng))
+        if malformed_rate and rng.random() < malformed_rate and "was meant to be one JSON object" not in prompt:
+            text = text[:-1]
+        num_predict = (body.get("options") or {}).get("num_predict") or 256
+        tokens = estimate_tokens(text)
+        if body.get("format") == "json":
+            text += " " * json_padding
+            tokens += json_padding
+        done_reason = "stop"
+        if tokens > num_predict:
+            text = text[:len(text) * num_predict // tokens]
+            tokens, done_reason = num_predict, "length"
+        logprobs = _logprobs(text, rng) if body.get("logprobs") else []
+
+        if body.get("stream"):
+            async def chunks():
+                async with _slot(model):
+                    plan = _plan(model, prompt, rng, tokens)
+                    await asyncio.sleep(plan["load"] + plan["delay"] + plan["prefill"])
+                    if logprobs:
+                        pieces = [(e["token"], [e]) for e in logprobs]
+                    else:
+                        pieces = [(text[i:i + 4], None) for i in range(0, len(text), 4)]
+                    for piece, lp in pieces:
+                        await asyncio.sleep(plan["decode"] / len(pieces))
+                        chunk = {"model": model, "response": piece, "done": False}
+                        if lp:
+                            chunk["logprobs"] = lp
+                        yield json.dumps(chunk) + "\n"
+                    yield json.dumps({"response": "", **_stats(model, plan, done_reason)}) + "\n"
+            return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+        async with _slot(model):
+            plan = _plan(model, prompt, rng, tokens)
+            await asyncio.sleep(plan["load"] + plan["delay"] + plan["prefill"] + plan["decode"])
+        extra = {"logprobs": logprobs} if body.get("logprobs") else {}
+        return {"response": text, **extra, **_stats(model, plan, done_reason)}
+
+    @app.get("/api/ps")
+    def ps():
+        return {"models": [_tag(m) for m in sorted(loaded)]}
+
+    @app.get("/api/tags")
+    def tags():
+        return {"models": [_tag(m) for m in models]}
+
+    @app.get("/api/version")
+    def version():
+        return {"version": "fake", **counts}
+
+    return app
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--models", default="llama3.2:3b", help="comma-separated installed models")
+    ap.add_argument("--prefill-tps", type=float, default=DEFAULT_LATENCY.prefill_tps, help="prompt tokens/s")
+    ap.add_argument("--decode-tps", type=float, default=DEFAULT_LATENCY.decode_tps, help="output tokens/s")
+    ap.add_argument("--load", type=float, default=DEFAULT_LATENCY.load, help="seconds to load a cold model")
+    ap.add_argument("--delay", type=float, default=DEFAULT_LATENCY.delay, help="fixed seconds per generation")
+    ap.add_argument("--jitter", type=float, default=DEFAULT_LATENCY.jitter, help="relative +/- spread")
+    ap.add_argument("--parallel", type=int, default=DEFAULT_LATENCY.parallel, help="generations at once per model")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 500")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--model-size-mb", type=int, default=2048, help="memory each loaded model reports in /api/ps")
+    ap.add_argument("--json-padding", type=int, default=0, help='whitespace tokens after the object in "json" mode')
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="share of answers missing their closing brace")
+    args = ap.parse_args()
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    latency = LatencyModel(args.prefill_tps, args.decode_tps, args.load, args.delay, args.jitter, args.parallel)
+    uvicorn.run(create_app(models, latency, args.fail_rate, args.seed, args.model_size_mb, args.json_padding,
+                           args.malformed_rate),
+                host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
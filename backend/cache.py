@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+from backend import database
+from backend.ollama_client import PROMPT_VERSION, generation_options
+
+# ------------ Config ------------
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", "1024"))          # in-memory entries
+SCORE_CACHE_TTL = float(os.getenv("SCORE_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+SCORE_CACHE_PERSIST = os.getenv("SCORE_CACHE_PERSIST", "0") == "1"      # SQLite tier
+
+log = logging.getLogger(__name__)
+
+# ------------ Keys ------------
+def normalize_text(s: str) -> str:
+    """Collapse whitespace so re-extracted copies of the same PDF hash equal."""
+    return re.sub(r"\s+", " ", (s or "")).strip()
+
+def make_key(*, variant: str, model: str, options: dict, **texts) -> str:
+    material = {
+        "variant": variant,
+        "prompt_version": PROMPT_VERSION,
+        "model": model,
+        "options": options,
+        "texts": {k: normalize_text(v) for k, v in texts.items()},
+    }
+    blob = json.dumps(material, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _is_cacheable(value) -> bool:
+    # never pin a parser fallback; the next attempt may well succeed
+    return isinstance(value, dict) and "Unable to parse" not in str(value.get("summary", ""))
+
+# ------------ Cache ------------
+class ScoreCache:
+    """
+    Two-tier cache for deterministic (temperature 0) generations:
+    an in-memory LRU with TTL and an optional SQLite tier. Concurrent callers
+    asking for the same key share one in-flight generation.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, persist: bool):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self._mem = OrderedDict()  # key -> (expires_at, model, value)
+        self._inflight = {}        # key -> [task, waiters]
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "shared": 0, "misses": 0, "evictions": 0}
+
+    # ---- memory tier
+    def _mem_get(self, key: str):
+        entry = self._mem.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return entry[2]
+
+    def _mem_put(self, key: str, value: dict, model: str) -> None:
+        self._mem[key] = (time.time() + self.ttl, model, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # ---- lookups
+    async def get_or_compute(self, key: str, compute, *, model: str, variant: str):
+        """
+        Return (value, source) where source is "memory", "disk", "shared"
+        (joined an identical in-flight generation) or "miss".
+        `compute` is a zero-arg callable returning an awaitable.
+        """
+        value = self._mem_get(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return value, "memory"
+
+        if self.persist and key not in self._inflight:
+            try:
+                value = await asyncio.to_thread(database.cache_get, key)
+            except Exception as e:
+                log.warning("Score cache disk read failed: %s", e)
+                value = None
+            if value is not None:
+                self._mem_put(key, value, model)
+                self._stats["disk_hits"] += 1
+                return value, "disk"
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(self._fill(key, compute, model=model, variant=variant))
+            flight = self._inflight[key] = [task, 0]
+            source = "miss"
+            self._stats["misses"] += 1
+        else:
+            source = "shared"
+            self._stats["shared"] += 1
+        return await self.follow(flight), source
+
+    async def follow(self, flight):
+        """Wait for an in-flight generation; the last caller to leave cancels it."""
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+            # last interested caller left (e.g. client disconnect): stop generating
+            if flight[1] == 0 and not flight[0].done():
+                flight[0].cancel()
+
+    async def _fill(self, key: str, compute, *, model: str, variant: str):
+        try:
+            value = await compute()
+            await self.store(key, value, model=model, variant=variant)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    # ---- several keys per generation
+    def flight(self, key: str):
+        """The generation in flight for `key`, to follow(); counted as shared. None if there is none."""
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._stats["shared"] += 1
+        return flight
+
+    def start(self, keys: list, compute, *, model: str, variant: str) -> dict:
+        """
+        Generate `keys` (none in flight) with one compute() -> {key: (value,
+        keep)}; values with `keep` are stored. Each key is in flight until the
+        generation ends, so other callers share it (flight()) -> {key: flight}.
+        The generation is cancelled once every key's last follower has left.
+        """
+        batch = asyncio.ensure_future(compute())
+        pending = [len(keys)]
+        flights = {}
+        for key in keys:
+            task = asyncio.ensure_future(self._fill_from(key, batch, pending, model=model, variant=variant))
+            flights[key] = self._inflight[key] = [task, 0]
+        self._stats["misses"] += len(keys)
+        return flights
+
+    async def _fill_from(self, key: str, batch, pending: list, *, model: str, variant: str):
+        try:
+            value, keep = (await asyncio.shield(batch)).get(key, (None, False))
+            if keep and value is not None:
+                await self.store(key, value, model=model, variant=variant)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            pending[0] -= 1
+            if not pending[0] and not batch.done():
+                batch.cancel()
+
+    async def peek(self, key: str, *, model: str, count_miss: bool = True):
+        """
+        Cached value and its tier without generating -> (value, source) or
+        (None, None). Callers that may share or generate the value next pass
+        count_miss=False and let flight()/start() count it.
+        """
+        value = self._mem_get(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return value, "memory"
+        if self.persist:
+            try:
+                value = await asyncio.to_thread(database.cache_get, key)
+            except Exception as e:
+                log.warning("Score cache disk read failed: %s", e)
+                value = None
+            if value is not None:
+                self._mem_put(key, value, model)
+                self._stats["disk_hits"] += 1
+                return value, "disk"
+        if count_miss:
+            self._stats["misses"] += 1
+        return None, None
+
+    async def store(self, key: str, value, *, model: str, variant: str) -> None:
+        if not _is_cacheable(value):
+            return
+        self._mem_put(key, value, model)
+        if self.persist:
+            try:
+                await asyncio.to_thread(
+                    database.cache_put, key, value, variant=variant, model=model, ttl=self.ttl
+                )
+            except Exception as e:
+                log.warning("Score cache disk write failed: %s", e)
+
+    # ---- admin
+    async def invalidate(self, *, key: str = None, model: str = None) -> int:
+        if key is not None:
+            keys = [key] if key in self._mem else []
+        elif model is not None:
+            keys = [k for k, (_, m, _) in self._mem.items() if m == model]
+        else:
+            keys = list(self._mem)
+        for k in keys:
+            del self._mem[k]
+        removed = len(keys)
+        if self.persist:
+            removed = max(removed, await asyncio.to_thread(database.cache_delete, key=key, model=model))
+        return removed
+
+    def stats(self) -> dict:
+        lookups = sum(self._stats[k] for k in ("memory_hits", "disk_hits", "shared", "misses"))
+        hits = lookups - self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "inflight": len(self._inflight),
+            "persist": self.persist,
+            "disk_entries": database.cache_count() if self.persist else None,
+        }
+
+score_cache = ScoreCache(SCORE_CACHE_SIZE, SCORE_CACHE_TTL, SCORE_CACHE_PERSIST)
+
+def cache_key(variant: str, *, model: str, num_ctx: int, **texts) -> str:
+    # num_predict is left out: it only caps the output, so at temperature 0 an
+    # answer that fit is the same under any budget, and cut-off answers are
+    # regenerated, never stored. Keying on it would split the cache every
+    # time the adaptive budget (ollama_client.OutputBudgets) moves.
+    options = generation_options(num_ctx, 0)
+    del options["num_predict"]
+    return make_key(variant=variant, model=model, options=options, **texts)
+
+async def cached(variant: str, compute, *, model: str, num_ctx: int, **texts):
+    """Run `compute` through score_cache, keyed on everything that shapes the output."""
+    key = cache_key(variant, model=model, num_ctx=num_ctx, **texts)
+    return await score_cache.get_or_compute(key, compute, model=model, variant=variant)
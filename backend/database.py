@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# ------------ Config ------------
+DATABASE_PATH = os.getenv("DATABASE_PATH", "data/resume_scorer.db")
+
+_lock = threading.Lock()
+_conn = None
+_has_fts = False
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS score_cache (
+    key         TEXT PRIMARY KEY,
+    variant     TEXT NOT NULL,
+    model       TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_score_cache_model ON score_cache(model);
+
+CREATE TABLE IF NOT EXISTS resumes (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash  TEXT NOT NULL UNIQUE,
+    text_hash     TEXT NOT NULL,
+    filename      TEXT,
+    content_type  TEXT,
+    size          INTEGER,
+    text          TEXT NOT NULL,
+    packed        TEXT NOT NULL,
+    anonymized    TEXT NOT NULL,
+    created_at    REAL NOT NULL,
+    last_seen_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_resumes_text_hash ON resumes(text_hash);
+
+CREATE TABLE IF NOT EXISTS audits (
+    id          TEXT PRIMARY KEY,
+    params      TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit_results (
+    audit_id    TEXT NOT NULL,
+    candidate   INTEGER NOT NULL,
+    result      TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    PRIMARY KEY (audit_id, candidate)
+);
+"""
+
+# External-content FTS5 index over resumes.text, kept in sync by triggers.
+# + and # are token characters so "C++" and "C#" stay searchable.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS resumes_fts USING fts5(
+    text, content='resumes', content_rowid='id', tokenize="porter unicode61 tokenchars '+#'"
+);
+CREATE TRIGGER IF NOT EXISTS resumes_ai AFTER INSERT ON resumes BEGIN
+    INSERT INTO resumes_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS resumes_ad AFTER DELETE ON resumes BEGIN
+    INSERT INTO resumes_fts(resumes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS resumes_au AFTER UPDATE OF text ON resumes BEGIN
+    INSERT INTO resumes_fts(resumes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO resumes_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+# ------------ Connection ------------
+def get_connection() -> sqlite3.Connection:
+    """
+    One shared connection per process. Calls are short, so a lock is enough;
+    async callers should go through asyncio.to_thread().
+    """
+    global _conn, _has_fts
+    with _lock:
+        if _conn is None:
+            folder = os.path.dirname(DATABASE_PATH)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                _has_fts = True
+            except sqlite3.OperationalError as e:
+                # SQLite built without FTS5: search falls back to LIKE
+                log.warning("FTS5 unavailable, resume search will scan: %s", e)
+            _conn = conn
+        return _conn
+
+def close_connection() -> None:
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+def _execute(sql: str, params=()):
+    conn = get_connection()
+    with _lock:
+        cur = conn.execute(sql, params)
+        conn.commit()
+        return cur
+
+def _query(sql: str, params=()):
+    conn = get_connection()
+    with _lock:
+        return conn.execute(sql, params).fetchall()
+
+# ------------ Score cache ------------
+def cache_get(key: str):
+    rows = _query("SELECT value, expires_at FROM score_cache WHERE key = ?", (key,))
+    if not rows:
+        return None
+    if rows[0]["expires_at"] < time.time():
+        _execute("DELETE FROM score_cache WHERE key = ?", (key,))
+        return None
+    return json.loads(rows[0]["value"])
+
+def cache_put(key: str, value: dict, *, variant: str, model: str, ttl: float) -> None:
+    now = time.time()
+    _execute(
+        "INSERT OR REPLACE INTO score_cache (key, variant, model, value, created_at, expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (key, variant, model, json.dumps(value), now, now + ttl),
+    )
+
+def cache_delete(*, key: str = None, model: str = None) -> int:
+    """Delete one key, every entry of a model, or everything when both are None."""
+    if key is not None:
+        return _execute("DELETE FROM score_cache WHERE key = ?", (key,)).rowcount
+    if model is not None:
+        return _execute("DELETE FROM score_cache WHERE model = ?", (model,)).rowcount
+    return _execute("DELETE FROM score_cache").rowcount
+
+def cache_count() -> int:
+    _execute("DELETE FROM score_cache WHERE expires_at < ?", (time.time(),))
+    return _query("SELECT COUNT(*) AS n FROM score_cache")[0]["n"]
+
+# ------------ Resume store ------------
+_RESUME_COLUMNS = ("id", "content_hash", "text_hash", "filename", "content_type", "size", "created_at", "last_seen_at")
+
+def resume_put(*, content_hash: str, text_hash: str, filename: str, content_type: str, size: int,
+               text: str, packed: str, anonymized: str) -> tuple:
+    """
+    Insert a parsed resume unless the same file (content hash) or the same
+    text (text hash) is already stored -> (id, duplicate).
+    """
+    conn = get_connection()
+    now = time.time()
+    with _lock:
+        row = conn.execute(
+            "SELECT id FROM resumes WHERE content_hash = ? OR text_hash = ? LIMIT 1", (content_hash, text_hash)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE resumes SET last_seen_at = ? WHERE id = ?", (now, row["id"]))
+            conn.commit()
+            return row["id"], True
+        cur = conn.execute(
+            "INSERT INTO resumes (content_hash, text_hash, filename, content_type, size, text, packed, "
+            "anonymized, created_at, last_seen_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (content_hash, text_hash, filename, content_type, size, text, packed, anonymized, now, now),
+        )
+        conn.commit()
+        return cur.lastrowid, False
+
+def resume_get(resume_id: int):
+    rows = _query("SELECT * FROM resumes WHERE id = ?", (resume_id,))
+    return rows[0] if rows else None
+
+def resume_ids() -> list:
+    return [r["id"] for r in _query("SELECT id FROM resumes ORDER BY id")]
+
+def resume_list(*, limit: int = 50, offset: int = 0) -> list:
+    return _query(
+        f"SELECT {', '.join(_RESUME_COLUMNS)}, length(text) AS chars FROM resumes "
+        "ORDER BY id DESC LIMIT ? OFFSET ?",
+        (limit, offset),
+    )
+
+def resume_delete(resume_id: int) -> int:
+    return _execute("DELETE FROM resumes WHERE id = ?", (resume_id,)).rowcount
+
+def resume_count() -> int:
+    return _query("SELECT COUNT(*) AS n FROM resumes")[0]["n"]
+
+_TERM = re.compile(r'"([^"]+)"|([\w+#]+)')
+
+def _match_expression(query: str, any_term: bool) -> str:
+    # quote every term/phrase so user input is never parsed as FTS5 syntax
+    terms = ['"' + (phrase or word) + '"' for phrase, word in _TERM.findall(query)]
+    return (" OR " if any_term else " ").join(terms)
+
+def resume_search(query: str, *, limit: int = 20, any_term: bool = False, ids: list = None) -> list:
+    """
+    Keyword search over stored resume text, best match first. Words are
+    stemmed ("deployed" finds "deploying"); "quoted phrases" match exactly.
+    With `ids`, only those resumes are searched.
+    """
+    get_connection()
+    only = f" AND r.id IN ({', '.join('?' * len(ids))})" if ids else ""
+    if _has_fts:
+        expr = _match_expression(query, any_term)
+        if not expr:
+            return []
+        return _query(
+            f"SELECT {', '.join('r.' + c for c in _RESUME_COLUMNS)}, "
+            "snippet(resumes_fts, 0, '[', ']', '…', 12) AS snippet, bm25(resumes_fts) AS rank "
+            "FROM resumes_fts JOIN resumes r ON r.id = resumes_fts.rowid "
+            f"WHERE resumes_fts MATCH ?{only} ORDER BY rank LIMIT ?",
+            (expr, *(ids or ()), limit),
+        )
+    terms = [phrase or word for phrase, word in _TERM.findall(query)]
+    if not terms:
+        return []
+    where = (" OR " if any_term else " AND ").join("r.text LIKE ?" for _ in terms)
+    return _query(
+        f"SELECT {', '.join('r.' + c for c in _RESUME_COLUMNS)}, substr(r.text, 1, 120) AS snippet, 0 AS rank "
+        f"FROM resumes r WHERE ({where}){only} ORDER BY r.id DESC LIMIT ?",
+        (*(f"%{t}%" for t in terms), *(ids or ()), limit),
+    )
+
+# ------------ Bias audits ------------
+def audit_put(audit_id: str, params: dict, status: str) -> None:
+    """Create an audit, or set the status of an existing one (its params never change)."""
+    now = time.time()
+    _execute(
+        "INSERT INTO audits (id, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+        (audit_id, json.dumps(params), status, now, now),
+    )
+
+def audit_get(audit_id: str):
+    rows = _query("SELECT * FROM audits WHERE id = ?", (audit_id,))
+    return rows[0] if rows else None
+
+def audit_list(*, status: str = None) -> list:
+    if status is not None:
+        return _query("SELECT id, status, created_at, updated_at FROM audits WHERE status = ? ORDER BY created_at",
+                      (status,))
+    return _query("SELECT id, status, created_at, updated_at FROM audits ORDER BY created_at DESC")
+
+def audit_save_result(audit_id: str, candidate: int, result: dict) -> None:
+    _execute(
+        "INSERT OR REPLACE INTO audit_results (audit_id, candidate, result, created_at) VALUES (?, ?, ?, ?)",
+        (audit_id, candidate, json.dumps(result), time.time()),
+    )
+
+def audit_results(audit_id: str) -> list:
+    """Checkpointed per-candidate results, in the order they finished."""
+    rows = _query("SELECT result FROM audit_results WHERE audit_id = ? ORDER BY rowid", (audit_id,))
+    return [json.loads(r["result"]) for r in rows]
+
+def audit_delete(audit_id: str) -> int:
+    _execute("DELETE FROM audit_results WHERE audit_id = ?", (audit_id,))
+    return _execute("DELETE FROM audits WHERE id = ?", (audit_id,)).rowcount
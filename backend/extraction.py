@@ -0,0 +1,143 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from backend.prompt_packer import sections_settled
+
+# ------------ Config ------------
+# Processes used for PDF parsing; 0 parses in a thread of the API process.
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACT_CACHE_SIZE = int(os.getenv("EXTRACT_CACHE_SIZE", "256"))  # parsed documents kept
+SPOOL_CHUNK = 1 << 20
+
+# ------------ Early termination ------------
+def extract_pages(doc, char_budget: int = None) -> tuple:
+    """Join page texts, stopping once `char_budget` is satisfied -> (text, complete)."""
+    parts = []
+    n = doc.page_count
+    for idx in range(n):
+        parts.append(doc[idx].get_text())
+        if char_budget is not None and idx + 1 < n and sections_settled("\n".join(parts), char_budget):
+            return "\n".join(parts), False
+    return "\n".join(parts), True
+
+def _extract_pdf_path(path: str, char_budget: int = None) -> tuple:
+    """Process-pool entry point: parse the PDF at `path` -> (text, complete)."""
+    doc = fitz.open(path)
+    try:
+        return extract_pages(doc, char_budget)
+    finally:
+        doc.close()
+
+# ------------ Worker pool ------------
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if EXTRACT_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+# ------------ Text cache ------------
+_cache = OrderedDict()  # sha256 -> (text, budget it satisfies; None = whole document)
+_cache_lock = threading.Lock()
+
+def _cache_get(digest: str, char_budget: int):
+    with _cache_lock:
+        entry = _cache.get(digest)
+        if entry is None:
+            return None
+        text, covered = entry
+        if covered is not None and (char_budget is None or char_budget > covered):
+            return None  # cached an early-stopped parse that is too short for this caller
+        _cache.move_to_end(digest)
+        return text
+
+def _cache_put(digest: str, text: str, covered) -> None:
+    with _cache_lock:
+        old = _cache.get(digest)
+        if old is not None and (old[1] is None or (covered is not None and covered <= old[1])):
+            return  # already have the whole document, or a longer prefix of it
+        _cache[digest] = (text, covered)
+        _cache.move_to_end(digest)
+        while len(_cache) > EXTRACT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+# ------------ Public API ------------
+Spooled = namedtuple("Spooled", "path digest size")
+
+def spool(fobj) -> Spooled:
+    """
+    Copy a file object to a temp file in chunks, hashing on the way, so large
+    uploads are never held as one bytes object. Blocking: use asyncio.to_thread.
+    """
+    h = hashlib.sha256()
+    size = 0
+    fobj.seek(0)
+    out = tempfile.NamedTemporaryFile(prefix="resume-", suffix=".upload", delete=False)
+    try:
+        with out:
+            while True:
+                chunk = fobj.read(SPOOL_CHUNK)
+                if not chunk:
+                    break
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        # e.g. a corrupt zip member: nobody gets a Spooled to discard
+        os.unlink(out.name)
+        raise
+    return Spooled(out.name, h.hexdigest(), size)
+
+def discard(spooled: Spooled) -> None:
+    try:
+        os.unlink(spooled.path)
+    except FileNotFoundError:
+        pass
+
+async def extract_pdf(spooled: Spooled, *, char_budget: int = None) -> str:
+    """
+    Text of a spooled PDF, from the content-hash cache or parsed in the worker
+    pool, stopping early once `char_budget` is satisfied. Consumes `spooled`.
+    """
+    try:
+        cached = _cache_get(spooled.digest, char_budget)
+        if cached is not None:
+            return cached
+        pool = _get_pool()
+        if pool is not None:
+            loop = asyncio.get_running_loop()
+            text, complete = await loop.run_in_executor(pool, _extract_pdf_path, spooled.path, char_budget)
+        else:
+            text, complete = await asyncio.to_thread(_extract_pdf_path, spooled.path, char_budget)
+    finally:
+        discard(spooled)
+    _cache_put(spooled.digest, text, None if complete else char_budget)
+    return text
+
+def cache_stats() -> dict:
+    with _cache_lock:
+        return {"entries": len(_cache), "max_entries": EXTRACT_CACHE_SIZE, "workers": EXTRACT_WORKERS}
@@ -0,0 +1,173 @@
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+# ------------ Config ------------
+JD_CACHE_SIZE = int(os.getenv("JD_CACHE_SIZE", "128"))
+MAX_REQUIREMENTS = 25
+MAX_REQUIREMENT_CHARS = 120
+
+# digest: sha256 of the normalized text; block: the text every prompt embeds;
+# dropped: requirements past MAX_REQUIREMENTS, left out of `requirements`
+PreparedJD = namedtuple("PreparedJD", "digest text requirements block dropped")
+
+# ------------ Normalization ------------
+_BULLET = re.compile(r"^\s*(?:[-*•·▪‣◦–—>]+|\(?\d{1,2}[.)]|[a-z][.)])\s+", re.IGNORECASE)
+
+def normalize_jd(text: str) -> str:
+    """
+    Canonical form of a job description: NFKC, unified bullets, single spaces,
+    no blank-line runs. Pasting the same JD twice (different editor, trailing
+    spaces, Windows newlines) yields byte-identical output.
+    """
+    text = unicodedata.normalize("NFKC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    lines = []
+    for raw in text.split("\n"):
+        line = re.sub(r"[ \t ]+", " ", raw).strip()
+        if not line:
+            if lines and lines[-1] != "":
+                lines.append("")
+            continue
+        if _BULLET.match(line):
+            line = "- " + _BULLET.sub("", line)
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+# ------------ Requirements ------------
+_SENTENCE_END = re.compile(r"\.\s+(?=[A-Z])")
+_HEADING = re.compile(r"^[^:]{0,40}:\s*$")
+_NOISE = re.compile(r"^(?:and|or|etc|e\.g|i\.e)\.?$", re.IGNORECASE)
+_OPTIONAL = re.compile(r"nice|plus|bonus|prefer|optional|desirable", re.IGNORECASE)
+# Lines about the role or the employer rather than asks of the candidate:
+# a title line, "What we offer:" / "About us:" sections, "We offer ..." sentences
+_TITLE = re.compile(
+    r"\b(?:engineer|developer|manager|architect|analyst|scientist|designer|administrator|consultant"
+    r"|specialist|director|intern|technician|officer)s?\b", re.IGNORECASE)
+_TITLE_LABEL = re.compile(r"^(?:job ?title|title|position|role)$", re.IGNORECASE)
+_EMPLOYER = re.compile(
+    r"\b(?:we offer|offer|benefits?|perks|about (?:us|the company|the team)|who we are|why (?:join|us)"
+    r"|compensation|salary|our culture)\b", re.IGNORECASE)
+_EMPLOYER_LEAD = re.compile(
+    r"^(?:we offer|we provide|we give|we are|we're|our |you(?:'ll| will) (?:get|enjoy|receive)|join (?:us|our)"
+    r"|benefits|perks)\b", re.IGNORECASE)
+
+def _is_title(line: str) -> bool:
+    return len(line.split()) <= 8 and not re.search(r"[,;:.]", line) and bool(_TITLE.search(line))
+
+def _candidate_sentences(line: str) -> str:
+    return "; ".join(s for s in _SENTENCE_END.split(line) if not _EMPLOYER_LEAD.match(s.strip()))
+
+def _split_items(line: str) -> list:
+    """Split on ; and , (not 1,000) and sentence ends, but never inside parentheses."""
+    items, depth, start = [], 0, 0
+    line = _SENTENCE_END.sub("; ", line)
+    for i, ch in enumerate(line):
+        if ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth = max(0, depth - 1)
+        elif depth == 0 and (ch == ";" or (ch == "," and not (
+            0 < i < len(line) - 1 and line[i - 1].isdigit() and line[i + 1].isdigit()
+        ))):
+            items.append(line[start:i])
+            start = i + 1
+    items.append(line[start:])
+    return items
+
+def _extract(normalized: str) -> tuple:
+    """extract_requirements() -> (requirements, how many more there were past MAX_REQUIREMENTS)."""
+    out = []
+    seen = set()
+    dropped = 0
+    optional_section = employer_section = False
+    first = True
+    for line in normalized.split("\n"):
+        bullet = line.startswith("- ")
+        line = line[2:] if bullet else line
+        if not line:
+            continue
+        if first and not bullet:
+            # the job title: the first line, or the first sentence of a one-paragraph JD
+            head, _, tail = _SENTENCE_END.sub("\n", line, count=1).partition("\n")
+            if _is_title(head.strip(" .")):
+                line = tail
+        first = False
+        if not line:
+            continue
+        if _HEADING.match(line):
+            optional_section = bool(_OPTIONAL.search(line))
+            employer_section = bool(_EMPLOYER.search(line)) and not optional_section
+            continue
+        if employer_section:
+            continue
+        optional = optional_section
+        label, sep, rest = line.partition(":")
+        if sep and rest.strip() and len(label) <= 40:
+            if _EMPLOYER.search(label) or _TITLE_LABEL.match(label.strip()):
+                continue
+            line = rest
+            optional = bool(_OPTIONAL.search(label))
+        for piece in _split_items(_candidate_sentences(line)):
+            piece = piece.strip(" .-–—")
+            if len(piece) < 2 or _NOISE.match(piece):
+                continue
+            piece = piece[:MAX_REQUIREMENT_CHARS]
+            if optional:
+                piece += " (nice to have)"
+            key = piece.lower()
+            if key not in seen:
+                seen.add(key)
+                if len(out) < MAX_REQUIREMENTS:
+                    out.append(piece)
+                else:
+                    dropped += 1
+    return out, dropped
+
+def extract_requirements(normalized: str) -> list:
+    """
+    Split a normalized JD into short, de-duplicated requirement phrases:
+    bullets, lines, semicolon/comma lists ("Linux, CI/CD, Docker/K8s").
+    A leading "Requirements:" style label on a line is dropped; items under a
+    "Nice to have:" style label are marked "(nice to have)". The job title,
+    "About us" / "What we offer" sections and "We offer ..." sentences are
+    not requirements and are skipped. At most MAX_REQUIREMENTS are kept.
+    """
+    return _extract(normalized)[0]
+
+def _block(normalized: str, requirements: list, dropped: int) -> str:
+    # The list first, one requirement per line so evidence can cite them,
+    # then the JD itself for the role context: a tight JD budget cuts the
+    # description's tail, never the list. Prose-only JDs are embedded as they are.
+    if len(requirements) < 2:
+        return f"JOB DESCRIPTION:\n{normalized}"
+    listed = "\n".join(f"- {r}" for r in requirements)
+    if dropped:
+        listed += f"\n({dropped} more requirements are only in the description below)"
+    return f"JOB REQUIREMENTS:\n{listed}\n\nJOB DESCRIPTION:\n{normalized}"
+
+# ------------ Cache ------------
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def jd_digest(text: str) -> str:
+    return hashlib.sha256(normalize_jd(text).encode("utf-8")).hexdigest()
+
+def prepare_jd(text: str) -> PreparedJD:
+    """Normalize and extract requirements once per JD hash; later calls hit the cache."""
+    normalized = normalize_jd(text)
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    with _lock:
+        hit = _cache.get(digest)
+        if hit is not None:
+            _cache.move_to_end(digest)
+            return hit
+    requirements, dropped = _extract(normalized)
+    prepared = PreparedJD(digest, normalized, requirements, _block(normalized, requirements, dropped), dropped)
+    with _lock:
+        _cache[digest] = prepared
+        while len(_cache) > JD_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return prepared
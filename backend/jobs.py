@@ -0,0 +1,299 @@
+import os
+import math
+import time
+import heapq
+import uuid
+import asyncio
+import logging
+import itertools
+import contextvars
+
+from backend import metrics
+
+# ------------ Config ------------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))            # jobs running at once
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))      # queued jobs per priority before 429
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))  # seconds finished jobs stay pollable
+
+# Lower runs first; ties run in submission order
+PRIORITIES = {"interactive": 0, "bulk": 10}
+FINISHED = ("done", "failed", "expired", "cancelled")  # terminal job states
+
+log = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full; retry in {retry_after} s")
+        self.retry_after = retry_after
+
+# ------------ Job ------------
+class Job:
+    """One unit of scheduled work: a zero-arg coroutine function and its outcome."""
+
+    def __init__(self, kind: str, run, *, priority: str, deadline: float = None, meta: dict = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.run = run
+        self.priority = priority
+        self.deadline = deadline  # time.monotonic() by which the client needs the result
+        self.meta = meta or {}
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.task = None
+        self.ctx = None           # the submitter's context, so its request timings see the job's stages
+        self.cancel_requested = False
+        self.changed = asyncio.Event()  # set once the job finishes
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+    def _finish(self, status: str, *, result=None, error: str = None) -> None:
+        self.status, self.result, self.error = status, result, error
+        self.finished = time.time()
+        self.changed.set()
+
+    def view(self, position: int = None) -> dict:
+        out = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            **self.meta,
+            "created_at": round(self.created, 3),
+        }
+        if position is not None:
+            out["queue_position"] = position
+        if self.deadline is not None and self.status in ("queued", "running"):
+            out["deadline_in_s"] = round(self.deadline - time.monotonic(), 1)
+        if self.started:
+            out["queued_ms"] = round((self.started - self.created) * 1000)
+        if self.finished and self.started:
+            out["run_ms"] = round((self.finished - self.started) * 1000)
+        if self.status == "done":
+            out["result"] = self.result
+        if self.error:
+            out["error"] = self.error
+        return out
+
+# ------------ Scheduler ------------
+class JobQueue:
+    """
+    Bounded worker pool fed by a priority heap. Jobs whose deadline passes
+    while queued are dropped unrun, running ones are cancelled at it. submit()
+    raises QueueFull (with a Retry-After estimate) instead of growing the queue.
+    Each priority has its own max_queued, so a bulk backlog never turns
+    interactive requests away.
+    """
+
+    def __init__(self, workers: int, max_queued: int, result_ttl: float):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self._heap = []  # (priority value, seq, job)
+        self._seq = itertools.count()
+        self._running = 0
+        self._avg_run = 5.0  # seconds; EWMA used for Retry-After
+        self._stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "expired": 0, "cancelled": 0}
+        self._wakeup = None
+        self._tasks = []
+
+    # ---- bookkeeping
+    def depth(self, priority: str = None) -> int:
+        return sum(1 for _, _, j in self._heap if j.status == "queued" and priority in (None, j.priority))
+
+    def _gauges(self) -> None:
+        metrics.JOBS_QUEUED.set(value=self.depth())
+        metrics.JOBS_RUNNING.set(value=self._running)
+
+    def retry_after(self, priority: str = None) -> int:
+        # only jobs of this priority or a more urgent one run before a new one
+        if priority is None:
+            queued = self.depth()
+        else:
+            rank = PRIORITIES.get(priority, 0)
+            queued = sum(self.depth(p) for p, v in PRIORITIES.items() if v <= rank)
+        waves = (queued + self._running) / self.workers
+        return max(1, min(300, math.ceil(waves * self._avg_run)))
+
+    def position(self, job: Job) -> int:
+        if job.status != "queued":
+            return None
+        ahead = sorted((p, s) for p, s, j in self._heap if j.status == "queued")
+        key = next((p, s) for p, s, j in self._heap if j is job)
+        return ahead.index(key)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        for job_id in [i for i, j in self.jobs.items() if j.finished and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def _drop_expired(self) -> None:
+        now = time.monotonic()
+        for _, _, job in self._heap:
+            if job.status == "queued" and job.expired(now):
+                self._ended(job, "expired", error="Deadline passed before the job started.")
+
+    def _ended(self, job: Job, status: str, **kw) -> None:
+        job._finish(status, **kw)
+        self._stats[status] += 1
+        metrics.JOBS_FINISHED.inc(job.kind, status)
+        self._gauges()
+
+    # ---- API
+    def admit(self, kind: str, priority: str) -> None:
+        """Raise QueueFull if a `priority` job would be rejected; check before doing work for one."""
+        self._prune()
+        self._drop_expired()
+        if self.depth(priority) >= self.max_queued:
+            self._stats["rejected"] += 1
+            metrics.JOBS_FINISHED.inc(kind, "rejected")
+            raise QueueFull(self.retry_after(priority))
+
+    def submit(self, job: Job) -> Job:
+        self._ensure_workers()
+        self.admit(job.kind, job.priority)
+        job.ctx = contextvars.copy_context()
+        self.jobs[job.id] = job
+        heapq.heappush(self._heap, (PRIORITIES.get(job.priority, 0), next(self._seq), job))
+        self._stats["submitted"] += 1
+        self._gauges()
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job: Job) -> bool:
+        if job.status == "queued":
+            self._ended(job, "cancelled")  # left in the heap; workers skip it
+            return True
+        if job.status == "running" and job.task is not None:
+            job.cancel_requested = True
+            job.task.cancel()
+            return True
+        return False
+
+    async def wait(self, job: Job) -> Job:
+        await job.changed.wait()
+        return job
+
+    async def run(self, job: Job):
+        """
+        Submit `job`, waiting (not failing) while the queue is full, and return
+        its result. The job is cancelled if the caller is; RuntimeError unless it succeeds.
+        """
+        while True:
+            try:
+                self.submit(job)
+                break
+            except QueueFull as e:
+                await asyncio.sleep(min(e.retry_after, 5))
+        try:
+            await self.wait(job)
+        finally:
+            if job.status not in FINISHED:
+                self.cancel(job)
+        if job.status != "done":
+            raise RuntimeError(job.error or f"job {job.status}")
+        return job.result
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.depth(),
+            "queued_by_priority": {p: self.depth(p) for p in PRIORITIES},
+            "running": self._running,
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "avg_run_s": round(self._avg_run, 2),
+            "retry_after_s": self.retry_after(),
+            **self._stats,
+        }
+
+    # ---- workers
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._tasks[0].get_loop() is loop and not self._tasks[0].done():
+            return
+        self._wakeup = asyncio.Event()
+        # a clean context: each job runs in its submitter's (see _run), not the first one's
+        self._tasks = [contextvars.Context().run(loop.create_task, self._worker()) for _ in range(self.workers)]
+
+    async def _next(self) -> Job:
+        while True:
+            while self._heap:
+                _, _, job = heapq.heappop(self._heap)
+                if job.status != "queued":
+                    continue  # cancelled while queued
+                if job.expired(time.monotonic()):
+                    self._ended(job, "expired", error="Deadline passed before the job started.")
+                    continue
+                return job
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._next()
+            job.status, job.started = "running", time.time()
+            self._running += 1
+            self._gauges()
+            metrics.JOB_WAIT_SECONDS.observe(job.priority, value=job.started - job.created)
+            try:
+                await self._run(job)
+            finally:
+                self._running -= 1
+                self._gauges()
+
+    async def _run(self, job: Job) -> None:
+        timeout = None if job.deadline is None else max(0.0, job.deadline - time.monotonic())
+
+        raised_by_job = False
+
+        async def run():
+            nonlocal raised_by_job
+            try:
+                return await job.run()
+            except asyncio.TimeoutError:
+                raised_by_job = True
+                raise
+
+        async def call():
+            # the coroutine is created inside the task, so cancelling a task that never ran leaks nothing
+            return await asyncio.wait_for(run(), timeout=timeout)
+
+        job.task = job.ctx.run(asyncio.get_running_loop().create_task, call())
+        started = time.perf_counter()
+        try:
+            result = await job.task
+        except asyncio.TimeoutError as e:
+            # not job.expired(): wait_for may fire up to one clock tick before the deadline
+            if not raised_by_job:
+                self._ended(job, "expired", error="Deadline passed while the job was running.")
+            else:
+                # raised by the job itself, e.g. an Ollama call timing out
+                log.warning("Job %s (%s) timed out: %r", job.id, job.kind, e)
+                self._ended(job, "failed", error=str(e) or "Timed out.")
+        except asyncio.CancelledError:
+            self._ended(job, "cancelled")
+            if not job.cancel_requested:
+                raise  # the worker itself is being shut down
+        except Exception as e:
+            log.warning("Job %s (%s) failed: %s", job.id, job.kind, e)
+            self._ended(job, "failed", error=str(e))
+        else:
+            self._ended(job, "done", result=result)
+        finally:
+            self._avg_run = 0.8 * self._avg_run + 0.2 * (time.perf_counter() - started)
+            job.task = None
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+
+job_queue = JobQueue(JOB_WORKERS, JOB_QUEUE_MAX, JOB_RESULT_TTL)
@@ -0,0 +1,73 @@
+import json
+
+class TopLevelJSONScanner:
+    """
+    Incrementally scans a streamed JSON object and hands back each top-level
+    member as soon as its value is complete, e.g. {"score": 85, ...} yields
+    ("score", 85) once the comma after 85 arrives.
+
+    Tolerates leading noise (fences, whitespace) before the opening brace.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0              # next char to scan
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.member_start = None  # start of the current top-level "key": value
+        self.started = False
+        self.closed = False       # top-level object finished
+
+    def feed(self, chunk: str) -> list:
+        """Append text; return [(key, value), ...] for members completed by it."""
+        if self.closed or not chunk:
+            return []
+        self.buf += chunk
+        out = []
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                    self.member_start = i + 1
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit(buf[self.member_start : i], out)
+                    self.closed = True
+                    i += 1
+                    break
+            elif ch == "," and self.depth == 1:
+                self._emit(buf[self.member_start : i], out)
+                self.member_start = i + 1
+            i += 1
+        self.pos = i
+        return out
+
+    @staticmethod
+    def _emit(member: str, out: list) -> None:
+        if not member.strip():
+            return
+        try:
+            out.extend(json.loads("{" + member + "}").items())
+        except ValueError:
+            pass  # malformed member; the full-text parse at the end still gets a say
+
+    @property
+    def text(self) -> str:
+        return self.buf
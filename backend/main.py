@@ -4,22 +4,31 @@ import logging
 import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv, find_dotenv
 
 # load env
 load_dotenv(find_dotenv())
 
-from backend.routes.resume import router as resume_router  # routes
-from backend.ollama_client import warmup as ollama_warmup  # <-- warmup(model)
+from backend.routes.resume import audits, router as resume_router  # routes
+from backend.routes.admin import router as admin_router
+from backend.extraction import shutdown_pool as shutdown_extract_pool
+from backend.ollama_client import aclose_client
+from backend.ollama_router import OLLAMA_URLS, router as ollama_router
+from backend import metrics
+from backend.jobs import job_queue
+from backend.residency import residency
 
 APP_TITLE = "GPT-OSS Hackathon Backend"
 APP_VERSION = "0.1.0"
 
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+OLLAMA_URL = OLLAMA_URLS[0]
 MODEL = os.getenv("MODEL", "llama3.2:3b")
 MODEL_COMPARE = os.getenv("MODEL_COMPARE", MODEL)
 AUTO_WARMUP = os.getenv("AUTO_WARMUP", "1")  # set to "0" to disable
 
+_loop_lag_task = None
+
 _default_origins = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -38,33 +47,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(resume_router, prefix="/resume")
+app.include_router(admin_router, prefix="/admin")
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "model": MODEL, "ollama_url": OLLAMA_URL}
+    return {"status": "ok", "model": MODEL, "ollama_url": OLLAMA_URL, "ollama_nodes": len(OLLAMA_URLS)}
 
 @app.get("/")
 def root():
     return {"message": "Welcome to GPT-OSS Hackathon backend", "model": MODEL, "ollama_url": OLLAMA_URL}
 
-async def _background_warm():
-    try:
-        logging.info("Warming compare model: %s", MODEL_COMPARE)
-        ollama_warmup(MODEL_COMPARE)
-        logging.info("Warming main model: %s", MODEL)
-        ollama_warmup(MODEL)
-        logging.info("Warmup done.")
-    except Exception as e:
-        logging.warning("Warmup failed: %s", e)
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latencies, token throughput, cold/warm loads and parser outcomes (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.on_event("startup")
 async def on_startup():
     logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per generation is noise
     logging.info("=== Backend started ===")
     logging.info("MODEL=%s", MODEL)
     logging.info("MODEL_COMPARE=%s", MODEL_COMPARE)
-    logging.info("OLLAMA_URL=%s", OLLAMA_URL)
+    logging.info("OLLAMA_URLS=%s", ",".join(OLLAMA_URLS))
     logging.info("CORS_ORIGINS=%s", CORS_ORIGINS)
+    ollama_router.start()
+    global _loop_lag_task
+    _loop_lag_task = asyncio.create_task(metrics.monitor_loop_lag())
+    residency.start()
+    await audits.resume_pending()
     if AUTO_WARMUP == "1":
-        asyncio.create_task(_background_warm()) 
+        for m in dict.fromkeys((MODEL_COMPARE, MODEL)):
+            residency.preload(m)  # background; logs when resident
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _loop_lag_task is not None:
+        _loop_lag_task.cancel()
+    await audits.stop()
+    await job_queue.stop()
+    await residency.stop()
+    await ollama_router.stop()
+    await aclose_client()
+    shutdown_extract_pool()
@@ -0,0 +1,238 @@
+import os
+import time
+import asyncio
+import threading
+import contextlib
+import contextvars
+
+# ------------ Config ------------
+# Add a Server-Timing header (per-stage milliseconds) to every response
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0") == "1"
+# A generation whose load_duration exceeds this had to load the model (cold)
+METRICS_COLD_LOAD_SECONDS = float(os.getenv("METRICS_COLD_LOAD_SECONDS", "0.5"))
+LOOP_LAG_INTERVAL = 0.1  # seconds between event-loop lag samples
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TPS_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# ------------ Metric types ------------
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels=()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0.0) + amount
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_labels(self.labels, values)} {v:g}")
+        return out
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels=(), buckets=SECONDS_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, *values, value: float) -> None:
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    le = _labels(self.labels + ("le",), values + (f"{bound:g}",))
+                    out.append(f"{self.name}_bucket{le} {n}")
+                out.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {series[-1]}")
+                out.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-2]:.6f}")
+                out.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return out
+
+class Gauge:
+    def __init__(self, name: str, doc: str, labels=()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, *values, value: float) -> None:
+        with self._lock:
+            self._values[values] = value
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_labels(self.labels, values)} {v:g}")
+        return out
+
+# ------------ Registry ------------
+STAGE_SECONDS = Histogram(
+    "resume_stage_seconds", "Time spent in each request pipeline stage.", ("stage",))
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route and status.", ("method", "route", "status"))
+OLLAMA_SECONDS = Histogram(
+    "ollama_stage_seconds",
+    "Generation time by model and stage (queue: waiting for a model slot; load, prefill, decode: "
+    "as reported by Ollama; total: whole HTTP call).",
+    ("model", "stage"))
+OLLAMA_TPS = Histogram(
+    "ollama_tokens_per_second", "Throughput per generation, prompt (prefill) and output (decode).",
+    ("model", "phase"), buckets=TPS_BUCKETS)
+OLLAMA_TOKENS = Counter(
+    "ollama_tokens_total", "Prompt (prefill) and output (decode) tokens processed.", ("model", "phase"))
+OLLAMA_LOADS = Counter(
+    "ollama_generations_total",
+    "Generations by model residency: cold (model was loaded for it) or warm.", ("model", "residency"))
+PARSE_OUTCOMES = Counter(
+    "llm_parse_total",
+    "Model output parsing: json (clean), rescued (largest {...} kept), regenerated (cut off by "
+    "num_predict or missing a score, run again), repaired (restated by a repair prompt, kept only where the "
+    "output stated it), fallback (scored 0).",
+    ("outcome",))
+EARLY_STOPS = Counter(
+    "ollama_early_stops_total", "Generations cut off once their JSON object closed instead of padding on.",
+    ("model",))
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer; high values mean blocking work on the loop.")
+JOBS_QUEUED = Gauge("jobs_queued", "Scoring jobs waiting for a worker.")
+JOBS_RUNNING = Gauge("jobs_running", "Scoring jobs being worked on.")
+JOBS_FINISHED = Counter(
+    "jobs_total", "Scoring jobs by outcome: done, failed, expired, cancelled, rejected (queue full).",
+    ("kind", "status"))
+JOB_WAIT_SECONDS = Histogram("job_queue_wait_seconds", "Time jobs spent queued before a worker took them.",
+                             ("priority",))
+
+METRICS = (
+    LOOP_LAG, STAGE_SECONDS, REQUEST_SECONDS, OLLAMA_SECONDS, OLLAMA_TPS, OLLAMA_TOKENS, OLLAMA_LOADS,
+    PARSE_OUTCOMES, EARLY_STOPS, JOBS_QUEUED, JOBS_RUNNING, JOBS_FINISHED, JOB_WAIT_SECONDS,
+)
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    return "\n".join(line for m in METRICS for line in m.render()) + "\n"
+
+# ------------ Per-request timings ------------
+# stage -> seconds for the request being served (Server-Timing header)
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+def _record(stage: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Time a pipeline stage into resume_stage_seconds (and the request's Server-Timing)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(name, value=elapsed)
+        _record(name, elapsed)
+
+def observe_queue(model: str, seconds: float) -> None:
+    OLLAMA_SECONDS.observe(model, "queue", value=seconds)
+    _record("queue", seconds)
+
+def observe_generation(model: str, data: dict, elapsed: float) -> None:
+    """Record an Ollama response's own timings (durations are in nanoseconds)."""
+    OLLAMA_SECONDS.observe(model, "total", value=elapsed)
+    _record("ollama", elapsed)
+    load = data.get("load_duration")
+    if load is not None:
+        load /= 1e9
+        OLLAMA_SECONDS.observe(model, "load", value=load)
+        _record("load", load)
+        OLLAMA_LOADS.inc(model, "cold" if load > METRICS_COLD_LOAD_SECONDS else "warm")
+    for phase, count_key, duration_key in (
+        ("prefill", "prompt_eval_count", "prompt_eval_duration"),
+        ("decode", "eval_count", "eval_duration"),
+    ):
+        count, duration = data.get(count_key), data.get(duration_key)
+        if count:
+            OLLAMA_TOKENS.inc(model, phase, amount=count)
+        if duration:
+            OLLAMA_SECONDS.observe(model, phase, value=duration / 1e9)
+            _record(phase, duration / 1e9)
+            if count:
+                OLLAMA_TPS.observe(model, phase, value=count / (duration / 1e9))
+
+def observe_parse(outcome: str) -> None:
+    PARSE_OUTCOMES.inc(outcome)
+
+def observe_early_stop(model: str) -> None:
+    EARLY_STOPS.inc(model)
+
+async def monitor_loop_lag() -> None:
+    """Sample event-loop lag forever (run as a background task)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(value=max(0.0, loop.time() - expected))
+
+# ------------ Middleware ------------
+def _server_timing(timings: dict, total: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request latency by route, and with METRICS_SERVER_TIMING
+    a Server-Timing header listing the stages the request went through. For
+    streaming responses the header only covers work done before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        token = _timings.set({})
+        timings = _timings.get()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if METRICS_SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - started)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(scope["method"], path, str(status[0]), value=time.perf_counter() - started)
@@ -0,0 +1,45 @@
+import hashlib
+from collections import namedtuple
+
+from backend.anonymizer import anonymize
+from backend.cache import normalize_text
+from backend.prompt_packer import pack_resume
+
+# One parsed resume as kept in the resumes table (backend.database).
+# text: extracted text; packed: prioritized sections (pack_resume, char cap
+# only, the token budget depends on the JD); anonymized: packed, redacted.
+StoredResume = namedtuple(
+    "StoredResume",
+    "id content_hash text_hash filename content_type size text packed anonymized created_at last_seen_at",
+)
+
+def text_digest(text: str) -> str:
+    """Hash of the whitespace-normalized text: the same resume re-exported to PDF dedupes."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def build_record(*, text: str, content_hash: str, filename: str, content_type: str, size: int,
+                 max_chars: int) -> dict:
+    """Column values for database.resume_put(): everything later scoring needs, computed once."""
+    packed = pack_resume(text, max_chars=max_chars)
+    return {
+        "content_hash": content_hash,
+        "text_hash": text_digest(text),
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "text": text,
+        "packed": packed,
+        "anonymized": anonymize(packed).text,
+    }
+
+def from_row(row) -> StoredResume:
+    return StoredResume(**{f: row[f] for f in StoredResume._fields})
+
+def summary(row) -> dict:
+    """API view of a stored resume without its text (list/search rows work too)."""
+    keys = row.keys()
+    out = {k: row[k] for k in ("id", "filename", "content_type", "size", "created_at", "last_seen_at") if k in keys}
+    for extra in ("chars", "snippet"):
+        if extra in keys:
+            out[extra] = row[extra]
+    return out
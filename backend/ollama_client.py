@@ -1,58 +1,420 @@
 import os
 import json
+import math
 import re
+import time
+import asyncio
 import requests
 import threading
+from collections import deque
+import httpx
+
+from backend import metrics
+from backend.jd import MAX_REQUIREMENT_CHARS, prepare_jd
+from backend.json_stream import TopLevelJSONScanner
+from backend.ollama_router import ROUTER_RETRIES, NodeBusy, _model_name, router
+from backend.residency import OLLAMA_KEEP_ALIVE, residency
+from backend.prompt_packer import estimate_tokens, truncate_tokens
 
 # ------------ Config ------------
-OLLAMA_API = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434") + "/api/generate"
+# Ollama endpoints: OLLAMA_URLS / OLLAMA_URL, see backend.ollama_router
 MODEL = os.getenv("MODEL", "llama3.2:3b")  # safe default for 16-GB M1 Pro
 
-# serialize generations to avoid daemon contention oddities
-_gen_lock = threading.Lock()
+# Generations allowed in flight per model and node. "1" keeps the old fully-serialized
+# behaviour; OLLAMA_MODEL_CONCURRENCY overrides it per model ("m1=2,m2=1").
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1"))
+OLLAMA_MODEL_CONCURRENCY = {
+    k.strip(): int(v)
+    for k, _, v in (p.rpartition("=") for p in os.getenv("OLLAMA_MODEL_CONCURRENCY", "").split(","))
+    if k.strip() and v.strip().isdigit()
+}
+# Keep-alive connection pool shared by every async call
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+
+# Bump whenever prompt wording changes so cached scores are not reused
+PROMPT_VERSION = "5"
+
+# num_predict budget per prompt variant ("requirements": per listed requirement).
+# Prompts are packed to leave this much room; the adaptive budget stays below it.
+NUM_PREDICT = {"explained": 280, "quick": 200, "compare": 240, "requirements": 40}
+
+# Send each variant's JSON schema as `format` (Ollama >= 0.5); "0" sends plain "json"
+OLLAMA_JSON_SCHEMA = os.getenv("OLLAMA_JSON_SCHEMA", "1") == "1"
+# Adaptive num_predict: output lengths remembered per (model, variant), and how many before adapting
+OUTPUT_BUDGET_WINDOW = int(os.getenv("OUTPUT_BUDGET_WINDOW", "200"))
+OUTPUT_BUDGET_MIN_SAMPLES = int(os.getenv("OUTPUT_BUDGET_MIN_SAMPLES", "20"))
+OUTPUT_BUDGET_HEADROOM = 1.3  # times the p95 output length
+# A call's timeout covers its regenerate and repair attempts too; with less
+# than this many seconds left they are skipped and the call falls back.
+RETRY_MIN_SECONDS = float(os.getenv("RETRY_MIN_SECONDS", "5"))
+
+# Requirements judged per generation in requirement-by-requirement scoring
+REQUIREMENTS_PER_CALL = int(os.getenv("REQUIREMENTS_PER_CALL", "5"))
+
+# Context packing: tokens kept free for the chat template, and the largest
+# share of the remaining context the job description may take from the resume.
+CTX_RESERVE = int(os.getenv("CTX_RESERVE", "48"))
+JD_MAX_SHARE = float(os.getenv("JD_MAX_SHARE", "0.4"))
 
 SYSTEM = (
     "You are an HR resume evaluator. "
     "Return ONLY strict JSON; no markdown, no extra text, no code fences."
 )
 
-# ------------ HTTP helper ------------
-def _post(prompt: str, *, model: str, timeout: int, num_ctx: int, num_predict: int):
+# ------------ Concurrency limits ------------
+# A model's semaphore holds the slots of every node, so callers queue here in
+# order; router.pick(limit=...) then keeps each node within its own limit.
+_BUSY_POLL = 0.05  # seconds between picks while every eligible node is at its limit
+_slots_lock = threading.Lock()
+_sync_slots: dict = {}
+_async_slots: dict = {}
+
+def _limit_for(model: str) -> int:
+    """Generations of `model` allowed in flight on one node."""
+    return max(1, OLLAMA_MODEL_CONCURRENCY.get(model, OLLAMA_MAX_CONCURRENCY))
+
+def _sync_slot(model: str) -> threading.BoundedSemaphore:
+    with _slots_lock:
+        if model not in _sync_slots:
+            _sync_slots[model] = threading.BoundedSemaphore(_limit_for(model) * len(router))
+        return _sync_slots[model]
+
+def _async_slot(model: str) -> asyncio.Semaphore:
+    # asyncio primitives bind to the running loop on first use; recreate if the
+    # loop changed (tests, uvicorn --reload workers).
+    loop = asyncio.get_running_loop()
+    entry = _async_slots.get(model)
+    if entry is None or entry[0] is not loop:
+        entry = (loop, asyncio.Semaphore(_limit_for(model) * len(router)))
+        _async_slots[model] = entry
+    return entry[1]
+
+# ------------ HTTP helpers ------------
+_session = requests.Session()
+_client = None  # httpx.AsyncClient, created lazily inside the running loop
+
+def generation_options(num_ctx: int, num_predict: int) -> dict:
+    return {
+        "temperature": 0,
+        "num_ctx": num_ctx,
+        "num_predict": num_predict,
+        "repeat_penalty": 1.05,
+        "top_k": 30,
+    }
+
+def _payload(prompt: str, *, model: str, num_ctx: int, num_predict: int, stream: bool = False,
+             logprobs: bool = False, schema: dict = None) -> dict:
     payload = {
         "model": model,
         "prompt": prompt,
-        "stream": False,
-        "keep_alive": "1h",
-        "format": "json",  # ask Ollama to emit valid JSON
-        "options": {
-            "temperature": 0,
-            "num_ctx": num_ctx,
-            "num_predict": num_predict,
-            "repeat_penalty": 1.05,
-            "top_k": 30,
-        },
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,  # busy models are kept loaded by backend.residency
+        # constrain decoding to the schema, or at least to valid JSON
+        "format": schema if schema is not None and OLLAMA_JSON_SCHEMA else "json",
+        "options": generation_options(num_ctx, num_predict),
+    }
+    if logprobs:
+        payload["logprobs"] = True  # ignored by Ollama versions without logprob support
+    return payload
+
+# ------------ Routing ------------
+# Scoring calls run at temperature 0, so any failure that happened before a
+# node produced an answer can be retried on another node.
+def _status_of(e: Exception):
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code
+    return None
+
+def _retryable(e: Exception) -> bool:
+    status = _status_of(e)
+    if status is not None:
+        return status == 404 or status >= 500  # model missing there, or node trouble
+    return isinstance(e, (httpx.TransportError, requests.ConnectionError, requests.Timeout))
+
+def _settle_failure(node, model: str, e: Exception, tried: list) -> None:
+    """Record a failed attempt on `node`; re-raise unless another node should be tried."""
+    if _status_of(e) == 404:
+        router.model_missing(node, model)
+    else:
+        router.done(node, model, error=e)
+    tried.append(node)
+    if not _retryable(e) or len(tried) > ROUTER_RETRIES or len(tried) >= len(router):
+        raise e
+    router.retried(node)
+
+def _pick(model: str, tried: list, timeout: float):
+    # the slots outnumber free nodes only while some are down or already tried
+    end = time.monotonic() + timeout
+    while True:
+        try:
+            return router.pick(model, exclude=tried, limit=_limit_for(model))
+        except NodeBusy:
+            left = end - time.monotonic()
+            if left <= 0:
+                raise
+            time.sleep(min(_BUSY_POLL, left))
+
+async def _apick(model: str, tried: list, remaining):
+    while True:
+        try:
+            return router.pick(model, exclude=tried, limit=_limit_for(model))
+        except NodeBusy:
+            await asyncio.sleep(min(_BUSY_POLL, remaining()))
+
+def _observe(model: str, data: dict, elapsed: float) -> None:
+    metrics.observe_generation(model, data, elapsed)
+    residency.record(model, data, elapsed)
+
+def _post(prompt: str, *, model: str, timeout: int, num_ctx: int, num_predict: int, schema: dict = None):
+    payload = _payload(prompt, model=model, num_ctx=num_ctx, num_predict=num_predict, schema=schema)
+    residency.touch(model)
+    tried = []
+    queued = time.perf_counter()
+    with _sync_slot(model):
+        metrics.observe_queue(model, time.perf_counter() - queued)
+        while True:
+            node = _pick(model, tried, timeout)
+            started = time.perf_counter()
+            try:
+                r = _session.post(node.generate_url, json=payload, timeout=timeout)
+                r.raise_for_status()
+                data = r.json()  # {"response": <dict or str>, ...}
+            except requests.ReadTimeout:
+                # the caller's timeout, not a node failure
+                router.release(node, model)
+                raise
+            except Exception as e:
+                _settle_failure(node, model, e, tried)
+                continue
+            elapsed = time.perf_counter() - started
+            router.done(node, model, elapsed=elapsed)
+            _observe(model, data, elapsed)
+            return data
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OLLAMA_POOL_SIZE,
+                max_keepalive_connections=OLLAMA_POOL_SIZE,
+            ),
+            timeout=httpx.Timeout(None, connect=OLLAMA_CONNECT_TIMEOUT),
+        )
+    return _client
+
+async def aclose_client() -> None:
+    """Close the pooled async client (call on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _apost(prompt: str, *, model: str, timeout: float, num_ctx: int, num_predict: int,
+                 logprobs: bool = False, schema: dict = None):
+    """
+    Async twin of _post. Streams underneath so the generation ends as soon as
+    the JSON object closes (see _apost_stream), and returns the same dict as a
+    non-streaming call. `timeout` is a deadline for the whole call, including
+    time spent waiting for a model slot. Cancelling the awaiting task closes the
+    HTTP connection, which makes Ollama abort the generation.
+    """
+    text, probs, final = [], [], {}
+    # buffered: a node failing mid-answer is retried elsewhere, nothing was returned yet
+    async for chunk in _apost_stream(prompt, model=model, timeout=timeout, num_ctx=num_ctx, num_predict=num_predict,
+                                     logprobs=logprobs, schema=schema, stop_on_close=True, buffered=True):
+        text.append(chunk.get("response", ""))
+        probs.extend(chunk.get("logprobs") or [])
+        if chunk.get("done"):
+            final = chunk
+    return {**final, "response": "".join(text), "logprobs": probs}
+
+def _early_final(model: str, tokens: int, cold: bool, started: float, first_token: float) -> dict:
+    """
+    Final chunk for a stream cut short after the JSON object closed. Ollama only
+    reports durations in its own final chunk, so they are measured here: the
+    wait for the first token counts as loading when the model was not resident
+    on the node, as prefill otherwise.
+    """
+    now = time.perf_counter()
+    first_token = first_token or now
+    waited = round((first_token - started) * 1e9)
+    return {
+        "model": model, "response": "", "done": True, "done_reason": "object_closed",
+        "load_duration": waited if cold else 0,
+        "prompt_eval_duration": 0 if cold else waited,
+        "eval_count": tokens,
+        "eval_duration": round((now - first_token) * 1e9),
     }
-    with _gen_lock:
-        r = requests.post(OLLAMA_API, json=payload, timeout=timeout)
-    r.raise_for_status()
-    return r.json()  # {"response": <dict or str>, ...}
+
+async def _apost_stream(prompt: str, *, model: str, timeout: float, num_ctx: int, num_predict: int,
+                        logprobs: bool = False, schema: dict = None, stop_on_close: bool = False,
+                        buffered: bool = False):
+    """
+    Streaming twin of _apost: async generator over Ollama's NDJSON chunks.
+    `timeout` is a deadline for the whole stream; closing the generator early
+    closes the connection and stops the generation.
+
+    With `stop_on_close`, a token arriving after the top-level JSON object has
+    closed is not waited out: JSON mode can pad with whitespace up to
+    num_predict, so the connection is dropped and a final chunk with
+    done_reason "object_closed" ends the stream instead.
+
+    A node failing before anything was yielded is retried on another one. With
+    `buffered`, chunks are held until the generation has finished, so that
+    holds for failures mid-answer too.
+    """
+    payload = _payload(prompt, model=model, num_ctx=num_ctx, num_predict=num_predict, stream=True,
+                       logprobs=logprobs, schema=schema)
+    residency.touch(model)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    def remaining() -> float:
+        left = deadline - loop.time()
+        if left <= 0:
+            raise asyncio.TimeoutError()
+        return left
+
+    queued = time.perf_counter()
+    await asyncio.wait_for(_async_slot(model).acquire(), timeout=remaining())
+    metrics.observe_queue(model, time.perf_counter() - queued)
+    tried = []
+    try:
+        while True:
+            node = await _apick(model, tried, remaining)
+            cold = _model_name(model) not in node.resident
+            started = time.perf_counter()
+            first_token = None
+            yielded = False
+            held = []
+            final = {}
+            scanner = TopLevelJSONScanner() if stop_on_close else None
+            tokens = 0
+            try:
+                async with _get_client().stream("POST", node.generate_url, json=payload) as r:
+                    r.raise_for_status()
+                    lines = r.aiter_lines()
+                    while not final:
+                        try:
+                            line = await asyncio.wait_for(lines.__anext__(), timeout=remaining())
+                        except StopAsyncIteration:
+                            break
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("done"):
+                            final = chunk
+                        elif scanner is not None and scanner.closed:
+                            chunk = final = _early_final(model, tokens, cold, started, first_token)
+                            metrics.observe_early_stop(model)
+                        else:
+                            tokens += 1
+                            first_token = first_token or time.perf_counter()
+                            if scanner is not None:
+                                scanner.feed(chunk.get("response", ""))
+                        if buffered:
+                            held.append(chunk)
+                        else:
+                            yielded = True
+                            yield chunk
+            except (asyncio.CancelledError, GeneratorExit, asyncio.TimeoutError):
+                # our caller gave up or ran out of time; the node did nothing wrong
+                router.release(node, model)
+                raise
+            except Exception as e:
+                if yielded:
+                    # part of the answer is already out: a retry would repeat it
+                    router.done(node, model, error=e)
+                    raise
+                _settle_failure(node, model, e, tried)
+                continue
+            elapsed = time.perf_counter() - started
+            router.done(node, model, elapsed=elapsed)
+            _observe(model, final, elapsed)
+            for chunk in held:
+                yield chunk
+            return
+    finally:
+        _async_slot(model).release()
+
+async def _stream_fields(variant: str, prompt: str, *, model: str, timeout: float, num_ctx: int):
+    """
+    Yield ("field", key, value) for each top-level JSON member as soon as it is
+    decodable, then ("done", parsed_dict, ollama_stats). Output that does not
+    fit the schema is repaired (_arepair) before "done", within the same `timeout`.
+    """
+    left = _time_left(timeout)
+    scanner = TopLevelJSONScanner()
+    stats = {}
+    num_predict = output_budgets.get(model, variant)
+    async for chunk in _apost_stream(prompt, model=model, timeout=timeout, num_ctx=num_ctx, num_predict=num_predict,
+                                     schema=SCHEMAS[variant], stop_on_close=True):
+        for key, value in scanner.feed(chunk.get("response", "")):
+            yield ("field", key, value)
+        if chunk.get("done"):
+            stats = {k: v for k, v in chunk.items() if k not in ("response", "context")}
+    output_budgets.record(model, variant, stats.get("eval_count") or 0, truncated=stats.get("done_reason") == "length")
+    parsed, outcome = _decode_json(scanner.text)
+    if _conforms(SCHEMAS[variant], parsed):
+        metrics.observe_parse(outcome)
+    else:
+        parsed = None
+        if stats.get("done_reason") != "length" and left() >= RETRY_MIN_SECONDS:
+            parsed = await _arepair(variant, scanner.text, model=model, timeout=left(), num_ctx=num_ctx,
+                                    num_predict=NUM_PREDICT[variant])
+        if parsed is not None:
+            metrics.observe_parse("repaired")
+        elif left() >= RETRY_MIN_SECONDS:
+            # cut off, or missing what only the model can say: ask again
+            parsed, _, _ = await _agenerate_json(variant, prompt, model=model, timeout=left(), num_ctx=num_ctx)
+        else:
+            metrics.observe_parse("fallback")
+            parsed = dict(_FALLBACK)
+    yield ("done", parsed, stats)
 
 # ------------ Utilities ------------
-def warmup(model: str) -> str:
-    """Spin up model quickly to avoid first-token latency."""
-    data = _post("Say GO!", model=model, timeout=120, num_ctx=512, num_predict=12)
-    resp = data.get("response")
-    if isinstance(resp, dict):
-        return "GO!"
-    return (resp or "GO!").strip().replace("```", "")[:10] or "GO!"
+_SCORE_KEY = re.compile(r'"score"\s*:\s*$')
+
+def _score_confidence(data: dict):
+    """
+    The model's probability for the exact score it wrote: the product of the
+    digit tokens' probabilities after "score":. None without logprobs.
+    """
+    entries = data.get("logprobs") or []
+    text = ""
+    for i, entry in enumerate(entries):
+        if _SCORE_KEY.search(text):
+            total = 0.0
+            seen = False
+            for tok in entries[i:]:
+                piece = tok.get("token", "").strip()
+                if not piece and not seen:
+                    continue
+                if not piece.isdigit():
+                    break
+                total += tok.get("logprob", 0.0)
+                seen = True
+            return round(math.exp(total), 4) if seen else None
+        text += entry.get("token", "")
+    return None
 
 def _strip_fences(s: str) -> str:
     return re.sub(r"^```(?:json)?\s*|\s*```$", "", (s or "").strip(), flags=re.IGNORECASE)
 
-def _parse_json(raw):
-    """Robustly parse model output into dict; rescue largest {...} if needed."""
+# what callers get when even a repair produced nothing usable; fields are coerced downstream
+_FALLBACK = {"score": 0, "summary": "Unable to parse model output", "evidence": [], "risks": []}
+
+def _decode_json(raw) -> tuple:
+    """
+    Robustly parse model output -> (value, "json" | "rescued"), rescuing the
+    largest {...} if needed, or (None, "fallback").
+    """
     if isinstance(raw, dict):
-        return raw
+        return raw, "json"
 
     if isinstance(raw, bytes):
         try:
@@ -61,26 +423,457 @@ def _parse_json(raw):
             raw = str(raw)
     elif not isinstance(raw, str):
         try:
-            return json.loads(json.dumps(raw))
+            return json.loads(json.dumps(raw)), "json"
         except Exception:
             raw = str(raw)
 
     raw = _strip_fences(raw)
 
     try:
-        return json.loads(raw)
+        return json.loads(raw), "json"
     except Exception:
         s, e = raw.find("{"), raw.rfind("}")
         if s != -1 and e > s:
             try:
-                return json.loads(raw[s : e + 1])
+                return json.loads(raw[s : e + 1]), "rescued"
             except Exception:
                 pass
+    return None, "fallback"
+
+# ------------ Prompts ------------
+# Every prompt starts with the same bytes: SYSTEM, the shared rules and the
+# prepared JD block (backend.jd). Only what follows differs per variant and per
+# candidate, so Ollama can reuse the evaluated prefix (its KV cache) across
+# all resumes scored against one JD. Keep anything variable out of the prefix.
+SHARED_RULES = (
+    "Judge only job-relevant skills, experience and evidence in the resume text. "
+    "Scores are integers 0-100."
+)
+
+def _prefix(jd_block: str) -> str:
+    return f"{SYSTEM}\n{SHARED_RULES}\n\n{jd_block}\n\n"
+
+def _explained_prompt(resume_text: str, jd_block: str) -> str:
+    return (
+        _prefix(jd_block)
+        + "Task: Score how well the RESUME matches the job.\n"
+        "Rules: summary <= 160 chars; evidence <= 3 items; risks <= 2 items. "
+        "Use short phrases for evidence.match and risks. Return EXACTLY these keys.\n"
+        'Output example: {"score": 85, "summary": "…", '
+        '"evidence": [{"requirement":"Kubernetes","match":"2y AKS ops"}], '
+        '"risks": ["No Terraform"]}\n\n'
+        f"RESUME:\n{resume_text}\n"
+    )
+
+def _quick_prompt(resume_text: str, jd_block: str) -> str:
+    return (
+        _prefix(jd_block)
+        + "Task: Score RESUME vs the job.\n"
+        "Return compact JSON: score, summary(<=120 chars), evidence(max 2), risks(max 1).\n"
+        'Expected: {"score": 82, "summary": "…", "evidence":[{"requirement":"Kubernetes","match":"AKS"}], "risks":["No Terraform"]}\n\n'
+        f"RESUME:\n{resume_text}\n"
+    )
+
+def _compare_prompt(jd_block: str, original_text: str, anonymized_text: str) -> str:
+    return (
+        _prefix(jd_block)
+        + "You will compare two versions of the same resume against the job.\n"
+        "Version A is ORIGINAL (with identity & specific details). "
+        "Version B is ANONYMIZED (identity removed; some specifics may be masked).\n"
+        "Score each version for relevance to the job; give a one-sentence summary "
+        "for each; compute delta = A - B.\n"
+        "Respond ONLY with valid JSON (no extra text):\n"
+        '{"original":{"score":85,"summary":"..."},'
+        '"anonymized":{"score":78,"summary":"..."},'
+        '"delta":7}\n\n'
+        f"ORIGINAL (A):\n{original_text}\n\n"
+        f"ANONYMIZED (B):\n{anonymized_text}\n"
+    )
+
+def _requirements_prompt(resume_text: str, requirements: list) -> str:
+    # The resume comes first here: its prefix is shared by every batch of
+    # requirements and survives edits of the JD.
+    listed = "\n".join(f"{i}. {r}" for i, r in enumerate(requirements, start=1))
+    return (
+        f"{SYSTEM}\n{SHARED_RULES}\n\nRESUME:\n{resume_text}\n\n"
+        "Task: For each numbered requirement, judge whether the RESUME shows it. "
+        'met is "yes", "partial" or "no"; match is the resume evidence as a short phrase '
+        '(<= 60 chars, "" when there is none). One entry per requirement.\n'
+        'Output example: {"requirements": [{"id": 1, "met": "yes", "match": "2y AKS ops"}, '
+        '{"id": 2, "met": "no", "match": ""}]}\n\n'
+        f"REQUIREMENTS:\n{listed}\n"
+    )
 
-    # fallback; caller will coerce fields safely
-    return {"score": 0, "summary": "Unable to parse model output", "evidence": [], "risks": []}
+_BUILDERS = {
+    "explained": lambda jd_block, resume: _explained_prompt(resume, jd_block),
+    "quick": lambda jd_block, resume: _quick_prompt(resume, jd_block),
+    "compare": lambda jd_block, original, anonymized: _compare_prompt(jd_block, original, anonymized),
+}
+
+# ------------ Context budgets ------------
+def _budgets(variant: str, *, num_ctx: int, n_resumes: int, jd_tokens: int) -> tuple:
+    # The JD budget depends only on the JD and the context size, never on the
+    # resume: a JD cut differently per candidate would break prefix reuse.
+    overhead = estimate_tokens(_BUILDERS[variant]("", *[""] * n_resumes))
+    available = max(0, num_ctx - NUM_PREDICT[variant] - overhead - CTX_RESERVE)
+    jd_budget = min(jd_tokens, int(available * JD_MAX_SHARE))
+    return jd_budget, (available - jd_budget) // n_resumes
+
+# worst-case prompt tokens of one listed requirement
+_REQUIREMENT_TOKENS = MAX_REQUIREMENT_CHARS // 3
+
+def _requirements_predict(n: int, per: int = NUM_PREDICT["requirements"]) -> int:
+    return per * n + 16
+
+def _requirements_budget(num_ctx: int) -> int:
+    # Sized for a full batch of the longest requirements and never for the
+    # actual JD, so the resume is cut the same way whatever the JD says.
+    overhead = estimate_tokens(_requirements_prompt("", [])) + REQUIREMENTS_PER_CALL * _REQUIREMENT_TOKENS
+    return max(0, num_ctx - _requirements_predict(REQUIREMENTS_PER_CALL) - overhead - CTX_RESERVE)
+
+def resume_token_budget(variant: str, *, job_description: str, num_ctx: int) -> int:
+    """Estimated tokens one resume may use in `variant`'s prompt for this JD and context."""
+    if variant == "requirements":
+        return _requirements_budget(num_ctx)
+    n_resumes = 2 if variant == "compare" else 1
+    return _budgets(
+        variant,
+        num_ctx=num_ctx,
+        n_resumes=n_resumes,
+        jd_tokens=estimate_tokens(prepare_jd(job_description).block),
+    )[1]
+
+def _fit_prompt(variant: str, *, num_ctx: int, job_description: str, resumes: list) -> str:
+    """
+    Build `variant`'s prompt with the JD block and resume(s) cut to explicit
+    budgets, so prompt + num_predict fits num_ctx instead of being truncated
+    by Ollama.
+    """
+    jd_block = prepare_jd(job_description).block
+    jd_budget, per_resume = _budgets(
+        variant,
+        num_ctx=num_ctx,
+        n_resumes=len(resumes),
+        jd_tokens=estimate_tokens(jd_block),
+    )
+    return _BUILDERS[variant](
+        truncate_tokens(jd_block, jd_budget),
+        *(truncate_tokens(r, per_resume) for r in resumes),
+    )
+
+# ------------ Structured output ------------
+# Each variant's answer as a JSON schema: sent as Ollama's `format` so decoding
+# cannot leave it, and used to check what came back before it is scored.
+_EVIDENCE = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"requirement": {"type": "string"}, "match": {"type": "string"}},
+        "required": ["requirement", "match"],
+    },
+}
+_SCORE = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "summary": {"type": "string"},
+        "evidence": _EVIDENCE,
+        "risks": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["score", "summary", "evidence", "risks"],
+}
+_SIDE = {
+    "type": "object",
+    "properties": {"score": {"type": "integer"}, "summary": {"type": "string"}},
+    "required": ["score", "summary"],
+}
+SCHEMAS = {
+    "explained": _SCORE,
+    "quick": _SCORE,
+    "compare": {
+        "type": "object",
+        "properties": {"original": _SIDE, "anonymized": _SIDE, "delta": {"type": "integer"}},
+        "required": ["original", "anonymized", "delta"],
+    },
+    "requirements": {
+        "type": "object",
+        "properties": {
+            "requirements": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "met": {"type": "string", "enum": ["yes", "partial", "no"]},
+                        "match": {"type": "string"},
+                    },
+                    "required": ["id", "met", "match"],
+                },
+            },
+        },
+        "required": ["requirements"],
+    },
+}
+
+def _conforms(schema: dict, value) -> bool:
+    """Whether `value` has the schema's required keys, objects, arrays and integers (items are coerced later)."""
+    kind = schema.get("type")
+    if kind == "object":
+        return isinstance(value, dict) and all(
+            k in value and _conforms(schema["properties"].get(k, {}), value[k]) for k in schema.get("required", ())
+        )
+    if kind == "array":
+        return isinstance(value, list)
+    if kind == "integer":
+        try:
+            int(value)
+        except (TypeError, ValueError):
+            return False
+        return not isinstance(value, bool)
+    return True
+
+class OutputBudgets:
+    """
+    num_predict per (model, variant) from the output lengths actually seen:
+    the p95 of the last OUTPUT_BUDGET_WINDOW generations plus headroom, never
+    above NUM_PREDICT (the room the prompt was packed for) nor below a quarter
+    of it. Truncated generations count as NUM_PREDICT, so once more than 5% of
+    them are cut off the budget is back at the default.
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, variant: str) -> int:
+        ceiling = NUM_PREDICT[variant]
+        with self._lock:
+            seen = sorted(self._seen.get((model, variant), ()))
+        if len(seen) < OUTPUT_BUDGET_MIN_SAMPLES:
+            return ceiling
+        p95 = seen[int(0.95 * (len(seen) - 1))]
+        return max(ceiling // 4, min(ceiling, math.ceil(p95 * OUTPUT_BUDGET_HEADROOM)))
+
+    def record(self, model: str, variant: str, tokens: float, truncated: bool = False) -> None:
+        """`tokens`: eval_count of one generation ("requirements": per requirement)."""
+        if truncated:
+            tokens = NUM_PREDICT[variant]
+        if not tokens:
+            return
+        with self._lock:
+            if (model, variant) not in self._seen:
+                self._seen[(model, variant)] = deque(maxlen=OUTPUT_BUDGET_WINDOW)
+            self._seen[(model, variant)].append(tokens)
+
+    def stats(self) -> list:
+        with self._lock:
+            keys = sorted(self._seen)
+            samples = {k: len(self._seen[k]) for k in keys}
+        return [
+            {"model": m, "variant": v, "samples": samples[(m, v)], "default": NUM_PREDICT[v],
+             "num_predict": self.get(m, v)}
+            for m, v in keys
+        ]
+
+output_budgets = OutputBudgets()
+
+def _repair_prompt(variant: str, raw: str) -> str:
+    return (
+        f"{SYSTEM}\n"
+        "The TEXT below was meant to be one JSON object matching this schema:\n"
+        f"{json.dumps(SCHEMAS[variant])}\n"
+        "Rewrite it as that JSON object, keeping every value it states. Return only the JSON.\n\n"
+        f"TEXT:\n{truncate_tokens(str(raw or ''), 600)}\n"
+    )
+
+_FLAT_OBJECT = re.compile(r"\{[^{}]*\}")
+
+def _raw_integers(raw: str, key: str) -> set:
+    return {int(m) for m in re.findall(rf'"{re.escape(key)}"\s*:\s*"?(-?\d+)', raw)}
+
+def _raw_objects(raw: str) -> list:
+    out = []
+    for m in _FLAT_OBJECT.findall(raw):
+        try:
+            obj = json.loads(m)
+        except ValueError:
+            continue
+        if isinstance(obj, dict):
+            out.append(obj)
+    return out
+
+def _repairable(schema: dict, raw: str) -> bool:
+    """
+    Whether the raw output states the required integers (score, delta, a
+    verdict id) a repair would need; without them it would have to invent them.
+    """
+    for key in schema.get("required", ()):
+        sub = schema["properties"].get(key, {})
+        if sub.get("type") == "array":
+            sub = sub.get("items", {})
+        if sub.get("type") == "integer" and not _raw_integers(raw, key):
+            return False
+        if sub.get("type") == "object" and not _repairable(sub, raw):
+            return False
+    return True
+
+def _ground(schema: dict, value, raw: str, key: str = None):
+    """
+    Keep only what the raw output itself states: integers it has under the
+    same key, strings it contains ("" otherwise), array items matching one of
+    its objects or strings. None when a required value is not grounded.
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return None
+        out = {}
+        for k, sub in schema.get("properties", {}).items():
+            if k not in value:
+                continue
+            grounded = _ground(sub, value[k], raw, k)
+            if grounded is None:
+                if k in schema.get("required", ()):
+                    return None
+                continue
+            out[k] = grounded
+        return out if all(k in out for k in schema.get("required", ())) else None
+    if kind == "integer":
+        try:
+            n = int(value)
+        except (TypeError, ValueError):
+            return None
+        return n if n in _raw_integers(raw, key) else None
+    if kind == "string":
+        text = str(value)
+        return text if text in raw or json.dumps(text)[1:-1] in raw else ""
+    if kind == "array":
+        items = schema.get("items", {})
+        if not isinstance(value, list):
+            return []
+        if items.get("type") == "object":
+            objects = _raw_objects(raw)
+            wanted = items.get("required", ())
+            return [
+                v for v in value
+                if isinstance(v, dict) and any(
+                    all(k in o and str(o[k]) == str(v.get(k)) for k in wanted) for o in objects
+                )
+            ]
+        return [g for g in (_ground(items, v, raw) for v in value) if g]
+    return value
+
+def _num_predict(variant: str, per: int, n: int) -> int:
+    return _requirements_predict(n, per) if variant == "requirements" else per
+
+def _settle(variant: str, data: dict) -> tuple:
+    """First look at a generation -> (parsed or None, parse outcome, truncated)."""
+    parsed, outcome = _decode_json(data.get("response", ""))
+    if not _conforms(SCHEMAS[variant], parsed):
+        parsed = None
+    return parsed, outcome, data.get("done_reason") == "length"
+
+def _repaired(variant: str, raw: str, data: dict):
+    """A repair generation's answer, grounded in `raw`; None if it does not hold up."""
+    parsed, _ = _decode_json(data.get("response", ""))
+    if not _conforms(SCHEMAS[variant], parsed):
+        return None
+    return _ground(SCHEMAS[variant], parsed, raw)
+
+def _time_left(timeout: float):
+    """-> a function giving the seconds left of `timeout`, counted from now."""
+    end = time.monotonic() + timeout
+    return lambda: end - time.monotonic()
+
+def _generate_json(variant: str, prompt: str, *, model: str, timeout: int, num_ctx: int, n: int = 1) -> dict:
+    """Blocking _agenerate_json() -> parsed (a plain call cannot be cut short when the object closes)."""
+    schema = SCHEMAS[variant]
+    left = _time_left(timeout)
+    per = output_budgets.get(model, variant)
+    data = _post(prompt, model=model, timeout=timeout, num_ctx=num_ctx, num_predict=_num_predict(variant, per, n),
+                 schema=schema)
+    parsed, outcome, truncated = _settle(variant, data)
+    output_budgets.record(model, variant, (data.get("eval_count") or 0) / n, truncated=truncated)
+    if parsed is not None:
+        metrics.observe_parse(outcome)
+        return parsed
+    full = _num_predict(variant, NUM_PREDICT[variant], n)
+    raw = str(data.get("response", ""))
+    if (truncated or not _repairable(schema, raw)) and left() >= RETRY_MIN_SECONDS:
+        data = _post(prompt, model=model, timeout=left(), num_ctx=num_ctx, num_predict=full, schema=schema)
+        parsed, _, _ = _settle(variant, data)
+        if parsed is not None:
+            metrics.observe_parse("regenerated")
+            return parsed
+        raw = str(data.get("response", ""))
+    if _repairable(schema, raw) and left() >= RETRY_MIN_SECONDS:
+        fixed = _post(_repair_prompt(variant, raw), model=model, timeout=left(), num_ctx=num_ctx,
+                      num_predict=full, schema=schema)
+        parsed = _repaired(variant, raw, fixed)
+        if parsed is not None:
+            metrics.observe_parse("repaired")
+            return parsed
+    metrics.observe_parse("fallback")
+    return dict(_FALLBACK)
+
+async def _arepair(variant: str, raw: str, *, model: str, timeout: float, num_ctx: int, num_predict: int):
+    """
+    Ask the model to restate malformed output as schema-valid JSON, keeping
+    only values `raw` states -> parsed, or None when `raw` lacks a required
+    integer (a repair would have to invent it) or the repair does not hold up.
+    """
+    if not _repairable(SCHEMAS[variant], raw):
+        return None
+    data = await _apost(_repair_prompt(variant, raw), model=model, timeout=timeout, num_ctx=num_ctx,
+                        num_predict=num_predict, schema=SCHEMAS[variant])
+    return _repaired(variant, raw, data)
+
+async def _agenerate_json(variant: str, prompt: str, *, model: str, timeout: float, num_ctx: int, n: int = 1,
+                          logprobs: bool = False) -> tuple:
+    """
+    One schema-constrained generation with the adaptive num_predict ->
+    (parsed, ollama_data, outcome). Output that does not fit SCHEMAS[variant]
+    is not scored 0 straight away: if it was cut off, or lacks a value only
+    the model can supply (a score, a verdict id), the prompt is generated
+    again with the full budget; otherwise _arepair restates what it says.
+    outcome is the llm_parse_total label; "fallback" returns _FALLBACK.
+    `n`: requirements listed in a "requirements" prompt. `timeout` covers
+    every attempt; one is skipped with under RETRY_MIN_SECONDS left.
+    """
+    schema = SCHEMAS[variant]
+    left = _time_left(timeout)
+    per = output_budgets.get(model, variant)
+    data = await _apost(prompt, model=model, timeout=timeout, num_ctx=num_ctx,
+                        num_predict=_num_predict(variant, per, n), logprobs=logprobs, schema=schema)
+    parsed, outcome, truncated = _settle(variant, data)
+    output_budgets.record(model, variant, (data.get("eval_count") or 0) / n, truncated=truncated)
+    if parsed is not None:
+        metrics.observe_parse(outcome)
+        return parsed, data, outcome
+    full = _num_predict(variant, NUM_PREDICT[variant], n)
+    raw = str(data.get("response", ""))
+    if (truncated or not _repairable(schema, raw)) and left() >= RETRY_MIN_SECONDS:
+        data = await _apost(prompt, model=model, timeout=left(), num_ctx=num_ctx, num_predict=full,
+                            logprobs=logprobs, schema=schema)
+        parsed, _, _ = _settle(variant, data)
+        if parsed is not None:
+            metrics.observe_parse("regenerated")
+            return parsed, data, "regenerated"
+        raw = str(data.get("response", ""))
+    parsed = None
+    if left() >= RETRY_MIN_SECONDS:
+        parsed = await _arepair(variant, raw, model=model, timeout=left(), num_ctx=num_ctx, num_predict=full)
+    if parsed is not None:
+        metrics.observe_parse("repaired")
+        return parsed, {}, "repaired"
+    metrics.observe_parse("fallback")
+    return dict(_FALLBACK), data, "fallback"
 
 # ------------ Public API ------------
+async def warmup_async(model: str) -> str:
+    """Load `model` and wait until it is resident -> "resident" | "error: ..." (see backend.residency)."""
+    return await residency.wait_loaded(model)
+
 def generate_explained_score(
     *,
     resume_text: str,
@@ -95,19 +888,8 @@ def generate_explained_score(
         "evidence": [ { "requirement": str, "match": str } ],
         "risks": [ str ] }
     """
-    prompt = (
-        f"{SYSTEM}\n"
-        "Task: Score how well the RESUME matches the JOB DESCRIPTION.\n"
-        "Rules: score is integer 0-100; summary <= 160 chars; evidence <= 3 items; risks <= 2 items. "
-        "Use short phrases for evidence.match and risks. Return EXACTLY these keys.\n\n"
-        f"JOB DESCRIPTION:\n{job_description}\n\n"
-        f"RESUME:\n{resume_text}\n\n"
-        'Output example: {"score": 85, "summary": "…", '
-        '"evidence": [{"requirement":"Kubernetes","match":"2y AKS ops"}], '
-        '"risks": ["No Terraform"]}'
-    )
-    data = _post(prompt, model=model, timeout=180, num_ctx=1024, num_predict=280)
-    return _parse_json(data.get("response", ""))
+    prompt = _fit_prompt("explained", num_ctx=num_ctx, job_description=job_description, resumes=[resume_text])
+    return _generate_json("explained", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
 
 def generate_explained_score_quick(
     *,
@@ -120,16 +902,8 @@ def generate_explained_score_quick(
     """
     Lighter-weight variant for bias compare. Same JSON as generate_explained_score.
     """
-    prompt = (
-        f"{SYSTEM}\n"
-        "Task: Score RESUME vs JOB DESCRIPTION.\n"
-        "Return compact JSON: score(int 0-100), summary(<=120 chars), evidence(max 2), risks(max 1).\n\n"
-        f"JOB DESCRIPTION:\n{job_description}\n\n"
-        f"RESUME:\n{resume_text}\n\n"
-        'Expected: {"score": 82, "summary": "…", "evidence":[{"requirement":"Kubernetes","match":"AKS"}], "risks":["No Terraform"]}'
-    )
-    data = _post(prompt, model=model, timeout=timeout, num_ctx=num_ctx, num_predict=200)
-    return _parse_json(data.get("response", ""))
+    prompt = _fit_prompt("quick", num_ctx=num_ctx, job_description=job_description, resumes=[resume_text])
+    return _generate_json("quick", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
 
 def generate_compare_scores_single_call(
     *,
@@ -150,20 +924,129 @@ def generate_compare_scores_single_call(
         "delta": int
       }
     """
-    prompt = (
-        f"{SYSTEM}\n"
-        "You will compare two versions of the same resume against a single job description.\n"
-        "Version A is ORIGINAL (with identity & specific details). "
-        "Version B is ANONYMIZED (identity removed; some specifics may be masked).\n"
-        "Score each version 0–100 for relevance to the job; give a one-sentence summary "
-        "for each; compute delta = A - B.\n"
-        "Respond ONLY with valid JSON (no extra text):\n"
-        '{"original":{"score":85,"summary":"..."},'
-        '"anonymized":{"score":78,"summary":"..."},'
-        '"delta":7}\n\n"'
-        f"JOB DESCRIPTION:\n{job_description}\n\n"
-        f"ORIGINAL (A):\n{original_text}\n\n"
-        f"ANONYMIZED (B):\n{anonymized_text}\n"
+    prompt = _fit_prompt(
+        "compare", num_ctx=num_ctx, job_description=job_description, resumes=[original_text, anonymized_text]
+    )
+    return _generate_json("compare", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
+
+# ------------ Public API (async) ------------
+async def generate_explained_score_async(
+    *,
+    resume_text: str,
+    job_description: str,
+    model: str,
+    timeout: int,
+    num_ctx: int,
+) -> dict:
+    """Awaitable generate_explained_score()."""
+    prompt = _fit_prompt("explained", num_ctx=num_ctx, job_description=job_description, resumes=[resume_text])
+    parsed, _, _ = await _agenerate_json("explained", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
+    return parsed
+
+async def generate_explained_score_quick_async(
+    *,
+    resume_text: str,
+    job_description: str,
+    model: str,
+    timeout: int = 120,
+    num_ctx: int = 900,
+    confidence: bool = False,
+) -> dict:
+    """
+    Awaitable generate_explained_score_quick(). With `confidence`, adds
+    "score_confidence" (see _score_confidence) when Ollama returns logprobs.
+    """
+    prompt = _fit_prompt("quick", num_ctx=num_ctx, job_description=job_description, resumes=[resume_text])
+    parsed, data, _ = await _agenerate_json(
+        "quick", prompt, model=model, timeout=timeout, num_ctx=num_ctx, logprobs=confidence
     )
-    data = _post(prompt, model=model, timeout=timeout, num_ctx=num_ctx, num_predict=240)
-    return _parse_json(data.get("response", "")) 
+    if confidence:
+        p = _score_confidence(data)
+        if p is not None:
+            parsed["score_confidence"] = p
+    return parsed
+
+async def generate_compare_scores_single_call_async(
+    *,
+    job_description: str,
+    original_text: str,
+    anonymized_text: str,
+    model: str,
+    timeout: int = 140,
+    num_ctx: int = 1200,
+) -> dict:
+    """Awaitable generate_compare_scores_single_call()."""
+    prompt = _fit_prompt(
+        "compare", num_ctx=num_ctx, job_description=job_description, resumes=[original_text, anonymized_text]
+    )
+    parsed, _, _ = await _agenerate_json("compare", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
+    return parsed
+
+_MET = {"yes": "yes", "true": "yes", "met": "yes", "partial": "partial", "partly": "partial",
+        "no": "no", "false": "no", "none": "no"}
+
+def _to_index(v, default: int) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+def _requirement_verdicts(parsed, n: int, repaired: bool = False) -> list:
+    """Verdicts by position 1..n; None where the model left a requirement out."""
+    items = parsed.get("requirements") if isinstance(parsed, dict) else None
+    out = [None] * n
+    for i, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        idx = _to_index(item.get("id"), default=i + 1) - 1
+        met = _MET.get(str(item.get("met", "")).strip().lower())
+        if 0 <= idx < n and met and out[idx] is None:
+            out[idx] = {"met": met, "match": str(item.get("match") or "")[:120]}
+            if repaired:
+                out[idx]["repaired"] = True
+    return out
+
+async def generate_requirement_matches_async(
+    *,
+    resume_text: str,
+    requirements: list,
+    model: str,
+    timeout: float = 120,
+    num_ctx: int = 1024,
+) -> list:
+    """
+    Judge each of `requirements` (at most REQUIREMENTS_PER_CALL) against the
+    resume in one generation. Returns, in order, {"met": "yes"|"partial"|"no",
+    "match": str} or None for a requirement the model skipped. Verdicts
+    recovered by a repair prompt carry "repaired": True and should not be cached.
+    """
+    prompt = _requirements_prompt(truncate_tokens(resume_text, _requirements_budget(num_ctx)), requirements)
+    parsed, _, outcome = await _agenerate_json(
+        "requirements", prompt, model=model, timeout=timeout, num_ctx=num_ctx, n=len(requirements)
+    )
+    return _requirement_verdicts(parsed, len(requirements), repaired=outcome == "repaired")
+
+# ------------ Public API (streaming) ------------
+def stream_explained_score(
+    *,
+    resume_text: str,
+    job_description: str,
+    model: str,
+    timeout: int,
+    num_ctx: int,
+):
+    """Streaming generate_explained_score(); see _stream_fields for the event shape."""
+    prompt = _fit_prompt("explained", num_ctx=num_ctx, job_description=job_description, resumes=[resume_text])
+    return _stream_fields("explained", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
+
+def stream_explained_score_quick(
+    *,
+    resume_text: str,
+    job_description: str,
+    model: str,
+    timeout: int = 120,
+    num_ctx: int = 900,
+):
+    """Streaming generate_explained_score_quick()."""
+    prompt = _fit_prompt("quick", num_ctx=num_ctx, job_description=job_description, resumes=[resume_text])
+    return _stream_fields("quick", prompt, model=model, timeout=timeout, num_ctx=num_ctx)
@@ -0,0 +1,234 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+import httpx
+
+# ------------ Config ------------
+# Comma-separated Ollama base URLs; defaults to the single OLLAMA_URL
+OLLAMA_URLS = [
+    u.strip().rstrip("/")
+    for u in (os.getenv("OLLAMA_URLS") or os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")).split(",")
+    if u.strip()
+]
+ROUTER_HEALTH_INTERVAL = float(os.getenv("ROUTER_HEALTH_INTERVAL", "10"))  # seconds between /api/ps polls
+ROUTER_FAIL_THRESHOLD = int(os.getenv("ROUTER_FAIL_THRESHOLD", "3"))       # consecutive failures to open
+ROUTER_OPEN_SECONDS = float(os.getenv("ROUTER_OPEN_SECONDS", "30"))        # before a half-open trial
+ROUTER_RETRIES = int(os.getenv("ROUTER_RETRIES", "1"))                     # other nodes tried per call
+
+log = logging.getLogger(__name__)
+
+def _model_name(name: str) -> str:
+    # Ollama reports "llama3:latest" for a request that said "llama3"
+    return name if ":" in name else f"{name}:latest"
+
+class NoNodeAvailable(RuntimeError):
+    pass
+
+class NodeBusy(NoNodeAvailable):
+    """Every node that could serve the model is at its limit for it; try again shortly."""
+
+# ------------ Node ------------
+class Node:
+    """One Ollama instance: bookkeeping for routing, circuit breaking and stats."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.generate_url = url + "/api/generate"
+        self.outstanding = 0
+        self.running = {}         # model -> generations in flight (pick() enforces a per-node limit)
+        self.resident = set()     # models loaded in memory (/api/ps + our own traffic)
+        self.sizes = {}           # resident model -> bytes in memory (/api/ps)
+        self.available = None     # models installed (/api/tags); None = unknown
+        self.healthy = True
+        self.failures = 0         # consecutive
+        self.open_until = 0.0     # circuit open while now < open_until
+        self.latency_ms = None    # EWMA of successful calls
+        self.stats = {"requests": 0, "errors": 0, "retried_elsewhere": 0, "circuit_opens": 0}
+        self.last_error = None
+
+    def circuit(self, now: float) -> str:
+        if self.failures < ROUTER_FAIL_THRESHOLD:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "circuit": self.circuit(time.monotonic()),
+            "outstanding": self.outstanding,
+            "running": {m: c for m, c in sorted(self.running.items()) if c},
+            "resident_models": sorted(self.resident),
+            "available_models": sorted(self.available) if self.available is not None else None,
+            "latency_ms_avg": round(self.latency_ms) if self.latency_ms is not None else None,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            **self.stats,
+        }
+
+# ------------ Router ------------
+class OllamaRouter:
+    """
+    Routes each generation to the least-loaded node that can serve the model:
+    nodes with the model already resident first, then fewest outstanding
+    requests, then lowest latency. Nodes that keep failing are skipped for
+    ROUTER_OPEN_SECONDS, then get one trial request (circuit breaker).
+    Thread-safe, so the sync and async clients share one view.
+    """
+
+    def __init__(self, urls):
+        self.nodes = [Node(u) for u in urls]
+        self._lock = threading.Lock()
+        self._task = None
+        self._client = None
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    # ---- selection
+    def _rank(self, node: Node, model: str):
+        return (model not in node.resident, node.outstanding, node.latency_ms or 0.0)
+
+    def _reserve(self, node: Node, model: str) -> None:
+        node.outstanding += 1
+        node.running[model] = node.running.get(model, 0) + 1
+        node.stats["requests"] += 1
+
+    def _unreserve(self, node: Node, model: str) -> None:
+        node.outstanding -= 1
+        node.running[model] -= 1
+
+    def pick(self, model: str, exclude=(), limit: int = None) -> Node:
+        """
+        Reserve the best node for one `model` request; release with done().
+        With `limit`, nodes already running that many `model` generations are
+        passed over, and NodeBusy is raised if that leaves none.
+        """
+        model = _model_name(model)
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                n for n in self.nodes
+                if n not in exclude
+                and n.healthy
+                # half-open: a single trial request at a time
+                and (n.circuit(now) == "closed" or (n.circuit(now) == "half_open" and n.outstanding == 0))
+                and (n.available is None or model in n.available)
+            ]
+            if not candidates:
+                # every node is down or open: try the one whose circuit opened first
+                candidates = sorted((n for n in self.nodes if n not in exclude), key=lambda n: n.open_until)[:1]
+            if not candidates:
+                raise NoNodeAvailable(f"No Ollama node available for {model}")
+            if limit is not None:
+                candidates = [n for n in candidates if n.running.get(model, 0) < limit]
+                if not candidates:
+                    raise NodeBusy(f"Every Ollama node is running {limit} {model} generations")
+            node = min(candidates, key=lambda n: self._rank(n, model))
+            self._reserve(node, model)
+            return node
+
+    def release(self, node: Node, model: str) -> None:
+        """Give back a reservation without a verdict (the caller was cancelled)."""
+        with self._lock:
+            self._unreserve(node, _model_name(model))
+
+    def done(self, node: Node, model: str, *, elapsed: float = None, error: Exception = None) -> None:
+        with self._lock:
+            self._unreserve(node, _model_name(model))
+            if error is None:
+                node.failures = 0
+                node.healthy = True
+                node.resident.add(_model_name(model))
+                if elapsed is not None:
+                    ms = elapsed * 1000
+                    node.latency_ms = ms if node.latency_ms is None else 0.8 * node.latency_ms + 0.2 * ms
+                return
+            node.stats["errors"] += 1
+            node.last_error = f"{type(error).__name__}: {error}".splitlines()[0][:200]
+            self._fail(node)
+
+    def _fail(self, node: Node) -> None:
+        node.failures += 1
+        if node.failures >= ROUTER_FAIL_THRESHOLD:
+            if node.open_until <= time.monotonic():
+                node.stats["circuit_opens"] += 1
+            node.open_until = time.monotonic() + ROUTER_OPEN_SECONDS
+
+    def retried(self, node: Node) -> None:
+        with self._lock:
+            node.stats["retried_elsewhere"] += 1
+
+    def model_missing(self, node: Node, model: str) -> None:
+        """The node answered 404 for `model`: stop routing it there until the next poll."""
+        with self._lock:
+            model = _model_name(model)
+            self._unreserve(node, model)
+            node.stats["errors"] += 1
+            node.last_error = f"model {model} not found"
+            node.resident.discard(model)
+            if node.available is not None:
+                node.available.discard(model)
+            else:
+                node.available = set()
+
+    def unloaded(self, node: Node, model: str) -> None:
+        with self._lock:
+            model = _model_name(model)
+            node.resident.discard(model)
+            node.sizes.pop(model, None)
+
+    # ---- health checks
+    async def probe(self, node: Node) -> None:
+        """Refresh a node's resident (/api/ps) and installed (/api/tags) models."""
+        try:
+            ps = await self._client.get(node.url + "/api/ps")
+            tags = await self._client.get(node.url + "/api/tags")
+            ps.raise_for_status()
+            tags.raise_for_status()
+            sizes = {_model_name(m.get("name") or m.get("model", "")): m.get("size") or 0
+                     for m in ps.json().get("models", [])}
+            available = {_model_name(m.get("name") or m.get("model", "")) for m in tags.json().get("models", [])}
+        except Exception as e:
+            with self._lock:
+                if node.healthy:
+                    log.warning("Ollama node %s failed health check: %s", node.url, e)
+                node.healthy = False
+                node.last_error = f"health: {type(e).__name__}: {e}"[:200]
+                self._fail(node)
+            return
+        with self._lock:
+            if not node.healthy:
+                log.info("Ollama node %s is healthy again", node.url)
+            node.healthy = True
+            node.resident = set(sizes)
+            node.sizes = sizes
+            node.available = available or None  # empty tag list: do not exclude anything
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self.probe(n) for n in self.nodes))
+            await asyncio.sleep(ROUTER_HEALTH_INTERVAL)
+
+    def start(self) -> None:
+        """Begin background health checks (call from the app's startup)."""
+        if self._task is None or self._task.done():
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(5.0))
+            self._task = asyncio.ensure_future(self._health_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"nodes": [n.snapshot() for n in self.nodes], "retries": ROUTER_RETRIES}
+
+router = OllamaRouter(OLLAMA_URLS)
@@ -0,0 +1,159 @@
+import os
+import re
+import math
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from backend.anonymizer import _trie_pattern, load_word_list
+from backend.jd import prepare_jd
+
+# ------------ Config ------------
+# Resumes whose pre-screen score is below this skip LLM scoring (0 = never skip)
+PRESCREEN_THRESHOLD = int(os.getenv("PRESCREEN_THRESHOLD", "0"))
+# Extra vocabulary, one "canonical: alias, alias" entry per line
+PRESCREEN_VOCABULARY = os.getenv("PRESCREEN_VOCABULARY", "")
+NICE_TO_HAVE_WEIGHT = 0.5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# score: 0-100 weighted requirement coverage; matched: vocabulary skills found
+# in both; missing: requirements with less than half of their terms present
+Prescreen = namedtuple("Prescreen", "score covered total matched missing")
+
+# ------------ Skills vocabulary ------------
+# canonical name -> aliases; matched case-insensitively as whole tokens
+SKILLS = {
+    "python": (), "java": (), "javascript": ("js",), "typescript": (), "go": ("golang",),
+    "rust": (), "c++": ("cpp",), "c#": ("csharp",), ".net": ("dotnet",), "ruby": (), "php": (),
+    "kotlin": (), "swift": (), "scala": (), "sql": (), "bash": ("shell scripting",),
+    "powershell": (), "linux": ("unix",), "windows server": (),
+    "react": ("reactjs", "react.js"), "angular": (), "vue": ("vue.js", "vuejs"),
+    "node.js": ("node", "nodejs"), "django": (), "flask": (), "fastapi": (), "spring": ("spring boot",),
+    "html": (), "css": (), "graphql": (), "rest api": ("restful",),
+    "aws": ("amazon web services",), "azure": ("microsoft azure",), "gcp": ("google cloud",),
+    "docker": ("containers",), "kubernetes": ("k8s", "eks", "aks", "gke", "openshift"), "helm": (),
+    "terraform": (), "ansible": (), "puppet": (), "chef": (), "pulumi": (), "cloudformation": (),
+    "ci/cd": ("cicd", "ci cd", "continuous integration", "continuous delivery", "continuous deployment"),
+    "jenkins": (), "github actions": (), "gitlab ci": (), "azure devops": (), "argocd": ("argo cd",),
+    "git": (), "devops": (), "sre": ("site reliability",), "iac": ("infrastructure as code",),
+    "prometheus": (), "grafana": (), "elk": ("elasticsearch", "kibana", "logstash"), "datadog": (),
+    "splunk": (), "monitoring": ("observability",), "on-call": ("on call", "pagerduty"),
+    "networking": ("tcp/ip", "dns"), "security": ("devsecops", "cybersecurity"), "iam": (),
+    "postgresql": ("postgres",), "mysql": (), "mongodb": ("mongo",), "redis": (), "kafka": (),
+    "rabbitmq": (), "spark": ("pyspark",), "hadoop": (), "airflow": (), "snowflake": (), "databricks": (),
+    "machine learning": ("ml",), "deep learning": (), "nlp": ("natural language processing",),
+    "pytorch": (), "tensorflow": (), "scikit-learn": ("sklearn",), "pandas": (), "numpy": (),
+    "llm": ("large language models",), "data analysis": ("data analytics",), "statistics": (),
+    "excel": (), "power bi": (), "tableau": (), "microservices": (), "serverless": ("lambda",),
+    "agile": ("scrum", "kanban"), "jira": (), "project management": ("pmp",),
+    "communication": ("communication skills",), "leadership": ("team lead", "led a team"),
+    "mentoring": (), "stakeholder management": (),
+}
+
+def _load_vocabulary(path: str) -> dict:
+    vocab = {}
+    for line in load_word_list(path):
+        name, _, aliases = line.partition(":")
+        vocab[name.strip().lower()] = tuple(a.strip().lower() for a in aliases.split(",") if a.strip())
+    return vocab
+
+def build_skill_matcher(vocabulary: dict):
+    """One compiled regex over every skill and alias -> (regex, alias -> canonical)."""
+    canonical = {}
+    for name, aliases in vocabulary.items():
+        for term in (name, *aliases):
+            canonical[term.lower()] = name
+    # tokens may end in + or # (c++, c#); plain \b would not match after them
+    regex = re.compile(r"(?<![\w+#.])(?:" + _trie_pattern(canonical) + r")(?![\w+#]|\.\w)")
+    return regex, canonical
+
+_skills_regex, _canonical = build_skill_matcher(
+    {**SKILLS, **(_load_vocabulary(PRESCREEN_VOCABULARY) if PRESCREEN_VOCABULARY else {})}
+)
+
+# ------------ Tokenization ------------
+_WORD = re.compile(r"[a-z][a-z0-9+#]*")
+_STOPWORDS = frozenset("""
+    a an and are as at be by for from has have in into is it its of on or our the to we with you your
+    will can must should years year experience experienced strong good excellent knowledge skills
+    ability understanding working work using use plus etc including such role team nice have senior
+    junior engineer developer familiarity proficiency proficient solid hands preferred required
+""".split())
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 4 and word.endswith("s") and not word.endswith("ss") else word
+
+def skills_in(text: str) -> set:
+    return {_canonical[m.group().lower()] for m in _skills_regex.finditer(text)}
+
+def content_words(text: str) -> set:
+    return {_stem(w) for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+def document_terms(text: str) -> Counter:
+    """Bag of skills and content words, the unit BM25 ranks on."""
+    lower = text.lower()
+    terms = Counter(_stem(w) for w in _WORD.findall(lower) if len(w) > 2 and w not in _STOPWORDS)
+    terms.update("skill:" + _canonical[m.group().lower()] for m in _skills_regex.finditer(text))
+    return terms
+
+# ------------ Scoring ------------
+@lru_cache(maxsize=128)
+def _jd_profile(job_description: str) -> tuple:
+    """Per requirement: (text, weight, skills, content words); computed once per JD."""
+    profile = []
+    for req in prepare_jd(job_description).requirements:
+        weight = NICE_TO_HAVE_WEIGHT if req.endswith("(nice to have)") else 1.0
+        req = req.removesuffix(" (nice to have)")
+        skills, words = frozenset(skills_in(req)), frozenset(content_words(req))
+        if skills or words:
+            profile.append((req, weight, skills, words))
+    return tuple(profile)
+
+def prescreen(resume_text: str, job_description: str) -> Prescreen:
+    """
+    Deterministic requirement coverage of a resume, in milliseconds. A
+    requirement naming vocabulary skills counts the share of them present;
+    otherwise the share of its content words. Nice-to-haves weigh half.
+    """
+    profile = _jd_profile(job_description)
+    have_skills, have_words = skills_in(resume_text), content_words(resume_text)
+    matched, missing = set(), []
+    got = total = 0.0
+    covered = 0
+    for req, weight, skills, words in profile:
+        if skills:
+            share = len(skills & have_skills) / len(skills)
+            matched |= skills & have_skills
+        else:
+            share = len(words & have_words) / len(words)
+        got += weight * share
+        total += weight
+        if share >= 0.5:
+            covered += 1
+        else:
+            missing.append(req)
+    score = round(100 * got / total) if total else 0
+    return Prescreen(score, covered, len(profile), sorted(matched), missing[:5])
+
+def bm25_scores(job_description: str, documents: list) -> list:
+    """
+    Okapi BM25 of each bag of document_terms() against the JD's terms, with
+    IDF taken from `documents` itself (one requisition's applicant pool).
+    """
+    query = set(document_terms(prepare_jd(job_description).text))
+    n = len(documents)
+    if not n:
+        return []
+    avgdl = sum(sum(d.values()) for d in documents) / n or 1.0
+    df = Counter(t for d in documents for t in query if t in d)
+    idf = {t: math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) for t in query}
+    scores = []
+    for d in documents:
+        dl = sum(d.values())
+        s = 0.0
+        for t in query:
+            tf = d.get(t, 0)
+            if tf:
+                s += idf[t] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+        scores.append(round(s, 3))
+    return scores
@@ -0,0 +1,133 @@
+import re
+
+# ------------ Config ------------
+# Resume sections pulled to the front of the packed text, in priority order.
+# The first name in each group is the preferred anchor.
+SECTION_WINDOW = 1600
+SECTION_ANCHORS = (
+    ("summary", "professional summary", "profile"),
+    ("skills", "technical skills"),
+    ("experience", "work experience", "employment"),
+)
+TRUNCATION_MARK = "\n...[truncated]"
+# Leading lines (name, location, contact) stay in front of the sections
+HEADER_MAX_LINES = 3
+HEADER_MAX_CHARS = 240
+
+# ------------ Token estimates ------------
+# Words, digit runs and single symbols, roughly how BPE vocabularies split text.
+_PIECE = re.compile(r"[A-Za-z]+|\d+|\S")
+
+def _piece_cost(piece: str) -> int:
+    c = piece[0]
+    if c.isdigit():
+        return (len(piece) + 2) // 3
+    if c.isascii() and c.isalpha():
+        return (len(piece) + 3) // 4
+    return 1
+
+def estimate_tokens(text: str) -> int:
+    """
+    Conservative token count for llama-family BPE tokenizers: words cost one
+    token per 4 letters (rounded up), digit runs one per 3 digits, every other
+    symbol one token. Typical English resumes come out 10-25% above the real
+    count, so budgets computed from it fit num_ctx.
+    """
+    return sum(_piece_cost(p) for p in _PIECE.findall(text or ""))
+
+def truncate_tokens(text: str, max_tokens: int, mark: str = TRUNCATION_MARK) -> str:
+    """Longest prefix of `text` (plus `mark`) whose estimate fits `max_tokens`."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(mark)
+    if budget <= 0:
+        return ""
+    used = 0
+    end = 0
+    for m in _PIECE.finditer(text):
+        used += _piece_cost(m.group())
+        if used > budget:
+            break
+        end = m.end()
+    return text[:end].rstrip() + mark
+
+# ------------ Sections ------------
+def _merge(intervals: list) -> list:
+    merged = []
+    for s, e in sorted(intervals):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+def section_windows(text: str) -> list:
+    """(start, end) windows of the anchored sections, overlaps merged, in text order."""
+    lower = text.lower()
+    intervals = []
+    for names in SECTION_ANCHORS:
+        for n in names:
+            i = lower.find(n)
+            if i != -1:
+                intervals.append((i, min(len(text), i + SECTION_WINDOW)))
+                break
+    return _merge(intervals)
+
+def sections_settled(text: str, char_budget: int) -> bool:
+    """
+    True once appending more text (e.g. later PDF pages) cannot change the first
+    `char_budget` characters pack_resume builds from `text`.
+    """
+    lower = text.lower()
+    intervals = []
+    for names in SECTION_ANCHORS:
+        if sum(e - s for s, e in _merge(intervals)) >= char_budget:
+            return True
+        i = lower.find(names[0])
+        if i == -1 or i + SECTION_WINDOW > len(text):
+            # the preferred anchor may still appear, or its window may grow
+            return False
+        intervals.append((i, i + SECTION_WINDOW))
+    # windows + remainder is a permutation of the text, so its length is what we have
+    return len(text) >= char_budget
+
+def header_end(text: str, windows: list) -> int:
+    """End of the header: up to HEADER_MAX_LINES non-empty lines before the first section."""
+    limit = min(windows[0][0] if windows else len(text), HEADER_MAX_CHARS)
+    end = lines = 0
+    while lines < HEADER_MAX_LINES:
+        nl = text.find("\n", end)
+        stop = len(text) if nl == -1 else nl + 1
+        if stop > limit:
+            break
+        lines += bool(text[end:stop].strip())
+        end = stop
+    return end
+
+# ------------ Packing ------------
+def pack_resume(text: str, *, max_tokens: int = None, max_chars: int = None) -> str:
+    """
+    The header lines, then the section windows (summary, skills, experience),
+    then the rest of the resume in reading order, each character included
+    once, cut to fit both `max_tokens` (estimated) and `max_chars`.
+    """
+    text = (text or "").strip()
+    windows = section_windows(text)
+    pos = header_end(text, windows)
+    pieces = [text[:pos]] + [text[s:e] for s, e in windows]
+    for s, e in windows:
+        if s > pos:
+            pieces.append(text[pos:s])
+        pos = e
+    pieces.append(text[pos:])
+
+    packed = "\n\n".join(p.strip() for p in pieces if p.strip())
+    cut = max_chars is not None and len(packed) > max_chars
+    if cut:
+        packed = packed[:max_chars]
+    if max_tokens is not None:
+        reserve = estimate_tokens(TRUNCATION_MARK) if cut else 0
+        fitted = truncate_tokens(packed, max_tokens - reserve)
+        if fitted != packed:
+            return fitted
+    return packed + TRUNCATION_MARK if cut else packed
@@ -0,0 +1,140 @@
+import asyncio
+from collections import namedtuple
+
+from backend.cache import cache_key, score_cache
+from backend.jd import prepare_jd
+from backend.ollama_client import REQUIREMENTS_PER_CALL, generate_requirement_matches_async
+from backend.prescreen import NICE_TO_HAVE_WEIGHT
+
+# ------------ Config ------------
+# Credit a verdict earns towards the 0-100 score
+MET_CREDIT = {"yes": 1.0, "partial": 0.5, "no": 0.0}
+SUMMARY_CHARS = 160
+
+Requirement = namedtuple("Requirement", "text optional")
+
+# ------------ Requirements ------------
+def split_requirements(job_description: str) -> list:
+    """
+    The JD's requirements (backend.jd), with "(nice to have)" moved into a
+    flag. The job title and what the employer offers are not among them, so
+    they never count against the score.
+    """
+    out, seen = [], set()
+    for req in prepare_jd(job_description).requirements:
+        optional = req.endswith("(nice to have)")
+        text = req.removesuffix(" (nice to have)")
+        if text.lower() not in seen:
+            seen.add(text.lower())
+            out.append(Requirement(text, optional))
+    return out
+
+def decomposable(job_description: str) -> bool:
+    """Whether the JD splits into requirements; prose-only JDs are scored as a whole."""
+    return len(split_requirements(job_description)) >= 2
+
+# ------------ Aggregation ------------
+def aggregate(requirements: list, verdicts: dict) -> dict:
+    """
+    Fold per-requirement verdicts (requirement text -> {"met", "match"}) into
+    the explained-score shape: score, summary, evidence, risks, plus the
+    per-requirement breakdown. Nice-to-haves weigh NICE_TO_HAVE_WEIGHT;
+    requirements without a verdict are left out of the score.
+    """
+    rows = []
+    earned = total = 0.0
+    for req in requirements:
+        verdict = verdicts.get(req.text)
+        rows.append({
+            "requirement": req.text,
+            "nice_to_have": req.optional,
+            "met": verdict["met"] if verdict else None,
+            "match": verdict["match"] if verdict else "",
+        })
+        if verdict:
+            weight = NICE_TO_HAVE_WEIGHT if req.optional else 1.0
+            earned += weight * MET_CREDIT[verdict["met"]]
+            total += weight
+    if not total:
+        return {"score": 0, "summary": "Unable to parse model output", "evidence": [], "risks": [],
+                "requirements": rows}
+
+    met = [r for r in rows if r["met"] == "yes"]
+    partial = [r for r in rows if r["met"] == "partial"]
+    gaps = [r for r in rows if r["met"] == "no" and not r["nice_to_have"]]
+    risks = [f"No {r['requirement']}" for r in gaps]
+    risks += [f"Limited {r['requirement']}" for r in partial if not r["nice_to_have"]]
+    summary = f"Meets {len(met)} of {len(rows)} requirements"
+    if partial:
+        summary += f", {len(partial)} partly"
+    if gaps:
+        summary += "; missing " + ", ".join(r["requirement"] for r in gaps[:2])
+    return {
+        "score": round(100 * earned / total),
+        "summary": summary[:SUMMARY_CHARS],
+        "evidence": [
+            {"requirement": r["requirement"], "match": r["match"] or r["met"]}
+            for r in sorted(met + partial, key=lambda r: (r["nice_to_have"], r["met"] != "yes"))
+        ][:3],
+        "risks": risks[:2],
+        "requirements": rows,
+    }
+
+# ------------ Scoring ------------
+async def score_by_requirements(*, resume_text: str, job_description: str, model: str, num_ctx: int,
+                                timeout: float = 120) -> tuple:
+    """
+    Score a resume one JD requirement at a time -> (result, cache_source).
+    Verdicts are cached per (resume, requirement), so after a JD edit only
+    new or reworded requirements reach the model, REQUIREMENTS_PER_CALL per
+    generation. Requirements another request is judging for the same resume
+    wait for its verdicts. cache_source is "miss" if any requirement had to
+    be judged here. Verdicts only recovered by a repair prompt count but are
+    not cached.
+    """
+    requirements = split_requirements(job_description)
+    keys = {
+        r.text: cache_key("requirements", model=model, num_ctx=num_ctx, resume_text=resume_text, requirement=r.text)
+        for r in requirements
+    }
+    verdicts, sources = {}, set()
+    peeked = await asyncio.gather(*(
+        score_cache.peek(keys[r.text], model=model, count_miss=False) for r in requirements
+    ))
+    for req, (value, source) in zip(requirements, peeked):
+        if value is not None:
+            verdicts[req.text] = value
+            sources.add(source)
+
+    missing = [r.text for r in requirements if r.text not in verdicts]
+    # requirements another request is judging right now are shared, not judged twice
+    flights = {}
+    for text in missing:
+        flight = score_cache.flight(keys[text])
+        if flight is not None:
+            flights[text] = flight
+            sources.add("shared")
+    fresh = [text for text in missing if text not in flights]
+
+    async def judge(batch):
+        answers = await generate_requirement_matches_async(
+            resume_text=resume_text, requirements=batch, model=model, timeout=timeout, num_ctx=num_ctx,
+        )
+        # verdicts only recovered by a repair prompt are used but not kept
+        return {keys[text]: (v, v is not None and not v.pop("repaired", False)) for text, v in zip(batch, answers)}
+
+    for i in range(0, len(fresh), REQUIREMENTS_PER_CALL):
+        batch = fresh[i:i + REQUIREMENTS_PER_CALL]
+        started = score_cache.start([keys[t] for t in batch], lambda batch=batch: judge(batch),
+                                    model=model, variant="requirements")
+        flights.update({text: started[keys[text]] for text in batch})
+    answers = await asyncio.gather(*(score_cache.follow(flights[text]) for text in missing))
+    for text, verdict in zip(missing, answers):
+        if verdict is not None:
+            verdicts[text] = verdict
+
+    result = aggregate(requirements, verdicts)
+    result["requirements_rescored"] = len(missing)
+    if fresh:
+        return result, "miss"
+    return result, next((s for s in ("shared", "disk") if s in sources), "memory")
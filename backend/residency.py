@@ -0,0 +1,248 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+import httpx
+
+from backend.metrics import METRICS_COLD_LOAD_SECONDS
+from backend.ollama_router import _model_name, router
+
+# ------------ Config ------------
+# keep_alive sent with every generation; busy models are kept loaded by pings instead
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
+RESIDENCY_INTERVAL = float(os.getenv("RESIDENCY_INTERVAL", "30"))            # seconds between passes
+RESIDENCY_PING_SECONDS = float(os.getenv("RESIDENCY_PING_SECONDS", "240"))   # ping a busy model idle this long
+RESIDENCY_WINDOW = float(os.getenv("RESIDENCY_WINDOW", "900"))               # seconds of traffic considered
+RESIDENCY_MIN_REQUESTS = int(os.getenv("RESIDENCY_MIN_REQUESTS", "3"))       # in the window, to keep warm
+RESIDENCY_MEMORY_BUDGET_MB = int(os.getenv("RESIDENCY_MEMORY_BUDGET_MB", "0"))  # per node; 0 = no limit
+RESIDENCY_MIN_IDLE = 60.0  # seconds; never unload a model used more recently than this
+
+log = logging.getLogger(__name__)
+
+# ------------ Model state ------------
+class ModelState:
+    """Demand and load history of one model."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.uses = deque()      # monotonic times of generations in RESIDENCY_WINDOW
+        self.last_used = 0.0
+        self.last_ping = 0.0
+        self.loaded_at = 0.0     # a finished preload counts as a use for the memory budget
+        self.loading = None      # preload task
+        self.cold = 0
+        self.cold_ms = 0.0       # total load_duration of cold generations
+        self.last_load_ms = None
+        self.warm = 0
+        self.warm_ms = 0.0       # total wall time of warm generations
+        self.releases = 0
+        self.last_error = None
+
+    def requests_in_window(self, now: float) -> int:
+        while self.uses and self.uses[0] < now - RESIDENCY_WINDOW:
+            self.uses.popleft()
+        return len(self.uses)
+
+    def note_load(self, data: dict) -> bool:
+        """Count a cold load if Ollama's load_duration says it loaded the model -> cold?"""
+        seconds = (data.get("load_duration") or 0) / 1e9
+        if seconds <= METRICS_COLD_LOAD_SECONDS:
+            return False
+        self.cold += 1
+        self.cold_ms += seconds * 1000
+        self.last_load_ms = round(seconds * 1000)
+        return True
+
+    def last_active(self) -> float:
+        return max(self.last_used, self.loaded_at)
+
+    def is_loading(self) -> bool:
+        return self.loading is not None and not self.loading.done()
+
+    def busy(self, now: float) -> bool:
+        return self.requests_in_window(now) >= RESIDENCY_MIN_REQUESTS
+
+# ------------ Manager ------------
+class ResidencyManager:
+    """
+    Keeps the models that traffic needs loaded in Ollama and lets the rest go:
+    - preload(): load a model in the background (startup, /warmup, ahead of compare traffic)
+    - busy models (RESIDENCY_MIN_REQUESTS in RESIDENCY_WINDOW) get an empty
+      generation every RESIDENCY_PING_SECONDS of idleness, which resets Ollama's
+      keep_alive timer; quiet ones expire after OLLAMA_KEEP_ALIVE
+    - with RESIDENCY_MEMORY_BUDGET_MB, the least recently used idle models on a
+      node over budget are unloaded
+    """
+
+    def __init__(self):
+        self.models = {}
+        self._task = None
+        self._client = None
+
+    def _state(self, model: str) -> ModelState:
+        model = _model_name(model)
+        if model not in self.models:
+            self.models[model] = ModelState(model)
+        return self.models[model]
+
+    def resident_on(self, model: str) -> list:
+        model = _model_name(model)
+        return [n for n in router.nodes if n.healthy and model in n.resident]
+
+    # ---- traffic
+    def touch(self, model: str) -> None:
+        """A generation for `model` is starting."""
+        self._state(model).last_used = time.monotonic()
+
+    def record(self, model: str, data: dict, elapsed: float) -> None:
+        """A generation finished; `data` is Ollama's response (durations in nanoseconds)."""
+        state = self._state(model)
+        now = time.monotonic()
+        state.last_used = now
+        state.uses.append(now)
+        if not state.note_load(data):
+            state.warm += 1
+            state.warm_ms += elapsed * 1000
+
+    # ---- loading and unloading
+    def preload(self, model: str) -> str:
+        """Start loading `model` unless it is resident or loading -> "resident" | "loading"."""
+        state = self._state(model)
+        if self.resident_on(model):
+            return "resident"
+        if state.loading is None or state.loading.done():
+            state.loading = asyncio.ensure_future(self._load(state))
+        return "loading"
+
+    async def wait_loaded(self, model: str) -> str:
+        """preload() and wait for it -> "resident", or "error: ..." if loading failed."""
+        state = self._state(model)
+        if self.preload(model) == "loading":
+            await asyncio.shield(state.loading)
+        return "resident" if self.resident_on(model) else f"error: {state.last_error}"
+
+    async def _generate(self, url: str, payload: dict) -> dict:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(300.0, connect=5.0))
+        r = await self._client.post(url, json=payload)
+        r.raise_for_status()
+        return r.json()
+
+    async def _load(self, state: ModelState) -> None:
+        # an empty prompt only loads the model
+        try:
+            node = router.pick(state.name)
+        except Exception as e:
+            state.last_error = f"load: {e}"
+            return
+        started = time.perf_counter()
+        try:
+            data = await self._generate(node.generate_url, {"model": state.name, "keep_alive": OLLAMA_KEEP_ALIVE})
+        except asyncio.CancelledError:
+            router.release(node, state.name)
+            raise
+        except Exception as e:
+            router.done(node, state.name, error=e)
+            state.last_error = f"load: {type(e).__name__}: {e}".splitlines()[0][:200]
+            log.warning("Preloading %s on %s failed: %s", state.name, node.url, e)
+            return
+        elapsed = time.perf_counter() - started
+        router.done(node, state.name, elapsed=elapsed)
+        state.note_load(data)
+        state.last_ping = state.loaded_at = time.monotonic()
+        log.info("Model %s resident on %s (%.1f s)", state.name, node.url, elapsed)
+
+    async def _ping(self, node, state: ModelState) -> None:
+        try:
+            await self._generate(node.generate_url, {"model": state.name, "keep_alive": OLLAMA_KEEP_ALIVE})
+            state.last_ping = time.monotonic()
+        except Exception as e:
+            state.last_error = f"ping: {type(e).__name__}: {e}".splitlines()[0][:200]
+
+    async def _release(self, node, state: ModelState) -> None:
+        try:
+            await self._generate(node.generate_url, {"model": state.name, "keep_alive": 0})
+        except Exception as e:
+            state.last_error = f"release: {type(e).__name__}: {e}".splitlines()[0][:200]
+            return
+        router.unloaded(node, state.name)
+        state.releases += 1
+        log.info("Released %s on %s (memory budget)", state.name, node.url)
+
+    # ---- background pass
+    async def tick(self) -> None:
+        now = time.monotonic()
+        jobs = []
+        for state in list(self.models.values()):
+            if state.busy(now) and now - max(state.last_used, state.last_ping) >= RESIDENCY_PING_SECONDS:
+                jobs += [self._ping(node, state) for node in self.resident_on(state.name)]
+        if RESIDENCY_MEMORY_BUDGET_MB > 0:
+            budget = RESIDENCY_MEMORY_BUDGET_MB * 2**20
+            for node in router.nodes:
+                used = sum(node.sizes.values())
+                # least recently used first; models we never served count as oldest
+                for name in sorted(node.sizes, key=lambda m: self._state(m).last_active()):
+                    if used <= budget:
+                        break
+                    state = self._state(name)
+                    # a model being preloaded or just preloaded is about to get traffic
+                    if state.is_loading() or now - state.last_active() < RESIDENCY_MIN_IDLE:
+                        continue
+                    used -= node.sizes[name]
+                    jobs.append(self._release(node, state))
+        await asyncio.gather(*jobs)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(RESIDENCY_INTERVAL)
+            try:
+                await self.tick()
+            except Exception as e:
+                log.warning("Residency pass failed: %s", e)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for state in self.models.values():
+            if state.is_loading():
+                state.loading.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---- reporting
+    def status(self, model: str) -> dict:
+        state = self._state(model)
+        now = time.monotonic()
+        return {
+            "model": state.name,
+            "state": "resident" if self.resident_on(state.name) else
+                     "loading" if state.is_loading() else "not_loaded",
+            "resident_on": [n.url for n in self.resident_on(state.name)],
+            "requests_in_window": state.requests_in_window(now),
+            "kept_warm": state.busy(now),
+            "idle_s": round(now - state.last_used) if state.last_used else None,
+            "cold_loads": state.cold,
+            "avg_load_ms": round(state.cold_ms / state.cold) if state.cold else None,
+            "last_load_ms": state.last_load_ms,
+            "warm_requests": state.warm,
+            "avg_warm_ms": round(state.warm_ms / state.warm) if state.warm else None,
+            "released": state.releases,
+            "last_error": state.last_error,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "memory_budget_mb": RESIDENCY_MEMORY_BUDGET_MB or None,
+            "models": [self.status(m) for m in sorted(self.models)],
+        }
+
+residency = ResidencyManager()
@@ -0,0 +1,40 @@
+from typing import Optional
+from fastapi import APIRouter, Query
+from backend.cache import score_cache
+from backend.ollama_client import output_budgets
+from backend.ollama_router import router as ollama_router
+from backend.residency import residency
+
+router = APIRouter(tags=["admin"])
+
+# ---------- Score cache ----------
+@router.get("/cache")
+def cache_stats():
+    return score_cache.stats()
+
+@router.delete("/cache")
+async def cache_invalidate(
+    key: Optional[str] = Query(None, description="Drop a single cache key"),
+    model: Optional[str] = Query(None, description="Drop every entry produced by this model"),
+):
+    """Without parameters, clears the whole cache."""
+    removed = await score_cache.invalidate(key=key, model=model)
+    return {"status": "ok", "removed": removed, "key": key, "model": model}
+
+# ---------- Ollama nodes ----------
+@router.get("/ollama")
+def ollama_nodes():
+    """Per-node load, resident models, circuit state and error counts."""
+    return ollama_router.stats()
+
+# ---------- Model residency ----------
+@router.get("/residency")
+def model_residency():
+    """Per model: where it is loaded, recent demand, cold-load vs warm request times."""
+    return residency.stats()
+
+# ---------- Output budgets ----------
+@router.get("/output-budgets")
+def output_budget_stats():
+    """Adaptive num_predict per model and prompt variant, next to its static default."""
+    return {"models": output_budgets.stats()}
@@ -1,13 +1,40 @@
-from fastapi import APIRouter, UploadFile, Form, HTTPException, status
-from fastapi.responses import JSONResponse
+from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from backend.ollama_client import (
-    generate_explained_score,
-    generate_explained_score_quick,
-    generate_compare_scores_single_call,
-    warmup,
+    generate_explained_score_async,
+    generate_explained_score_quick_async,
+    generate_compare_scores_single_call_async,
+    resume_token_budget,
+    stream_explained_score,
+    stream_explained_score_quick,
+    PROMPT_VERSION,
+)
+from backend import database, metrics
+from backend.audit import DIMENSIONS, AuditManager
+from backend.cache import cached, cache_key, score_cache
+from backend.jobs import FINISHED, PRIORITIES, Job, QueueFull, job_queue
+from backend.models import resume_model
+from backend.anonymizer import anonymize
+from backend.prompt_packer import pack_resume
+from backend.requirement_scoring import decomposable, score_by_requirements
+from backend.residency import residency
+from backend.prescreen import PRESCREEN_THRESHOLD, bm25_scores, document_terms, prescreen
+from backend.extraction import (
+    Spooled,
+    discard,
+    extract_pages,
+    extract_pdf,
+    spool,
 )
 import os
-import re
+import json
+import time
+import heapq
+import asyncio
+import zipfile
+import itertools
+import contextlib
 import fitz  # PyMuPDF
 
 router = APIRouter(tags=["resume"])
@@ -15,6 +42,30 @@ router = APIRouter(tags=["resume"])
 # Budgets tuned for speed/stability on 16-GB Macs
 MAX_CHARS = 40_000
 MAX_CHARS_COMPARE = 1_600
+# Context windows per prompt; resume and JD are packed to fit them
+NUM_CTX_UPLOAD = int(os.getenv("NUM_CTX_UPLOAD", "1024"))
+# same as NUM_CTX_UPLOAD by default: Ollama reloads the runner (and drops its
+# prompt cache) whenever num_ctx changes between requests
+NUM_CTX_COMPARE = int(os.getenv("NUM_CTX_COMPARE", "1024"))
+NUM_CTX_COMPARE_FALLBACK = int(os.getenv("NUM_CTX_COMPARE_FALLBACK", "1200"))
+
+# Batch screening
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_MEMBER_MB = int(os.getenv("BATCH_MAX_MEMBER_MB", "20"))  # uncompressed size of one resume in a zip
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))  # LLM calls in flight per batch
+BATCH_MODES = ("llm", "requirements", "prescreen")  # prescreen: lexical ranking only, no model calls
+# llm: one holistic prompt; requirements: a verdict per JD requirement, cached per
+# (resume, requirement) so an edited JD only pays for the requirements that changed
+SCORING_MODES = ("llm", "requirements")
+# Keep parsed uploads in the resume store (SQLite) by default
+RESUME_STORE = os.getenv("RESUME_STORE", "0") == "1"
+_ZIP_TYPES = ("application/zip", "application/x-zip-compressed")
+
+# Bias compare: start the single-call comparative prompt alongside the two
+# quick scores (cancelled if not needed), and the per-score probability
+# below which a quick score is not trusted on its own.
+COMPARE_SPECULATIVE = os.getenv("COMPARE_SPECULATIVE", "0") == "1"
+COMPARE_MIN_CONFIDENCE = float(os.getenv("COMPARE_MIN_CONFIDENCE", "0.5"))
 
 MODEL = os.getenv("MODEL", "llama3.2:3b")
 MODEL_COMPARE = os.getenv("MODEL_COMPARE", MODEL)
@@ -24,72 +75,76 @@ MODEL_COMPARE = os.getenv("MODEL_COMPARE", MODEL)
 def health():
     return {"status": "ok", "model": MODEL, "model_compare": MODEL_COMPARE}
 
+def _warmup_status(states: dict) -> dict:
+    return {
+        "status": "ok" if all(s == "resident" for s in states.values()) else "warming",
+        "models": {m: residency.status(m) for m in states},
+        "model": MODEL,
+        "model_compare": MODEL_COMPARE,
+    }
+
 @router.post("/warmup")
-def warmup_route():
-    try:
-        cmp_resp = warmup(MODEL_COMPARE)
-        main_resp = warmup(MODEL)
-        return {
-            "status": "ok",
-            "compare_response": cmp_resp,
-            "response": main_resp,
-            "model": MODEL,
-            "model_compare": MODEL_COMPARE,
-        }
-    except Exception as e:
-        return JSONResponse(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            content={"error": f"Warmup failed: {e}", "model": MODEL, "model_compare": MODEL_COMPARE},
-        )
+async def warmup_route():
+    """
+    Start loading both models in the background and return at once;
+    "status" is "ok" when both are already resident. Poll GET /warmup.
+    """
+    return _warmup_status({m: residency.preload(m) for m in dict.fromkeys((MODEL_COMPARE, MODEL))})
+
+@router.get("/warmup")
+def warmup_status():
+    return _warmup_status({m: residency.status(m)["state"] for m in dict.fromkeys((MODEL_COMPARE, MODEL))})
 
 # ---------- Helpers ----------
-def _extract_text_from_pdf(pdf_bytes: bytes) -> str:
+class ClientDisconnected(Exception):
+    pass
+
+async def _unless_disconnected(request: Request, coro, poll: float = 0.5):
+    """
+    Await `coro`, cancelling it if the HTTP client goes away meanwhile so an
+    abandoned request stops holding a model slot.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _disconnected_response():
+    # nginx-style "client closed request"; nobody is listening anyway
+    return JSONResponse(status_code=499, content={"error": "Client disconnected"})
+
+def _extract_text_from_pdf(pdf_bytes: bytes, char_budget: int = None) -> str:
+    """In-process extraction; request paths use backend.extraction.extract_pdf instead."""
     doc = None
     try:
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        return "\n".join(page.get_text() for page in doc)
+        return extract_pages(doc, char_budget)[0]
     finally:
         if doc:
             doc.close()
 
-def _prioritize_sections(text: str, limit: int) -> str:
-    lower = text.lower()
-
-    def grab(*names):
-        for n in names:
-            i = lower.find(n)
-            if i != -1:
-                return text[i : i + 1600]
-        return ""
-
-    chunks = [
-        grab("summary", "professional summary", "profile"),
-        grab("skills", "technical skills"),
-        grab("experience", "work experience", "employment"),
-        text,
-    ]
-    combined = "\n\n".join([c for c in chunks if c]).strip()
-    return combined[:limit] + ("\n...[truncated]" if len(combined) > limit else "")
-
-# Heavier anonymization (PII, simple names, locations, social links).
-_LOCATION_WORDS = r"(qatar|india|germany|usa|u\.s\.a|uk|u\.k|england|canada|uae|dubai|saudi|australia|singapore|france|italy|spain)"
+def _pack(text: str, variant: str, job_description: str, num_ctx: int, max_chars: int) -> str:
+    """Prioritized resume text sized for `variant`'s prompt (see backend.prompt_packer)."""
+    with metrics.stage("pack"):
+        budget = resume_token_budget(variant, job_description=job_description, num_ctx=num_ctx)
+        return pack_resume(text, max_tokens=budget, max_chars=max_chars)
 
+# Heavier anonymization (PII, simple names, locations, social links);
+# see backend/anonymizer.py for the rule sets.
 def _anon(t: str) -> str:
-    s = t
-    # Emails / phones / years
-    s = re.sub(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", "[EMAIL]", s)
-    s = re.sub(r"\+?\d[\d\s().-]{7,}\d", "[PHONE]", s)
-    s = re.sub(r"\b(19|20)\d{2}\b", "[YEAR]", s)
-    # Social links & usernames
-    s = re.sub(r"https?://(www\.)?(linkedin|github|gitlab|twitter|x)\.[^\s]+", "[PROFILE]", s, flags=re.I)
-    # Locations / nationalities (coarse)
-    s = re.sub(rf"\b{_LOCATION_WORDS}\b", "[LOCATION]", s, flags=re.I)
-    # Replace full-name patterns and first-line name
-    lines = s.splitlines()
-    if lines:
-        lines[0] = "Candidate"
-    s = re.sub(r"\b[A-Z][a-z]{2,15}\s[A-Z][a-z]{2,15}\b", "Candidate", s)
-    return s
+    with metrics.stage("anonymize"):
+        return anonymize(t).text
+
+def _prescreen(text: str, job_description: str):
+    with metrics.stage("prescreen"):
+        return prescreen(text, job_description)
 
 def _to_int(v):
     try:
@@ -100,160 +155,1291 @@ def _to_int(v):
         except Exception:
             return 0
 
-# ---------- Endpoints ----------
-@router.post("/upload")
-async def upload_resume(
-    file: UploadFile,
-    job_title: str = Form(...),
-    job_description: str = Form(...),
-    anonymize: bool = Form(False),
-):
+def _read_text_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8", errors="ignore")
+
+async def _decode_spooled(spooled: Spooled, content_type: str, char_budget: int) -> str:
+    """Text of a spooled upload (PDF parsed off the event loop). Consumes `spooled`."""
+    with metrics.stage("parse"):
+        if content_type == "text/plain":
+            try:
+                return await asyncio.to_thread(_read_text_file, spooled.path)
+            finally:
+                discard(spooled)
+        return await extract_pdf(spooled, char_budget=char_budget)
+
+async def _read_resume(file: UploadFile, type_hint: str, char_budget: int) -> tuple:
+    """
+    Validate an uploaded resume -> (text, Spooled), raising 400s like the
+    endpoints always did. The spool is already consumed; its digest and size remain.
+    """
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded.")
     if file.content_type not in ("application/pdf", "application/octet-stream", "text/plain"):
-        raise HTTPException(status_code=400, detail="Upload a PDF (or .txt for testing).")
+        raise HTTPException(status_code=400, detail=type_hint)
 
-    content = await file.read()
-    if not content:
+    with metrics.stage("upload_read"):
+        spooled = await asyncio.to_thread(spool, file.file)
+    if not spooled.size:
+        discard(spooled)
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
     try:
-        text = (
-            content.decode("utf-8", errors="ignore")
-            if file.content_type == "text/plain"
-            else _extract_text_from_pdf(content)
-        )
+        return await _decode_spooled(spooled, file.content_type, char_budget), spooled
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Could not parse file: {e}")
 
-    text = _prioritize_sections(text, MAX_CHARS)
-    text_for_scoring = _anon(text) if anonymize else text
+async def _read_resume_text(file: UploadFile, type_hint: str, char_budget: int) -> str:
+    return (await _read_resume(file, type_hint, char_budget))[0]
 
-    try:
-        result = generate_explained_score(
+async def _store_resume(text: str, spooled: Spooled, filename: str, content_type: str) -> tuple:
+    """Persist parsed text, prioritized sections and the anonymized variant -> (id, duplicate)."""
+    record = resume_model.build_record(
+        text=text,
+        content_hash=spooled.digest,
+        filename=filename,
+        content_type=content_type,
+        size=spooled.size,
+        max_chars=MAX_CHARS,
+    )
+    return await asyncio.to_thread(lambda: database.resume_put(**record))
+
+async def _score_explained(text_for_scoring: str, job_description: str):
+    """Full explained score through the score cache -> (result, cache_source)."""
+    return await cached(
+        "explained",
+        lambda: generate_explained_score_async(
             resume_text=text_for_scoring,
             job_description=job_description,
             model=MODEL,
             timeout=180,
-            num_ctx=1024,
-        )
-    except Exception as e:
-        return JSONResponse(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            content={"error": f"Model inference failed: {e}", "model": MODEL},
+            num_ctx=NUM_CTX_UPLOAD,
+        ),
+        model=MODEL,
+        num_ctx=NUM_CTX_UPLOAD,
+        resume_text=text_for_scoring,
+        job_description=job_description,
+    )
+
+async def _score_quick(text: str, job_description: str):
+    """Quick compare-model score through the score cache -> (result, cache_source)."""
+    return await cached(
+        "quick",
+        lambda: generate_explained_score_quick_async(
+            resume_text=text,
+            job_description=job_description,
+            model=MODEL_COMPARE,
+            timeout=120,
+            num_ctx=NUM_CTX_COMPARE,
+            confidence=True,
+        ),
+        model=MODEL_COMPARE,
+        num_ctx=NUM_CTX_COMPARE,
+        resume_text=text,
+        job_description=job_description,
+    )
+
+async def _score_compare(text_small: str, text_anon: str, job_description: str):
+    """Single-call comparative score through the score cache -> (result, cache_source)."""
+    return await cached(
+        "compare",
+        lambda: generate_compare_scores_single_call_async(
+            job_description=job_description,
+            original_text=text_small,
+            anonymized_text=text_anon,
+            model=MODEL_COMPARE,
+            timeout=140,
+            num_ctx=NUM_CTX_COMPARE_FALLBACK,
+        ),
+        model=MODEL_COMPARE,
+        num_ctx=NUM_CTX_COMPARE_FALLBACK,
+        job_description=job_description,
+        original_text=text_small,
+        anonymized_text=text_anon,
+    )
+
+async def _score_requirements(text_for_scoring: str, job_description: str):
+    """Requirement-by-requirement score (backend.requirement_scoring) -> (result, cache_source)."""
+    return await score_by_requirements(
+        resume_text=text_for_scoring,
+        job_description=job_description,
+        model=MODEL,
+        num_ctx=NUM_CTX_UPLOAD,
+        timeout=180,
+    )
+
+def _scoring_variant(mode: str, job_description: str) -> str:
+    # a JD without separable requirements is always scored as a whole
+    return "requirements" if mode == "requirements" and decomposable(job_description) else "explained"
+
+async def _score_resume(text_for_scoring: str, job_description: str, variant: str):
+    if variant == "requirements":
+        return await _score_requirements(text_for_scoring, job_description)
+    return await _score_explained(text_for_scoring, job_description)
+
+def _needs_fallback(r_orig: dict, r_anon: dict) -> tuple:
+    """
+    Whether the two quick scores can stand on their own -> (needed, reason).
+    Uses the model's probability for each score when Ollama reports
+    logprobs: a confident tie is a real "no difference", a low-probability
+    score is noise even when it differs. Without logprobs, falls back to
+    treating identical or empty scores as inconclusive.
+    """
+    if any("Unable to parse" in str(r.get("summary", "")) for r in (r_orig, r_anon)):
+        return True, "parse_failure"
+    s1 = _to_int(r_orig.get("score", 0))
+    s2 = _to_int(r_anon.get("score", 0))
+    if s1 == 0 and s2 == 0:
+        return True, "both_zero"
+    c1, c2 = r_orig.get("score_confidence"), r_anon.get("score_confidence")
+    if c1 is not None and c2 is not None:
+        if min(c1, c2) < COMPARE_MIN_CONFIDENCE:
+            return True, "low_confidence"
+        return False, "confident_scores"
+    if s1 == s2:
+        return True, "tie_without_confidence"
+    return False, "distinct_scores"
+
+class _Branches:
+    """Named tasks with their wall times, all cancelled on close()."""
+
+    def __init__(self):
+        self.tasks = {}
+        self.timings = {}
+
+    def start(self, name: str, coro) -> asyncio.Future:
+        async def timed():
+            started = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                self.timings[name] = round((time.perf_counter() - started) * 1000)
+        self.tasks[name] = asyncio.ensure_future(timed())
+        return self.tasks[name]
+
+    def cancel(self, name: str) -> bool:
+        task = self.tasks.get(name)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def close(self) -> None:
+        for name in self.tasks:
+            self.cancel(name)
+
+async def _resolve_compare(text_small, text_anon, job_description, r_orig, r_anon, cache_info,
+                           *, branches: _Branches, path: list) -> dict:
+    """
+    Turn the two quick scores into the /compare payload. When they are not
+    conclusive (see _needs_fallback), use the single-call comparative prompt,
+    joining the speculative branch if one is running. Records the fallback's
+    cache tier in `cache_info` and each step in `path`.
+    """
+    s1 = _to_int(r_orig.get("score", 0))
+    s2 = _to_int(r_anon.get("score", 0))
+    delta = s1 - s2
+
+    used_fallback = False
+    confidence = {"original": r_orig.get("score_confidence"), "anonymized": r_anon.get("score_confidence")}
+    needed, reason = _needs_fallback(r_orig, r_anon)
+    path.append(reason)
+
+    if not needed:
+        if branches.cancel("fallback"):
+            path.append("fallback_cancelled")
+    else:
+        fallback = branches.tasks.get("fallback")
+        if fallback is None:
+            fallback = branches.start("fallback", _score_compare(text_small, text_anon, job_description))
+            path.append("fallback_started")
+        try:
+            comp, cache_info["fallback"] = await fallback
+            o = comp.get("original") or {}
+            a = comp.get("anonymized") or {}
+            s1b = _to_int(o.get("score", s1))
+            s2b = _to_int(a.get("score", s2))
+            # Only adopt fallback if it looks sane
+            if (s1b != 0 or s2b != 0) and (s1b != s2b or s1 == s2):
+                s1, s2 = s1b, s2b
+                delta = s1 - s2
+                r_orig = {"summary": str(o.get("summary", ""))[:300], "score": s1}
+                r_anon = {"summary": str(a.get("summary", ""))[:300], "score": s2}
+                used_fallback = True
+                path.append("fallback_adopted")
+            else:
+                path.append("fallback_rejected")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            path.append("fallback_failed")  # keep two-call result
+
+    return {
+        "original": {"score": s1, "summary": str(r_orig.get("summary", ""))[:300]},
+        "anonymized": {"score": s2, "summary": str(r_anon.get("summary", ""))[:300]},
+        "delta": delta,
+        "model": MODEL,
+        "model_compare": MODEL_COMPARE,
+        "note": "fallback_compare_used" if used_fallback else "two_call_compare",
+        "decision": {
+            "path": path,
+            "speculative": "speculative_fallback" in path,
+            "confidence": confidence,
+            "min_confidence": COMPARE_MIN_CONFIDENCE,
+        },
+        "timings_ms": branches.timings,
+    }
+
+async def _compare_pipeline(text_small, text_anon, job_description, *, speculative: bool) -> dict:
+    """
+    Bias compare with both quick scores in flight at once (and, if
+    `speculative`, the comparative fallback too) -> payload core plus "cache".
+    """
+    started = time.perf_counter()
+    branches = _Branches()
+    path = ["quick_parallel"]
+    try:
+        orig = branches.start("original", _score_quick(text_small, job_description))
+        anon = branches.start("anonymized", _score_quick(text_anon, job_description))
+        if speculative:
+            branches.start("fallback", _score_compare(text_small, text_anon, job_description))
+            path.append("speculative_fallback")
+        (r_orig, cache_orig), (r_anon, cache_anon) = await asyncio.gather(orig, anon)
+        cache_info = {"original": cache_orig, "anonymized": cache_anon}
+        outcome = await _resolve_compare(
+            text_small, text_anon, job_description, r_orig, r_anon, cache_info, branches=branches, path=path
         )
+    finally:
+        branches.close()
+    outcome["timings_ms"]["total"] = round((time.perf_counter() - started) * 1000)
+    return {**outcome, "cache": cache_info}
+
+def _prescreen_skip(screen, threshold: int) -> dict:
+    """The LLM fields of a resume that was not sent to the model, or None to score it."""
+    if not threshold or screen.score >= threshold:
+        return None
+    return {
+        "relevance_score": None,
+        "summary": f"Pre-screen coverage {screen.score} is below the threshold ({threshold}); not scored by the model.",
+        "evidence": [],
+        "risks": [],
+        "note": "prescreen_skipped",
+    }
 
+def _shape_explained(result: dict) -> dict:
     score = _to_int(result.get("score", 0))
     summary = str(result.get("summary", ""))[:600]
     evidence = result.get("evidence") or []
     risks = result.get("risks") or []
     note = "ok" if score != 0 or "Unable to parse" not in summary else "parser_fallback"
-
-    return {
-        "filename": file.filename,
-        "job_title": job_title,
+    shaped = {
         "relevance_score": score,
         "summary": summary,
         "evidence": evidence[:3],
         "risks": risks[:2],
+        "note": note,
+    }
+    if "requirements" in result:
+        shaped["requirements"] = result["requirements"]
+        shaped["requirements_rescored"] = result.get("requirements_rescored", 0)
+    return shaped
+
+async def _prepare_upload(file: UploadFile, job_description: str, anonymize: bool, store: bool,
+                          variant: str = "explained") -> tuple:
+    """Read, optionally store, pack and pre-screen an upload -> (text for scoring, screen, stored fields)."""
+    text, spooled = await _read_resume(file, "Upload a PDF (or .txt for testing).", MAX_CHARS)
+    stored = {}
+    if store:
+        stored["resume_id"], _ = await _store_resume(text, spooled, file.filename, file.content_type)
+    text = _pack(text, variant, job_description, NUM_CTX_UPLOAD, MAX_CHARS)
+    screen = _prescreen(text, job_description)
+    return (_anon(text) if anonymize else text), screen, stored
+
+def _upload_payload(filename, job_title, stored, screen, anonymize, fields: dict, cache_src,
+                    variant: str = "explained") -> dict:
+    return {
+        "filename": filename,
+        **stored,
+        "job_title": job_title,
+        **fields,
+        "prescreen": screen._asdict(),
         "model": MODEL,
+        "mode": "requirements" if variant == "requirements" else "llm",
         "anonymized": bool(anonymize),
-        "note": note,
+        "cache_hit": cache_src not in (None, "miss"),
+        "cache": cache_src,
     }
 
-@router.post("/compare")
-async def compare_resume(
+def _compare_payload(filename, job_title, outcome: dict) -> dict:
+    return {
+        "filename": filename,
+        "job_title": job_title,
+        **outcome,
+        "cache_hit": all(src != "miss" for src in outcome["cache"].values()),
+    }
+
+def _check_scoring(mode: str) -> None:
+    if mode not in SCORING_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SCORING_MODES)}.")
+
+# ---------- Scheduling ----------
+def _too_many(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+def _check_priority(priority: str) -> None:
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}.")
+
+def _admit(kind: str, priority: str = "interactive") -> None:
+    """429 now if the queue would reject the job, before the upload is read, parsed or stored."""
+    _check_priority(priority)
+    try:
+        job_queue.admit(kind, priority)
+    except QueueFull as e:
+        raise _too_many(e)
+
+def _submit(kind: str, run, *, priority: str = "interactive", deadline_s: float = 0, meta: dict = None) -> Job:
+    """Queue `run` on the shared job queue; 400 for an unknown priority, 429 when the queue is full."""
+    _check_priority(priority)
+    deadline = time.monotonic() + deadline_s if deadline_s and deadline_s > 0 else None
+    try:
+        return job_queue.submit(Job(kind, run, priority=priority, deadline=deadline, meta=meta))
+    except QueueFull as e:
+        raise _too_many(e)
+
+def _submit_stream(kind: str, produce) -> tuple:
+    """
+    Queue the async generator function `produce` as an interactive job whose
+    items are handed over as they come -> (job, items queue); see _job_items.
+    """
+    items = asyncio.Queue()
+
+    async def run():
+        async for item in produce():
+            items.put_nowait(item)
+
+    return _submit(kind, run), items
+
+async def _job_items(job: Job, items: asyncio.Queue):
+    """
+    Yield what a _submit_stream job produces until it ends; RuntimeError if it
+    did not finish cleanly. Closing the generator (client gone) cancels the job.
+    """
+    ended = asyncio.ensure_future(job.changed.wait())
+    try:
+        while True:
+            getter = asyncio.ensure_future(items.get())
+            await asyncio.wait({getter, ended}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            yield getter.result()
+        while not items.empty():
+            yield items.get_nowait()
+        if job.status != "done":
+            raise RuntimeError(job.error or f"job {job.status}")
+    finally:
+        ended.cancel()
+        if job.status not in FINISHED:
+            job_queue.cancel(job)
+
+async def _await_job(job: Job, request: Request = None):
+    """
+    Result of `job`, waiting on behalf of the caller. The job is cancelled if
+    the caller is (or, with `request`, if the HTTP client disconnects).
+    """
+    try:
+        if request is None:
+            await job_queue.wait(job)
+        else:
+            await _unless_disconnected(request, job_queue.wait(job))
+    finally:
+        if job.status not in FINISHED:
+            job_queue.cancel(job)
+    if job.status != "done":
+        raise RuntimeError(job.error or f"job {job.status}")
+    return job.result
+
+async def _run_bulk(kind: str, run):
+    """Run `run` as a bulk job, waiting (not failing) while the queue is full."""
+    return await job_queue.run(Job(kind, run, priority="bulk"))
+
+# ---------- Endpoints ----------
+@router.post("/upload")
+async def upload_resume(
+    request: Request,
     file: UploadFile,
     job_title: str = Form(...),
     job_description: str = Form(...),
+    anonymize: bool = Form(False),
+    prescreen_threshold: int = Form(PRESCREEN_THRESHOLD),
+    store: bool = Form(RESUME_STORE),
+    mode: str = Form("llm", description="llm (one holistic prompt) or requirements (per JD requirement)"),
 ):
     """
-    Bias check: (1) score ORIGINAL and ANONYMIZED separately (quick scorer),
-    then (2) if both scores look identical/empty, run a single-call comparative
-    fallback that often teases out subtle differences.
+    Score one resume. Runs as an interactive job on the shared queue (429 when
+    it is full). mode=requirements judges each JD requirement separately and
+    adds the per-requirement breakdown; after a JD edit only the changed
+    requirements are sent to the model.
     """
-    if not file:
-        raise HTTPException(status_code=400, detail="No file uploaded.")
-    if file.content_type not in ("application/pdf", "application/octet-stream", "text/plain"):
-        raise HTTPException(status_code=400, detail="Upload a PDF (or .txt).")
+    _check_scoring(mode)
+    _admit("score")
+    variant = _scoring_variant(mode, job_description)
+    residency.preload(MODEL_COMPARE)  # a bias compare usually follows
+    text_for_scoring, screen, stored = await _prepare_upload(file, job_description, anonymize, store, variant)
 
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    skipped = _prescreen_skip(screen, prescreen_threshold)
+    if skipped:
+        return _upload_payload(file.filename, job_title, stored, screen, anonymize, skipped, None, variant)
 
+    job = _submit("score", lambda: _score_resume(text_for_scoring, job_description, variant))
     try:
-        text = (
-            content.decode("utf-8", errors="ignore")
-            if file.content_type == "text/plain"
-            else _extract_text_from_pdf(content)
-        )
+        result, cache_src = await _await_job(job, request)
+    except ClientDisconnected:
+        return _disconnected_response()
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Could not parse file: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            content={"error": f"Model inference failed: {e}", "model": MODEL},
+        )
+
+    return _upload_payload(
+        file.filename, job_title, stored, screen, anonymize, _shape_explained(result), cache_src, variant
+    )
+
+@router.post("/compare")
+async def compare_resume(
+    request: Request,
+    file: UploadFile,
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    speculative: bool = Form(COMPARE_SPECULATIVE),
+):
+    """
+    Bias check: (1) score ORIGINAL and ANONYMIZED concurrently (quick scorer),
+    then (2) if the scores are not conclusive, run a single-call comparative
+    fallback that often teases out subtle differences. With `speculative`,
+    (2) starts alongside (1) and is cancelled when not needed.
+    `decision` explains the path taken; `timings_ms` has per-branch times.
+    """
+    _admit("compare")
+    text = await _read_resume_text(file, "Upload a PDF (or .txt).", MAX_CHARS_COMPARE)
 
     # Compact slice for speed
-    text_small = _prioritize_sections(text, MAX_CHARS_COMPARE)
+    text_small = _pack(text, "quick", job_description, NUM_CTX_COMPARE, MAX_CHARS_COMPARE)
     text_anon = _anon(text_small)
 
-    # --- Path A: two-call quick scores
+    job = _submit(
+        "compare", lambda: _compare_pipeline(text_small, text_anon, job_description, speculative=speculative)
+    )
     try:
-        r_orig = generate_explained_score_quick(
-            resume_text=text_small,
-            job_description=job_description,
-            model=MODEL_COMPARE,
-            timeout=120,
-            num_ctx=900,
-        )
-        r_anon = generate_explained_score_quick(
-            resume_text=text_anon,
-            job_description=job_description,
-            model=MODEL_COMPARE,
-            timeout=120,
-            num_ctx=900,
-        )
+        outcome = await _await_job(job, request)
+    except ClientDisconnected:
+        return _disconnected_response()
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_502_BAD_GATEWAY,
             content={"error": f"Model inference failed: {e}", "model": MODEL_COMPARE},
         )
 
-    s1 = _to_int(r_orig.get("score", 0))
-    s2 = _to_int(r_anon.get("score", 0))
-    delta = s1 - s2
+    return _compare_payload(file.filename, job_title, outcome)
 
-    used_fallback = False
+# ---------- Streaming (SSE) ----------
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _shape_field(key: str, value):
+    """Single-field version of _shape_explained for early delivery; None for unknown keys."""
+    if key == "score":
+        return {"relevance_score": _to_int(value)}
+    if key == "summary":
+        return {"summary": str(value)[:600]}
+    if key == "evidence":
+        return {"evidence": (value or [])[:3]}
+    if key == "risks":
+        return {"risks": (value or [])[:2]}
+    return None
+
+async def _stream_scored_fields(stream_fn, *, variant, model, num_ctx, text, job_description, prefix=""):
+    """
+    Yield SSE field events for one score, from the score cache when possible,
+    otherwise as the model streams them. Ends with ("done", result, cache_source).
+    """
+    t0 = time.perf_counter()
+    key = cache_key(variant, model=model, num_ctx=num_ctx, resume_text=text, job_description=job_description)
+    result, cache_src = await score_cache.peek(key, model=model)
+    if result is not None:
+        for k, v in result.items():
+            shaped = _shape_field(k, v)
+            if shaped is not None:
+                yield ("event", _sse(prefix + k, {**shaped, "t_ms": round((time.perf_counter() - t0) * 1000)}))
+        yield ("done", result, cache_src)
+        return
+
+    async for kind, *rest in stream_fn(
+        resume_text=text, job_description=job_description, model=model, timeout=180, num_ctx=num_ctx
+    ):
+        if kind == "field":
+            shaped = _shape_field(*rest)
+            if shaped is not None:
+                yield ("event", _sse(prefix + rest[0], {**shaped, "t_ms": round((time.perf_counter() - t0) * 1000)}))
+        else:
+            result = rest[0]
+    await score_cache.store(key, result, model=model, variant=variant)
+    yield ("done", result, "miss")
+
+@router.post("/upload/stream")
+async def upload_resume_stream(
+    file: UploadFile,
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    anonymize: bool = Form(False),
+    prescreen_threshold: int = Form(PRESCREEN_THRESHOLD),
+):
+    """
+    Same as /upload, but answers with Server-Sent Events: `score`, `summary`,
+    `evidence` and `risks` are sent as soon as each is decodable from the
+    model stream, then `result` carries the full /upload payload (or `error`).
+    The pre-screen result arrives first, in `meta`. The model work runs as an
+    interactive job on the shared queue (429 when it is full).
+    """
+    _admit("score")
+    residency.preload(MODEL_COMPARE)
+    text = await _read_resume_text(file, "Upload a PDF (or .txt for testing).", MAX_CHARS)
+    text = _pack(text, "explained", job_description, NUM_CTX_UPLOAD, MAX_CHARS)
+    text_for_scoring = _anon(text) if anonymize else text
+    screen = _prescreen(text, job_description)
+    skipped = _prescreen_skip(screen, prescreen_threshold)
+
+    async def scored():
+        result, cache_src = None, "miss"
+        try:
+            async for kind, *rest in _stream_scored_fields(
+                stream_explained_score, variant="explained", model=MODEL, num_ctx=NUM_CTX_UPLOAD,
+                text=text_for_scoring, job_description=job_description,
+            ):
+                if kind == "event":
+                    yield rest[0]
+                else:
+                    result, cache_src = rest
+        except Exception as e:
+            yield _sse("error", {"error": f"Model inference failed: {e}", "model": MODEL})
+            return
+        yield _sse("result", {
+            "filename": file.filename,
+            "job_title": job_title,
+            **_shape_explained(result),
+            "prescreen": screen._asdict(),
+            "model": MODEL,
+            "anonymized": bool(anonymize),
+            "cache_hit": cache_src != "miss",
+            "cache": cache_src,
+        })
+
+    job, items = (None, None) if skipped else _submit_stream("score", scored)
+
+    async def events():
+        yield _sse("meta", {
+            "filename": file.filename, "job_title": job_title, "model": MODEL, "prescreen": screen._asdict(),
+        })
+        if skipped:
+            yield _sse("result", {
+                "filename": file.filename,
+                "job_title": job_title,
+                **skipped,
+                "prescreen": screen._asdict(),
+                "model": MODEL,
+                "anonymized": bool(anonymize),
+                "cache_hit": False,
+                "cache": None,
+            })
+            return
+        try:
+            async for event in _job_items(job, items):
+                yield event
+        except RuntimeError as e:
+            yield _sse("error", {"error": f"Model inference failed: {e}", "model": MODEL})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
 
-    # If identical/empty, try a single-call, stronger comparative prompt
-    if (s1 == 0 and s2 == 0) or (s1 == s2):
+@router.post("/compare/stream")
+async def compare_resume_stream(
+    file: UploadFile,
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+):
+    """
+    Same as /compare over Server-Sent Events: `original.<field>` and
+    `anonymized.<field>` events as the quick scores stream in, then `result`
+    with the full /compare payload (or `error`). Runs as an interactive job on
+    the shared queue, like /compare.
+    """
+    _admit("compare")
+    text = await _read_resume_text(file, "Upload a PDF (or .txt).", MAX_CHARS_COMPARE)
+    text_small = _pack(text, "quick", job_description, NUM_CTX_COMPARE, MAX_CHARS_COMPARE)
+    text_anon = _anon(text_small)
+
+    async def compared():
+        scored, cache_info = {}, {}
+        try:
+            for side, body in (("original", text_small), ("anonymized", text_anon)):
+                async for kind, *rest in _stream_scored_fields(
+                    stream_explained_score_quick, variant="quick", model=MODEL_COMPARE, num_ctx=NUM_CTX_COMPARE,
+                    text=body, job_description=job_description, prefix=f"{side}.",
+                ):
+                    if kind == "event":
+                        yield rest[0]
+                    else:
+                        scored[side], cache_info[side] = rest
+        except Exception as e:
+            yield _sse("error", {"error": f"Model inference failed: {e}", "model": MODEL_COMPARE})
+            return
+        branches = _Branches()
         try:
-            comp = generate_compare_scores_single_call(
-                job_description=job_description,
-                original_text=text_small,
-                anonymized_text=text_anon,
-                model=MODEL_COMPARE,
-                timeout=140,
-                num_ctx=1200,
+            outcome = await _resolve_compare(
+                text_small, text_anon, job_description, scored["original"], scored["anonymized"], cache_info,
+                branches=branches, path=["quick_streamed"],
             )
-            o = comp.get("original") or {}
-            a = comp.get("anonymized") or {}
-            s1b = _to_int(o.get("score", s1))
-            s2b = _to_int(a.get("score", s2))
-            # Only adopt fallback if it looks sane
-            if (s1b != 0 or s2b != 0) and (s1b != s2b or s1 == s2):
-                s1, s2 = s1b, s2b
-                delta = s1 - s2
-                r_orig = {"summary": str(o.get("summary", ""))[:300], "score": s1}
-                r_anon = {"summary": str(a.get("summary", ""))[:300], "score": s2}
-                used_fallback = True
-        except Exception:
-            pass  # keep two-call result
+        finally:
+            branches.close()
+        yield _sse("result", {
+            "filename": file.filename,
+            "job_title": job_title,
+            **outcome,
+            "cache_hit": all(src != "miss" for src in cache_info.values()),
+            "cache": cache_info,
+        })
+
+    job, items = _submit_stream("compare", compared)
+
+    async def events():
+        yield _sse("meta", {"filename": file.filename, "job_title": job_title, "model_compare": MODEL_COMPARE})
+        try:
+            async for event in _job_items(job, items):
+                yield event
+        except RuntimeError as e:
+            yield _sse("error", {"error": f"Model inference failed: {e}", "model": MODEL_COMPARE})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+# ---------- Batch ----------
+class _Seekless:
+    """Adapter so spool() can read zip members, which only support seek(0) at start."""
+
+    def __init__(self, fobj):
+        self._fobj = fobj
+
+    def seek(self, pos):
+        pass
+
+    def read(self, n):
+        return self._fobj.read(n)
+
+def _zip_member_type(info):
+    member = info.filename
+    if info.is_dir() or member.startswith("__MACOSX/"):
+        return None
+    lower = member.lower()
+    if lower.endswith(".pdf"):
+        return "application/pdf"
+    if lower.endswith(".txt"):
+        return "text/plain"
+    return None
+
+def _expand_batch_item(filename: str, content_type: str, fobj, out: list, rejected: list) -> None:
+    """
+    Spool a plain upload, or each resume inside a zip, to disk, appending
+    (filename, content_type, Spooled) to `out`. Archives and members that
+    cannot be read go to `rejected` as (filename, reason) instead. Raises
+    HTTPException 413 before extracting anything past BATCH_MAX_FILES.
+    Blocking: run in a thread.
+    """
+    name = filename or ""
+    if not (content_type in _ZIP_TYPES or name.lower().endswith(".zip")):
+        _check_batch_size(len(out) + len(rejected) + 1)
+        out.append((name, content_type, spool(fobj)))
+        return
+    try:
+        zf = zipfile.ZipFile(fobj)
+    except (zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+        rejected.append((name, f"Could not read zip archive: {e}"))
+        return
+    with zf:
+        members = [(info, _zip_member_type(info)) for info in zf.infolist()]
+        members = [(info, ctype) for info, ctype in members if ctype]
+        _check_batch_size(len(out) + len(rejected) + len(members))
+        for info, ctype in members:
+            if info.file_size > BATCH_MAX_MEMBER_MB * 2**20:
+                rejected.append((info.filename, f"File is larger than {BATCH_MAX_MEMBER_MB} MB uncompressed."))
+                continue
+            try:
+                with zf.open(info) as member_fobj:
+                    spooled = spool(_Seekless(member_fobj))
+            except Exception as e:  # corrupt data, encryption, unsupported compression
+                rejected.append((info.filename, f"Could not extract from {name}: {e}"))
+                continue
+            out.append((info.filename, ctype, spooled))
+
+def _check_batch_size(count: int) -> None:
+    if count > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many resumes ({count} > {BATCH_MAX_FILES}).")
+
+class _PriorityGate:
+    """Semaphore that admits the waiter with the lowest priority value first (FIFO among equals)."""
+
+    def __init__(self, slots: int):
+        self._free = slots
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release()  # granted and cancelled in the same tick: pass it on
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiters:
+            fut = heapq.heappop(self._waiters)[2]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._free += 1
+
+async def _load_upload(filename, content_type, spooled, *, store) -> tuple:
+    """
+    Batch loader for an uploaded file -> (text, extra line fields, anonymized
+    text or None to anonymize on demand). Consumes `spooled`.
+    """
+    if not spooled.size:
+        discard(spooled)
+        raise ValueError("Uploaded file is empty.")
+    try:
+        text = await _decode_spooled(spooled, content_type, MAX_CHARS)
+    except Exception as e:
+        raise ValueError(f"Could not parse file: {e}")
+    if not store:
+        return text, {}, None
+    resume_id, _ = await _store_resume(text, spooled, filename, content_type)
+    return text, {"resume_id": resume_id}, None
+
+async def _load_stored(resume_id: int) -> tuple:
+    """
+    Batch loader for a stored resume: no file I/O, no parsing, and the
+    prioritized and anonymized texts computed when it was stored.
+    """
+    row = await asyncio.to_thread(database.resume_get, resume_id)
+    if row is None:
+        raise ValueError(f"No stored resume with id {resume_id}.")
+    return row["packed"], {"resume_id": resume_id, "filename": row["filename"]}, row["anonymized"]
+
+async def _batch_score_one(index, filename, load, *, job_description, anonymize, llm_slots, mode, threshold, terms):
+    started = time.perf_counter()
+    base = {"index": index, "filename": filename}
+    try:
+        text, extra, anonymized = await load()
+        base.update(extra)
+        variant = _scoring_variant(mode, job_description)
+        text = _pack(text, variant, job_description, NUM_CTX_UPLOAD, MAX_CHARS)
+        screen = _prescreen(text, job_description)
+        if mode == "prescreen":
+            terms[index] = document_terms(text)
+            return {
+                "type": "result",
+                **base,
+                "prescreen": screen._asdict(),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000),
+            }
+        skipped = _prescreen_skip(screen, threshold)
+        if skipped:
+            return {
+                "type": "skipped",
+                **base,
+                **skipped,
+                "prescreen": screen._asdict(),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000),
+            }
+        if not anonymize:
+            text_for_scoring = text
+        elif anonymized is not None:
+            text_for_scoring = _pack(anonymized, variant, job_description, NUM_CTX_UPLOAD, MAX_CHARS)
+        else:
+            text_for_scoring = _anon(text)
+        # most plausible candidates reach the model first; interactive jobs go before all of them
+        async with llm_slots.slot(-screen.score):
+            try:
+                result, cache_src = await _run_bulk(
+                    "score", lambda: _score_resume(text_for_scoring, job_description, variant)
+                )
+            except Exception as e:
+                raise RuntimeError(f"Model inference failed: {e}")
+        return {
+            "type": "result",
+            **base,
+            **_shape_explained(result),
+            "prescreen": screen._asdict(),
+            "cache_hit": cache_src != "miss",
+            "elapsed_ms": round((time.perf_counter() - started) * 1000),
+        }
+    except Exception as e:
+        return {
+            "type": "error",
+            **base,
+            "error": str(e),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000),
+        }
+
+async def _batch_stream(jobs, *, job_title, job_description, anonymize, concurrency, mode, threshold, cleanup=None):
+    """
+    NDJSON lines for `jobs` [(filename, load)] in completion order, then the
+    summary. `load` is a zero-arg coroutine function -> (text, extra fields,
+    anonymized text or None), see _load_upload and _load_stored.
+    """
+    started = time.perf_counter()
+    llm_slots = _PriorityGate(max(1, min(concurrency, 16)))
+    terms = {}  # index -> document_terms, for BM25 in prescreen mode
+    tasks = [
+        asyncio.ensure_future(_batch_score_one(
+            i, name, load,
+            job_description=job_description,
+            anonymize=anonymize,
+            llm_slots=llm_slots,
+            mode=mode,
+            threshold=threshold,
+            terms=terms,
+        ))
+        for i, (name, load) in enumerate(jobs)
+    ]
+    results = []
+    try:
+        for fut in asyncio.as_completed(tasks):
+            line = await fut
+            results.append(line)
+            yield json.dumps(line) + "\n"
+    finally:
+        # client went away: stop queued and running generations
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        if cleanup is not None:
+            cleanup()
+
+    scored = [r for r in results if r["type"] == "result"]
+    skipped = sum(1 for r in results if r["type"] == "skipped")
+    if mode == "prescreen":
+        bm25 = dict(zip(
+            (r["index"] for r in scored),
+            bm25_scores(job_description, [terms[r["index"]] for r in scored]),
+        ))
+        scored.sort(key=lambda r: (-r["prescreen"]["score"], -bm25[r["index"]], r["index"]))
+        ranking = [
+            {"rank": n, "index": r["index"], "filename": r["filename"],
+             "prescreen_score": r["prescreen"]["score"], "bm25": bm25[r["index"]]}
+            for n, r in enumerate(scored, start=1)
+        ]
+    else:
+        scored.sort(key=lambda r: (-r["relevance_score"], r["index"]))
+        ranking = [
+            {"rank": n, "index": r["index"], "filename": r["filename"], "relevance_score": r["relevance_score"]}
+            for n, r in enumerate(scored, start=1)
+        ]
+    for entry, r in zip(ranking, scored):
+        if "resume_id" in r:
+            entry["resume_id"] = r["resume_id"]
+    yield json.dumps({
+        "type": "summary",
+        "job_title": job_title,
+        "mode": mode,
+        "model": MODEL if mode != "prescreen" else None,
+        "anonymized": bool(anonymize),
+        "total": len(jobs),
+        "scored": len(scored),
+        "skipped": skipped,
+        "failed": len(results) - len(scored) - skipped,
+        "ranking": ranking,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000),
+    }) + "\n"
+
+async def _spool_uploads(files: List[UploadFile]) -> tuple:
+    """
+    Spool uploads (expanding zips) -> ([(filename, content_type, Spooled)],
+    [(filename, reason)] for unreadable archives and members), with the batch limits.
+    """
+    # Spool everything to disk now: form files are closed once the handler returns.
+    items, rejected = [], []
+    try:
+        for f in files:
+            await asyncio.to_thread(_expand_batch_item, f.filename, f.content_type, f.file, items, rejected)
+    except BaseException:
+        for _, _, spooled in items:
+            discard(spooled)
+        raise
+    if not items and not rejected:
+        raise HTTPException(status_code=400, detail="No resumes found in upload.")
+    return items, rejected
+
+async def _rejected(reason: str):
+    raise ValueError(reason)
+
+def _check_mode(mode: str) -> None:
+    if mode not in BATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(BATCH_MODES)}.")
+
+@router.post("/batch")
+async def batch_resumes(
+    files: List[UploadFile] = File(...),
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    anonymize: bool = Form(False),
+    concurrency: int = Form(BATCH_CONCURRENCY),
+    mode: str = Form("llm"),
+    prescreen_threshold: int = Form(PRESCREEN_THRESHOLD),
+    store: bool = Form(RESUME_STORE),
+):
+    """
+    Score many resumes (PDF/.txt files and/or .zip archives) against one job
+    description. Streams NDJSON: one {"type": "result"|"skipped"|"error"} line
+    per resume as soon as it finishes, then a final {"type": "summary"} line
+    with the ranking. Resumes reach the model in pre-screen order; those below
+    `prescreen_threshold` are skipped. mode=prescreen ranks by pre-screen
+    coverage (BM25 over the batch breaks ties) without calling the model;
+    mode=requirements scores per JD requirement (see /upload).
+    With `store`, parsed resumes are also kept in the resume store.
+    """
+    _check_mode(mode)
+    items, rejected = await _spool_uploads(files)
+    jobs = [
+        (name, lambda name=name, ctype=ctype, spooled=spooled: _load_upload(name, ctype, spooled, store=store))
+        for name, ctype, spooled in items
+    ] + [(name, lambda reason=reason: _rejected(reason)) for name, reason in rejected]
+
+    def cleanup():
+        for _, _, spooled in items:
+            discard(spooled)
+
+    return StreamingResponse(
+        _batch_stream(
+            jobs, job_title=job_title, job_description=job_description, anonymize=anonymize,
+            concurrency=concurrency, mode=mode, threshold=prescreen_threshold, cleanup=cleanup,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+# ---------- Stored resumes ----------
+@router.post("/store")
+async def store_resumes(files: List[UploadFile] = File(...)):
+    """
+    Parse and keep resumes (PDF/.txt files and/or .zip archives) without
+    scoring them. Files already stored (same bytes or same text) are not
+    duplicated; their existing id is returned.
+    """
+    items, rejected = await _spool_uploads(files)
+
+    async def one(index, name, ctype, spooled):
+        try:
+            text, _, _ = await _load_upload(name, ctype, spooled, store=False)
+            resume_id, duplicate = await _store_resume(text, spooled, name, ctype)
+            return {"index": index, "filename": name, "resume_id": resume_id, "duplicate": duplicate}
+        except Exception as e:
+            return {"index": index, "filename": name, "error": str(e)}
+
+    try:
+        results = await asyncio.gather(*(one(i, *item) for i, item in enumerate(items)))
+    finally:
+        for _, _, spooled in items:
+            discard(spooled)
+    results += [
+        {"index": i, "filename": name, "error": reason}
+        for i, (name, reason) in enumerate(rejected, start=len(items))
+    ]
+    return {
+        "stored": [r for r in results if "error" not in r],
+        "errors": [r for r in results if "error" in r],
+        "total_stored": await asyncio.to_thread(database.resume_count),
+    }
 
+@router.get("/store")
+async def list_stored(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    rows = await asyncio.to_thread(database.resume_list, limit=limit, offset=offset)
+    total = await asyncio.to_thread(database.resume_count)
+    return {"total": total, "items": [resume_model.summary(r) for r in rows]}
+
+@router.get("/store/search")
+async def search_stored(
+    q: str = Query(..., description='Keywords; "quoted phrase" for exact matches'),
+    any_term: bool = Query(False, alias="any", description="Match any keyword instead of all"),
+    limit: int = Query(20, ge=1, le=500),
+):
+    rows = await asyncio.to_thread(database.resume_search, q, limit=limit, any_term=any_term)
+    return {"query": q, "count": len(rows), "items": [resume_model.summary(r) for r in rows]}
+
+@router.get("/store/{resume_id}")
+async def get_stored(resume_id: int):
+    row = await asyncio.to_thread(database.resume_get, resume_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No stored resume with id {resume_id}.")
+    record = resume_model.from_row(row)
+    return {**resume_model.summary(row), "text": record.text, "packed": record.packed, "anonymized": record.anonymized}
+
+@router.delete("/store/{resume_id}")
+async def delete_stored(resume_id: int):
+    removed = await asyncio.to_thread(database.resume_delete, resume_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"No stored resume with id {resume_id}.")
+    return {"status": "ok", "removed": resume_id}
+
+async def _select_stored(ids: str, q: str) -> list:
+    """Stored resume ids from an "ids" list and/or a keyword query; every stored resume if neither."""
+    try:
+        wanted = [int(x) for x in ids.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers.")
+    if q.strip():
+        # with ids, only those are searched, so a match never loses out to better-ranked others
+        limit = len(wanted) if wanted else max(1, await asyncio.to_thread(database.resume_count))
+        hits = await asyncio.to_thread(database.resume_search, q, limit=limit, ids=wanted or None)
+        matched = {r["id"] for r in hits}
+        wanted = [i for i in wanted if i in matched] if wanted else sorted(matched)
+    elif not wanted:
+        wanted = await asyncio.to_thread(database.resume_ids)
+    if not wanted:
+        raise HTTPException(status_code=404, detail="No stored resumes to score.")
+    return wanted
+
+@router.post("/store/score")
+async def score_stored(
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    ids: str = Form("", description="Comma-separated resume ids; empty scores every stored resume"),
+    q: str = Form("", description="Only resumes matching these keywords (see /store/search)"),
+    anonymize: bool = Form(False),
+    concurrency: int = Form(BATCH_CONCURRENCY),
+    mode: str = Form("llm"),
+    prescreen_threshold: int = Form(PRESCREEN_THRESHOLD),
+):
+    """
+    Re-score stored resumes against a new job description. Same NDJSON stream
+    as /batch; only inference is paid, nothing is uploaded or parsed. With
+    mode=requirements, re-scoring after a JD edit only judges the
+    requirements that are new or reworded.
+    """
+    _check_mode(mode)
+    wanted = await _select_stored(ids, q)
+    jobs = [(None, lambda rid=rid: _load_stored(rid)) for rid in wanted]
+    return StreamingResponse(
+        _batch_stream(
+            jobs, job_title=job_title, job_description=job_description, anonymize=anonymize,
+            concurrency=concurrency, mode=mode, threshold=prescreen_threshold,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+# ---------- Jobs ----------
+def _job_view(job: Job) -> dict:
     return {
-        "filename": file.filename,
+        **job.view(job_queue.position(job)),
+        "links": {"self": f"/resume/jobs/{job.id}", "events": f"/resume/jobs/{job.id}/events"},
+    }
+
+def _get_job(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id} (unknown or expired).")
+    return job
+
+@router.post("/jobs/score", status_code=status.HTTP_202_ACCEPTED)
+async def submit_score_job(
+    file: UploadFile,
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    anonymize: bool = Form(False),
+    prescreen_threshold: int = Form(PRESCREEN_THRESHOLD),
+    store: bool = Form(RESUME_STORE),
+    priority: str = Form("interactive", description="interactive or bulk"),
+    deadline_s: float = Form(0, description="Seconds the result is useful for; 0 = no deadline"),
+    mode: str = Form("llm", description="llm or requirements, as for /upload"),
+):
+    """
+    Queue a /upload scoring and return its job id at once. Poll
+    GET /jobs/{id} or subscribe to GET /jobs/{id}/events; the result is the
+    /upload payload. 429 with Retry-After when the queue is full.
+    """
+    _check_scoring(mode)
+    _admit("score", priority)
+    variant = _scoring_variant(mode, job_description)
+    text_for_scoring, screen, stored = await _prepare_upload(file, job_description, anonymize, store, variant)
+    skipped = _prescreen_skip(screen, prescreen_threshold)
+
+    async def run():
+        if skipped:
+            return _upload_payload(file.filename, job_title, stored, screen, anonymize, skipped, None, variant)
+        result, cache_src = await _score_resume(text_for_scoring, job_description, variant)
+        return _upload_payload(
+            file.filename, job_title, stored, screen, anonymize, _shape_explained(result), cache_src, variant
+        )
+
+    job = _submit("score", run, priority=priority, deadline_s=deadline_s, meta={"filename": file.filename})
+    return _job_view(job)
+
+@router.post("/jobs/compare", status_code=status.HTTP_202_ACCEPTED)
+async def submit_compare_job(
+    file: UploadFile,
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    speculative: bool = Form(COMPARE_SPECULATIVE),
+    priority: str = Form("interactive", description="interactive or bulk"),
+    deadline_s: float = Form(0, description="Seconds the result is useful for; 0 = no deadline"),
+):
+    """Queue a /compare bias check; same job protocol as /jobs/score."""
+    _admit("compare", priority)
+    text = await _read_resume_text(file, "Upload a PDF (or .txt).", MAX_CHARS_COMPARE)
+    text_small = _pack(text, "quick", job_description, NUM_CTX_COMPARE, MAX_CHARS_COMPARE)
+    text_anon = _anon(text_small)
+
+    async def run():
+        outcome = await _compare_pipeline(text_small, text_anon, job_description, speculative=speculative)
+        return _compare_payload(file.filename, job_title, outcome)
+
+    job = _submit("compare", run, priority=priority, deadline_s=deadline_s, meta={"filename": file.filename})
+    return _job_view(job)
+
+@router.get("/jobs")
+def job_queue_stats():
+    """Queue depth, running jobs and outcome counts."""
+    return job_queue.stats()
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return _job_view(_get_job(job_id))
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: `status` now, then `result` once the job has finished."""
+    job = _get_job(job_id)
+
+    async def events():
+        yield _sse("status", _job_view(job))
+        await job_queue.wait(job)
+        yield _sse("result", _job_view(job))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = _get_job(job_id)
+    if not job_queue.cancel(job):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already {job.status}.")
+    return {"status": "ok", "job_id": job_id}
+
+# ---------- Bias audit ----------
+async def _audit_load(resume_id: int) -> tuple:
+    """A stored resume's full text -> (text, filename); the anonymizer finds the name on its first line."""
+    row = await asyncio.to_thread(database.resume_get, resume_id)
+    if row is None:
+        raise ValueError(f"No stored resume with id {resume_id}.")
+    return row["text"], row["filename"]
+
+def _audit_pack(text: str, job_description: str) -> str:
+    # each variant packed like /compare packs a resume
+    return _pack(text, "quick", job_description, NUM_CTX_COMPARE, MAX_CHARS_COMPARE)
+
+async def _audit_score(text: str, job_description: str):
+    # bulk jobs, so an audit never holds up interactive requests
+    return await _run_bulk("audit", lambda: _score_quick(text, job_description))
+
+audits = AuditManager(load=_audit_load, pack=_audit_pack, score=_audit_score)
+
+async def _get_audit(audit_id: str):
+    audit = await audits.get(audit_id)
+    if audit is None:
+        raise HTTPException(status_code=404, detail=f"No audit {audit_id}.")
+    return audit
+
+@router.post("/audit", status_code=status.HTTP_202_ACCEPTED)
+async def start_audit(
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    ids: str = Form("", description="Comma-separated resume ids; empty audits every stored resume"),
+    q: str = Form("", description="Only resumes matching these keywords (see /store/search)"),
+    dimensions: str = Form(",".join(DIMENSIONS), description="Comma-separated: " + ", ".join(DIMENSIONS)),
+):
+    """
+    Counterfactual bias audit over stored resumes: each one is scored as is
+    (contact details redacted) and with its name, locations or years swapped,
+    and fully anonymized. Runs in the background as bulk jobs; follow
+    GET /audit/{id}/stream for per-candidate deltas and running statistics.
+    Submitting the same audit again rejoins it, or resumes it from its
+    checkpoint after a restart or a DELETE.
+    """
+    wanted_dims = [d.strip() for d in dimensions.split(",") if d.strip()]
+    unknown = [d for d in wanted_dims if d not in DIMENSIONS]
+    if unknown or not wanted_dims:
+        raise HTTPException(status_code=400, detail=f"dimensions must be among {', '.join(DIMENSIONS)}.")
+    params = {
         "job_title": job_title,
-        "original": {"score": s1, "summary": str(r_orig.get("summary", ""))[:300]},
-        "anonymized": {"score": s2, "summary": str(r_anon.get("summary", ""))[:300]},
-        "delta": delta,
-        "model": MODEL,
-        "model_compare": MODEL_COMPARE,
-        "note": "fallback_compare_used" if used_fallback else "two_call_compare",
-    } 
+        "job_description": job_description,
+        "resume_ids": await _select_stored(ids, q),
+        "dimensions": [d for d in DIMENSIONS if d in wanted_dims],
+        "model": MODEL_COMPARE,
+        "num_ctx": NUM_CTX_COMPARE,
+        "prompt_version": PROMPT_VERSION,
+    }
+    audit, resumed = await audits.start(params)
+    return {**audit.view(stats=False), "resumed": resumed}
+
+@router.get("/audit")
+async def list_audits():
+    rows = await asyncio.to_thread(database.audit_list)
+    return [
+        {"audit_id": r["id"], "status": audits.audits[r["id"]].status if r["id"] in audits.audits else r["status"],
+         "created_at": r["created_at"], "updated_at": r["updated_at"]}
+        for r in rows
+    ]
+
+@router.get("/audit/{audit_id}")
+async def get_audit(audit_id: str):
+    """Progress and the statistics over every candidate finished so far."""
+    audit = await _get_audit(audit_id)
+    return await asyncio.to_thread(audit.view)
+
+@router.get("/audit/{audit_id}/stream")
+async def audit_stream(audit_id: str):
+    """
+    NDJSON: a `meta` line, then one `candidate` (or `error`) line per resume
+    with its variant deltas, an `aggregate` line every AUDIT_AGGREGATE_EVERY
+    candidates, and a final `summary`. Checkpointed candidates are replayed first.
+    """
+    audit = await _get_audit(audit_id)
+
+    async def lines():
+        async for line in audit.follow():
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.delete("/audit/{audit_id}")
+async def cancel_audit(audit_id: str):
+    """Stop a running audit; its checkpoint is kept, so submitting it again resumes it."""
+    audit = await _get_audit(audit_id)
+    if not await audits.cancel(audit):
+        raise HTTPException(status_code=409, detail=f"Audit is {audit.status}.")
+    return audit.view(stats=False)
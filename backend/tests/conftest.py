@@ -0,0 +1,71 @@
+import time
+import socket
+import threading
+
+import pytest
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from backend import database
+from backend.benchmarks.fake_ollama import DEFAULT_LATENCY, create_app
+from backend.ollama_router import Node, router
+
+MODEL = "llama3.2:3b"
+# warm and quick fake nodes
+LATENCY = DEFAULT_LATENCY._replace(load=0, decode_tps=2000, prefill_tps=100000, jitter=0, parallel=4)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _broken_app() -> FastAPI:
+    """A node that dies after the first token."""
+    app = FastAPI()
+
+    @app.post("/api/generate")
+    async def generate():
+        async def chunks():
+            yield '{"model": "%s", "response": "{", "done": false}\n' % MODEL
+            raise RuntimeError("node crashed")
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+    return app
+
+@pytest.fixture(scope="session")
+def fake_urls():
+    """
+    Fake Ollama nodes serving MODEL: two plain, one padding JSON mode, one
+    that crashes mid-answer, one taking 3 s per answer.
+    """
+    apps = [create_app([MODEL], LATENCY), create_app([MODEL], LATENCY),
+            create_app([MODEL], LATENCY, json_padding=50), _broken_app(),
+            create_app([MODEL], LATENCY._replace(delay=3))]
+    servers = []
+    for app in apps:
+        config = uvicorn.Config(app, host="127.0.0.1", port=free_port(), log_level="critical")
+        server = uvicorn.Server(config)
+        threading.Thread(target=server.run, daemon=True).start()
+        servers.append(server)
+    while not all(s.started for s in servers):
+        time.sleep(0.01)
+    yield [f"http://127.0.0.1:{s.config.port}" for s in servers]
+    for s in servers:
+        s.should_exit = True
+
+@pytest.fixture
+def nodes(monkeypatch):
+    """Route to the given URLs only -> their Nodes."""
+    def use(*urls):
+        monkeypatch.setattr(router, "nodes", [Node(u) for u in urls])
+        return router.nodes
+    return use
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An empty SQLite database for the test."""
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "store.db"))
+    monkeypatch.setattr(database, "_conn", None)
+    yield database
+    if database._conn is not None:
+        database._conn.close()
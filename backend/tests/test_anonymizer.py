@@ -0,0 +1,52 @@
+from backend.anonymizer import Anonymizer, Rule, build_anonymizer, word_list_rule
+from backend.benchmarks.bench_anon import make_resume
+
+def _restore(text: str, spans) -> str:
+    """Undo a redaction from its span map alone."""
+    out, pos = [], 0
+    for s in spans:
+        out.append(text[pos:s.out_start] + s.original)
+        pos = s.out_end
+    return "".join(out) + text[pos:]
+
+def test_span_map_indexes_both_texts():
+    text = make_resume(8000)
+    red = build_anonymizer().redact(text)
+    assert red.spans and red.text != text
+    for s in red.spans:
+        assert text[s.start:s.end] == s.original
+        assert red.text[s.out_start:s.out_end] == s.replacement
+    assert [s.start for s in red.spans] == sorted(s.start for s in red.spans)
+    assert _restore(red.text, red.spans) == text
+
+def test_default_rules():
+    red = build_anonymizer().redact(
+        "Jane Doe\nMail jane.doe@example.com or +1 (555) 012-3456, since 2019 in Dubai.\n"
+        "See https://github.com/jdoe - worked with Maria Lopez in the UK, not Ukraine."
+    )
+    assert red.text == (
+        "Candidate\nMail [EMAIL] or [PHONE], since [YEAR] in [LOCATION].\n"
+        "See [PROFILE] - worked with Candidate in the [LOCATION], not Ukraine."
+    )
+    assert [s.rule for s in red.spans] == [
+        "first_line_name", "email", "phone", "year", "location", "profile", "name", "location"
+    ]
+
+def test_first_line_is_kept_unless_it_looks_like_a_name():
+    anon = build_anonymizer()
+    assert anon("Curriculum vitae 2024\nSkills").startswith("Curriculum vitae [YEAR]")
+    assert anon("Jean-Luc O'Neil\nSkills") == "Candidate\nSkills"
+
+def test_word_list_matches_whole_words_case_insensitively():
+    anon = Anonymizer([word_list_rule("city", ["New York", "york", "Bengaluru"], "[CITY]")], first_line_name=False)
+    assert anon("NEW YORK, york, Yorkshire and bengaluru") == "[CITY], [CITY], Yorkshire and [CITY]"
+
+def test_dictionary_names_win_over_the_generic_pattern(tmp_path):
+    names = tmp_path / "names.txt"
+    names.write_text("# places that look like names\nNew York\n")
+    red = build_anonymizer(name_dictionary=str(names), first_line_name=False).redact("Moved to New York")
+    assert [s.rule for s in red.spans] == ["name_dictionary"]
+
+def test_rules_only_fire_at_word_starts():
+    anon = Anonymizer([Rule("num", r"\d+", "#")], first_line_name=False)
+    assert anon("v2 has 30 users") == "v2 has # users"
@@ -0,0 +1,90 @@
+import asyncio
+
+from backend import audit
+from backend.audit import Audit, AuditManager, _holm, aggregate, delta_stats, sign_flip_p
+from backend.routes.resume import _audit_pack
+
+JD = "Senior DevOps Engineer. Requirements:\n- Kubernetes\n- Terraform"
+BODY = "\n".join([
+    "Summary", "Platform engineer with eight years of Kubernetes and Terraform work. " * 6,
+    "Skills", "Kubernetes, Terraform, Go, Python, AWS, Azure, Prometheus, Grafana. " * 6,
+    "Experience", "Acme Corp: senior DevOps engineer building CI/CD pipelines and clusters. " * 10,
+    "Education", "BSc Computer Science, 2008 - 2012",  # past what the compare prompt keeps
+])
+RESUME = "Jane Doe\nBerlin, Germany | jane@example.com | +49 170 1234567\n" + BODY
+
+def _audit_candidate(text):
+    prompts = []
+
+    async def score(packed, job_description):
+        prompts.append(packed)
+        return {"score": 70 + len(prompts)}, "miss"
+
+    async def load(resume_id):
+        return text, "cv.txt"
+
+    manager = AuditManager(load=load, pack=_audit_pack, score=score)
+    params = {"job_title": "DevOps", "job_description": JD, "resume_ids": [1],
+              "dimensions": ["name", "location", "year"], "model": "m"}
+
+    async def run():
+        return await manager._candidate(Audit("a", params, []), 0, 1)
+
+    return asyncio.run(run()), prompts
+
+def test_every_kept_variant_reaches_the_model_with_its_own_prompt():
+    line, prompts = _audit_candidate(RESUME)
+    kept = [v for v in line["variants"] if not v.get("dropped")]
+    assert {v["dimension"] for v in kept} == {"name", "location"}
+    assert len(kept) == 8 + 7  # Germany is the baseline's own location
+    assert len(prompts) == len(set(prompts)) == len(kept) + 1
+    assert any(p.startswith("Jane Doe\nBerlin, Germany") for p in prompts)  # the header survives packing
+
+def test_variants_lost_in_packing_are_dropped_not_zero():
+    line, _ = _audit_candidate(RESUME)
+    dropped = [v for v in line["variants"] if v.get("dropped")]
+    assert [v["dimension"] for v in dropped] == ["year"] * 3
+    assert all(v["delta"] is None for v in dropped)
+    assert "year" not in line["dimensions"]
+
+def test_sign_flip_p_is_exact_for_small_samples():
+    assert sign_flip_p([]) == sign_flip_p([0, 0]) == 1.0
+    assert sign_flip_p([1, 1, 1]) == 2 / 8          # only all + or all - reach |3|
+    assert sign_flip_p([3, 0, 3, 3, 3, 3]) == 2 / 32  # zeros carry no sign
+    assert sign_flip_p([2, -2, 1, -1]) == 1.0
+    assert sign_flip_p([4, 1, 1]) == sign_flip_p([-4, -1, -1]) == 2 / 8
+
+def test_normal_approximation_tracks_the_exact_test(monkeypatch):
+    deltas = [3, 5, -1, 2, 4, -2, 6, 1, 2, -3, 4, 2]
+    exact = sign_flip_p(deltas)
+    monkeypatch.setattr(audit, "EXACT_PERMUTATION_MAX", 0)
+    assert abs(sign_flip_p(deltas) - exact) < 0.01
+
+def test_holm_adjusts_step_down_and_skips_empty_rows():
+    rows = [{"n": 5, "p_value": p} for p in (0.01, 0.04, 0.03, 0.005)] + [{"n": 0}]
+    _holm(rows)
+    assert [r["p_adjusted"] for r in rows[:4]] == [0.03, 0.06, 0.06, 0.02]
+    assert [r["significant"] for r in rows[:4]] == [True, False, False, True]
+    assert "p_adjusted" not in rows[4]
+
+def test_delta_stats():
+    s = delta_stats([-12, -3, 0, 0, 2, 7])
+    assert (s["n"], s["mean"], s["median"], s["min"], s["max"], s["changed_share"]) == (6, -1.0, 0.0, -12, 7, 0.667)
+    assert s["ci95"][0] < s["mean"] < s["ci95"][1]
+    assert s["histogram"] == {"<=-10": 1, "-9..-5": 0, "-4..-1": 1, "0": 2, "1..4": 1, "5..9": 1, ">=10": 0}
+    assert delta_stats([4])["ci95"] is None and delta_stats([]) == {"n": 0}
+
+def test_aggregate_weighs_candidates_equally_and_counts_dropped_variants():
+    def candidate(name_deltas, dropped=0):
+        variants = [{"dimension": "name", "label": f"v{i}", "delta": d} for i, d in enumerate(name_deltas)]
+        variants += [{"dimension": "year", "label": "y", "delta": None, "dropped": "identical"}] * dropped
+        mean = sum(name_deltas) / len(name_deltas)
+        return {"dimensions": {"name": {"mean_delta": mean}}, "variants": variants}
+
+    out = aggregate([candidate([2, 2, 2, 2]), candidate([-2]), candidate([0], dropped=2)])
+    assert out["dimensions"]["name"]["mean"] == 0.0 and out["dimensions"]["name"]["n"] == 3
+    assert out["dropped"] == {"year": 2}
+    # per variant every candidate it applied to counts, largest mean shift first
+    assert [(v["label"], v["n"], v["mean"]) for v in out["variants"]] == [
+        ("v1", 1, 2.0), ("v2", 1, 2.0), ("v3", 1, 2.0), ("v0", 3, 0.0)
+    ]
@@ -0,0 +1,45 @@
+import io
+import zipfile
+import tempfile
+
+import pytest
+from fastapi import HTTPException
+
+from backend.extraction import discard
+from backend.routes import resume
+
+def _zip(members: dict) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+def _expand(fobj, name="cvs.zip"):
+    out, rejected = [], []
+    resume._expand_batch_item(name, "application/zip", fobj, out, rejected)
+    for _, _, spooled in out:
+        discard(spooled)
+    return [n for n, _, _ in out], rejected
+
+def test_bad_archive_and_members_are_rejected_one_by_one(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    assert _expand(io.BytesIO(b"PK\x03\x04 not a zip"), "bad.zip")[1][0][0] == "bad.zip"
+
+    raw = bytearray(_zip({"a.txt": "Kubernetes " * 50, "b.txt": "Terraform " * 50}).getvalue())
+    raw[raw.index(b"b.txt") + 5 + 10] ^= 0xFF  # damage b.txt's compressed data
+    names, rejected = _expand(io.BytesIO(bytes(raw)))
+    assert names == ["a.txt"] and [n for n, _ in rejected] == ["b.txt"]
+    assert not list(tmp_path.glob("resume-*"))  # the half-written spool is gone too
+
+    monkeypatch.setattr(resume, "BATCH_MAX_MEMBER_MB", 0)
+    names, rejected = _expand(_zip({"a.txt": "x", "notes.md": "y"}))
+    assert names == [] and "larger than" in rejected[0][1]
+
+def test_too_many_members_refused_before_extracting(monkeypatch):
+    monkeypatch.setattr(resume, "BATCH_MAX_FILES", 2)
+    out = []
+    with pytest.raises(HTTPException) as e:
+        resume._expand_batch_item("cvs.zip", "application/zip", _zip({f"{i}.txt": "x" for i in range(3)}), out, [])
+    assert e.value.status_code == 413 and out == []
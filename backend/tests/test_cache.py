@@ -0,0 +1,98 @@
+import asyncio
+
+from backend import cache
+from backend.cache import ScoreCache, cache_key
+
+def test_key_covers_context_and_texts_but_no_output_budget(monkeypatch):
+    seen = []
+    monkeypatch.setattr(cache, "make_key", lambda **material: seen.append(material) or "key")
+    cache_key("quick", model="m", num_ctx=1024, resume_text="cv", job_description="jd")
+    assert "num_predict" not in seen[0]["options"] and seen[0]["options"]["num_ctx"] == 1024
+    monkeypatch.undo()
+    key = cache_key("quick", model="m", num_ctx=1024, resume_text="cv", job_description="jd")
+    assert key == cache_key("quick", model="m", num_ctx=1024, resume_text="cv  ", job_description="jd")
+    assert key != cache_key("quick", model="m", num_ctx=2048, resume_text="cv", job_description="jd")
+
+def test_invalidate_clears_both_tiers(db):
+    async def scenario():
+        c = ScoreCache(10, 60, persist=True)
+        await c.store("k1", {"score": 1}, model="a", variant="quick")
+        await c.store("k2", {"score": 2}, model="b", variant="quick")
+        removed = await c.invalidate(model="a")
+        c._mem.clear()  # a fresh process: only the SQLite tier is left
+        return removed, await c.peek("k1", model="a"), await c.peek("k2", model="b")
+
+    removed, gone, kept = asyncio.run(scenario())
+    assert removed == 1 and gone == (None, None) and kept == ({"score": 2}, "disk")
+
+def test_identical_requests_share_one_generation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"score": 7, "summary": "ok"}
+
+    async def scenario():
+        c = ScoreCache(10, 60, persist=False)
+        first = await asyncio.gather(*(c.get_or_compute("k", compute, model="m", variant="quick") for _ in range(3)))
+        return first, await c.get_or_compute("k", compute, model="m", variant="quick"), c.stats()
+
+    first, again, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(source for _, source in first) == ["miss", "shared", "shared"]
+    assert again == ({"score": 7, "summary": "ok"}, "memory")
+    assert (stats["misses"], stats["shared"], stats["memory_hits"], stats["inflight"]) == (1, 2, 1, 0)
+
+def test_generation_is_cancelled_when_the_last_caller_leaves():
+    started, cancelled = asyncio.Event(), []
+
+    async def compute():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        c = ScoreCache(10, 60, persist=False)
+        callers = [asyncio.ensure_future(c.get_or_compute("k", compute, model="m", variant="quick")) for _ in range(2)]
+        await started.wait()
+        callers[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled  # the other caller still wants it
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return c.stats()["inflight"]
+
+    assert asyncio.run(scenario()) == 0
+    assert cancelled == [1]
+
+def test_ttl_expiry_and_lru_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+
+    async def scenario():
+        c = ScoreCache(2, 60, persist=False)
+        for k in ("a", "b"):
+            await c.store(k, {"score": 1}, model="m", variant="quick")
+        await c.peek("a", model="m")  # a is now the most recently used
+        await c.store("c", {"score": 1}, model="m", variant="quick")
+        kept = [k for k in ("a", "b", "c") if (await c.peek(k, model="m"))[0] is not None]
+        now[0] += 61
+        expired = await c.peek("a", model="m")
+        return kept, expired, c.stats()
+
+    kept, expired, stats = asyncio.run(scenario())
+    assert kept == ["a", "c"] and stats["evictions"] == 1
+    assert expired == (None, None) and stats["memory_entries"] == 1
+
+def test_parser_fallbacks_are_not_cached():
+    async def scenario():
+        c = ScoreCache(10, 60, persist=False)
+        await c.store("k", {"score": 0, "summary": "Unable to parse model output."}, model="m", variant="quick")
+        return await c.peek("k", model="m")
+
+    assert asyncio.run(scenario()) == (None, None)
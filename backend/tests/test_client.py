@@ -0,0 +1,61 @@
+import time
+import asyncio
+
+import pytest
+
+from backend import ollama_client as oc
+from backend.residency import residency
+from backend.tests.conftest import MODEL, free_port
+
+def test_warmup_waits_until_the_model_is_resident(fake_urls, nodes):
+    node, = nodes(fake_urls[1])
+
+    async def scenario():
+        try:
+            return await oc.warmup_async(MODEL)
+        finally:
+            await residency.stop()
+
+    assert asyncio.run(scenario()) == "resident"
+    assert MODEL in node.resident
+
+def test_warmup_reports_a_node_that_cannot_load(nodes):
+    nodes(f"http://127.0.0.1:{free_port()}")
+
+    async def scenario():
+        try:
+            return await oc.warmup_async(MODEL)
+        finally:
+            await residency.stop()
+
+    assert asyncio.run(scenario()).startswith("error: load: ConnectError")
+
+def test_per_model_limits_override_the_default(monkeypatch):
+    monkeypatch.setattr(oc, "OLLAMA_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(oc, "OLLAMA_MODEL_CONCURRENCY", {"big:70b": 1})
+    assert (oc._limit_for("big:70b"), oc._limit_for(MODEL)) == (1, 2)
+
+def test_slot_wait_counts_against_the_deadline_and_cancel_frees_everything(fake_urls, nodes, monkeypatch):
+    monkeypatch.setattr(oc, "OLLAMA_MAX_CONCURRENCY", 1)
+    slow, = nodes(fake_urls[4])
+
+    async def scenario():
+        try:
+            holder = asyncio.ensure_future(oc._apost("Rate resume A", model=MODEL, timeout=30, num_ctx=512,
+                                                     num_predict=50))
+            await asyncio.sleep(0.1)
+            assert slow.outstanding == 1
+            started = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await oc._apost("Rate resume B", model=MODEL, timeout=0.3, num_ctx=512, num_predict=50)
+            waited = time.monotonic() - started
+            holder.cancel()  # e.g. the HTTP client went away
+            with pytest.raises(asyncio.CancelledError):
+                await holder
+            return waited, oc._async_slot(MODEL)._value
+        finally:
+            await oc.aclose_client()
+
+    waited, free = asyncio.run(scenario())
+    assert 0.3 <= waited < 1
+    assert free == 1 and slow.outstanding == 0 and slow.failures == 0
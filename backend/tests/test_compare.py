@@ -0,0 +1,68 @@
+import time
+import asyncio
+
+import pytest
+
+from backend.routes import resume
+
+def _quick(score, confidence=None, summary="ok"):
+    return {"score": score, "summary": summary, "score_confidence": confidence}
+
+@pytest.mark.parametrize("orig, anon, expected", [
+    (_quick(0, summary="Unable to parse model output"), _quick(70), (True, "parse_failure")),
+    (_quick(0), _quick(0), (True, "both_zero")),
+    (_quick(70, 0.9), _quick(70, 0.8), (False, "confident_scores")),
+    (_quick(70, 0.9), _quick(60, 0.2), (True, "low_confidence")),
+    (_quick(70), _quick(70), (True, "tie_without_confidence")),
+    (_quick(70), _quick(64), (False, "distinct_scores")),
+])
+def test_fallback_decision(orig, anon, expected):
+    assert resume._needs_fallback(orig, anon) == expected
+
+def _scripted(monkeypatch, quick, compare, delay=0.1):
+    started = []
+
+    async def score_quick(text, jd):
+        started.append(text)
+        await asyncio.sleep(delay)
+        return quick[text], "miss"
+
+    async def score_compare(text_small, text_anon, jd):
+        started.append("compare")
+        await asyncio.sleep(1.5 * delay)  # one longer call with both resumes
+        return compare, "miss"
+
+    monkeypatch.setattr(resume, "_score_quick", score_quick)
+    monkeypatch.setattr(resume, "_score_compare", score_compare)
+    return started
+
+COMPARED = {"original": {"score": 80, "summary": "a"}, "anonymized": {"score": 72, "summary": "b"}}
+
+def _run(speculative):
+    t = time.perf_counter()
+    out = asyncio.run(resume._compare_pipeline("orig", "anon", "JD", speculative=speculative))
+    return out, time.perf_counter() - t
+
+def test_quick_scores_run_at_once_and_distinct_scores_stand(monkeypatch):
+    started = _scripted(monkeypatch, {"orig": _quick(70), "anon": _quick(64)}, COMPARED)
+    out, elapsed = _run(speculative=True)
+    assert (out["delta"], out["note"]) == (6, "two_call_compare")
+    assert out["decision"]["path"] == ["quick_parallel", "speculative_fallback", "distinct_scores", "fallback_cancelled"]
+    assert elapsed < 0.18 and sorted(started) == ["anon", "compare", "orig"]
+
+def test_inconclusive_tie_joins_the_speculative_fallback(monkeypatch):
+    started = _scripted(monkeypatch, {"orig": _quick(70), "anon": _quick(70)}, COMPARED)
+    out, elapsed = _run(speculative=True)
+    assert (out["original"]["score"], out["anonymized"]["score"], out["delta"]) == (80, 72, 8)
+    assert out["note"] == "fallback_compare_used" and started.count("compare") == 1
+    assert elapsed < 0.24  # the fallback ran alongside the quick scores
+
+def test_fallback_starts_late_without_speculation_and_is_rejected_if_no_better(monkeypatch):
+    tie = {"original": {"score": 70}, "anonymized": {"score": 70}}
+    _scripted(monkeypatch, {"orig": _quick(0), "anon": _quick(0)}, {"original": {"score": 0}, "anonymized": {"score": 0}})
+    out, elapsed = _run(speculative=False)
+    assert out["decision"]["path"] == ["quick_parallel", "both_zero", "fallback_started", "fallback_rejected"]
+    assert out["note"] == "two_call_compare" and elapsed >= 0.25
+    _scripted(monkeypatch, {"orig": _quick(70), "anon": _quick(70)}, tie)
+    out, _ = _run(speculative=False)
+    assert out["decision"]["path"][-1] == "fallback_adopted" and out["delta"] == 0
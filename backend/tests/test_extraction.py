@@ -0,0 +1,74 @@
+import io
+import random
+import asyncio
+
+import fitz
+
+from backend import extraction
+from backend.extraction import extract_pages, extract_pdf, spool
+from backend.prompt_packer import SECTION_WINDOW, pack_resume
+
+class _Page:
+    def __init__(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+class _Doc(list):
+    page_count = property(len)
+
+def _resume_pages(seed: int) -> list:
+    rng = random.Random(seed)
+    words = "python go kubernetes led team built api data pipeline shipped on call 2019 - 2023 , .".split()
+    body = lambda n: " ".join(rng.choice(words) for _ in range(n)) + "\n"
+    sections = ["Summary\n" + body(300), "Skills\n" + body(300), "Experience\n" + body(700),
+                "Education\n" + body(200), "Projects\n" + body(400)]
+    rng.shuffle(sections)
+    text = "Jane Doe\nBerlin\n" + "".join(sections)
+    cuts = sorted(rng.sample(range(1, len(text)), 8))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+def test_early_stop_never_changes_the_packed_prefix():
+    stopped = 0
+    for seed in range(40):
+        pages = _resume_pages(seed)
+        for budget in (SECTION_WINDOW // 2, SECTION_WINDOW, 3 * SECTION_WINDOW):
+            partial, complete = extract_pages(_Doc(map(_Page, pages)), budget)
+            full = "\n".join(pages)
+            assert pack_resume(partial, max_chars=budget) == pack_resume(full, max_chars=budget), (seed, budget)
+            stopped += not complete
+    assert stopped  # the workload exercises early stops at all
+
+def _pdf(*pages) -> io.BytesIO:
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    out = io.BytesIO(doc.tobytes())
+    doc.close()
+    return out
+
+def test_identical_uploads_are_parsed_once(monkeypatch):
+    monkeypatch.setattr(extraction, "EXTRACT_WORKERS", 0)  # parse in a thread; no process pool in tests
+    monkeypatch.setattr(extraction, "_cache", type(extraction._cache)())
+    parsed = []
+    parse = extraction._extract_pdf_path
+    monkeypatch.setattr(extraction, "_extract_pdf_path", lambda *a: parsed.append(a[1]) or parse(*a))
+
+    async def scenario():
+        pdf = _pdf("Summary: backend engineer", "Skills: Go, Python")
+        whole = await extract_pdf(await asyncio.to_thread(spool, pdf))
+        again = await extract_pdf(await asyncio.to_thread(spool, pdf), char_budget=100)
+        return whole, again
+
+    whole, again = asyncio.run(scenario())
+    assert "backend engineer" in whole and "Go, Python" in whole
+    assert again == whole and parsed == [None]
+
+def test_early_stopped_parse_is_not_served_to_a_larger_budget(monkeypatch):
+    monkeypatch.setattr(extraction, "_cache", type(extraction._cache)())
+    extraction._cache_put("d", "short", 100)
+    assert extraction._cache_get("d", 50) == "short"
+    assert extraction._cache_get("d", 200) is None and extraction._cache_get("d", None) is None
+    extraction._cache_put("d", "short and long", None)
+    assert extraction._cache_get("d", None) == "short and long"
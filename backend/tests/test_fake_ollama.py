@@ -0,0 +1,67 @@
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from backend.benchmarks import bench_load
+from backend.benchmarks.fake_ollama import create_app
+from backend.tests.conftest import LATENCY, MODEL
+
+def _client(**kw):
+    return TestClient(create_app([MODEL], LATENCY._replace(load=0.05), **kw))
+
+def _generate(client, prompt, **body):
+    r = client.post("/api/generate", json={"model": MODEL, "prompt": prompt, **body})
+    return r.status_code, r.json()
+
+def test_answers_are_deterministic_and_the_kv_prefix_is_reused():
+    a, b = _client(), _client()
+    _, first = _generate(a, "JOB: devops\nRESUME: one")
+    _, again = _generate(b, "JOB: devops\nRESUME: one")
+    assert first["response"] == again["response"] and json.loads(first["response"])["score"]
+    assert first["load_duration"] > 0.04e9  # cold
+    _, warm = _generate(a, "JOB: devops\nRESUME: two")
+    assert warm["load_duration"] < 0.01e9 and warm["prompt_eval_count"] < first["prompt_eval_count"]
+    assert {m["name"] for m in a.get("/api/ps").json()["models"]} == {MODEL}
+
+def test_length_cutoff_padding_and_unknown_models():
+    client = _client(json_padding=30)
+    _, cut = _generate(client, "RESUME: x", options={"num_predict": 5})
+    assert cut["done_reason"] == "length" and cut["eval_count"] == 5
+    _, padded = _generate(client, "RESUME: x", format="json")
+    assert padded["response"].endswith(" " * 30) and json.loads(padded["response"])
+    assert client.post("/api/generate", json={"model": "nope", "prompt": "x"}).status_code == 404
+
+def test_streamed_answer_matches_the_whole_one():
+    client = _client()
+    _, whole = _generate(client, "RESUME: s")
+    lines = [json.loads(l) for l in client.post(
+        "/api/generate", json={"model": MODEL, "prompt": "RESUME: s", "stream": True}).text.splitlines()]
+    assert "".join(l["response"] for l in lines) == whole["response"] and lines[-1]["done"]
+
+def test_injected_failures_follow_the_seed():
+    statuses = [[_generate(client, f"RESUME: {i}")[0] for i in range(20)]
+                for client in (_client(fail_rate=0.5, seed=s) for s in (1, 1, 2))]
+    assert statuses[0] == statuses[1] != statuses[2] and {500, 200} == set(statuses[0])
+
+def test_percentiles_and_regressions():
+    assert [bench_load.percentile(list(range(1, 101)), p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert bench_load.percentile([], 50) is None
+    level = lambda rps, p95, errors=0: {"concurrency": 4, "rps": rps, "errors": errors,
+                                        "endpoints": {"upload": {"p95_ms": p95}}}
+    baseline = {"levels": [level(10.0, 100.0)]}
+    assert bench_load.regressions({"levels": [level(9.5, 105.0)]}, baseline, 0.1) == []
+    assert len(bench_load.regressions({"levels": [level(8.0, 120.0, errors=1)]}, baseline, 0.1)) == 3
+
+def test_lag_summary_counts_only_samples_between_scrapes():
+    before = {"buckets": {"0.01": 10, "0.1": 10}, "sum": 0.05, "count": 10}
+    after = {"buckets": {"0.01": 10, "0.1": 110}, "sum": 5.05, "count": 110}
+    assert bench_load.lag_summary(before, after) == {"lag_mean_ms": 50.0, "lag_p99_ms": 100.0}
+    assert bench_load.lag_summary({}, after)["lag_mean_ms"] is None
+
+def test_synthetic_request_stream_is_reproducible():
+    args = SimpleNamespace(corpus=None, pdfs=None, mix="upload=3,compare=1", seed=3)
+    take = lambda: [next(s) for s in [bench_load.request_stream(args)] for _ in range(8)]
+    first = take()
+    assert first == take()
+    assert [r["endpoint"] for r in first[:4]] == ["upload", "upload", "upload", "compare"]
@@ -0,0 +1,31 @@
+from backend.jd import MAX_REQUIREMENTS, prepare_jd
+
+JD = """Senior DevOps Engineer
+
+About us: We are a fintech scale-up in Berlin.
+Requirements:
+- 5+ years with Kubernetes and Terraform
+- Go or Python; CI/CD pipelines (GitHub Actions)
+We offer a hybrid role, a learning budget and a friendly team.
+"""
+
+def test_block_lists_requirements_and_keeps_the_description():
+    block = prepare_jd(JD).block
+    listed, _, description = block.partition("\n\nJOB DESCRIPTION:\n")
+    assert listed.splitlines() == [
+        "JOB REQUIREMENTS:",
+        "- 5+ years with Kubernetes and Terraform",
+        "- Go or Python",
+        "- CI/CD pipelines (GitHub Actions)",
+    ]
+    assert description.startswith("Senior DevOps Engineer")
+
+def test_requirements_past_the_cap_are_noted():
+    prepared = prepare_jd("Skills: " + ", ".join(f"skill{i}" for i in range(MAX_REQUIREMENTS + 5)))
+    assert len(prepared.requirements) == MAX_REQUIREMENTS
+    assert prepared.dropped == 5
+    assert "(5 more requirements are only in the description below)" in prepared.block
+
+def test_prose_jd_is_embedded_as_is():
+    prepared = prepare_jd("We need someone who enjoys running Kubernetes in production")
+    assert prepared.block == "JOB DESCRIPTION:\nWe need someone who enjoys running Kubernetes in production"
@@ -0,0 +1,58 @@
+import time
+import asyncio
+
+import pytest
+
+from backend.jobs import Job, JobQueue, QueueFull
+
+async def _idle():
+    await asyncio.sleep(10)
+
+def test_bulk_backlog_does_not_reject_interactive():
+    async def scenario():
+        q = JobQueue(1, 10, 600)
+        q.submit(Job("hold", _idle, priority="interactive"))
+        await asyncio.sleep(0)  # the only worker takes it
+        for _ in range(10):
+            q.submit(Job("batch", _idle, priority="bulk"))
+        with pytest.raises(QueueFull):
+            q.submit(Job("batch", _idle, priority="bulk"))
+        job = q.submit(Job("score", _idle, priority="interactive"))
+        assert q.position(job) == 0  # and ahead of every bulk job
+        await q.stop()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+def test_interactive_cap_still_applies():
+    async def scenario():
+        q = JobQueue(1, 2, 600)
+        q.submit(Job("hold", _idle, priority="interactive"))
+        await asyncio.sleep(0)
+        q.submit(Job("score", _idle, priority="interactive"))
+        q.submit(Job("score", _idle, priority="interactive"))
+        with pytest.raises(QueueFull) as e:
+            q.admit("score", "interactive")
+        assert e.value.retry_after >= 1
+        assert q.stats()["rejected"] == 1
+        await q.stop()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+def test_timeout_inside_a_job_without_deadline_is_a_failure():
+    async def slow_ollama():
+        raise asyncio.TimeoutError("Ollama read timed out")
+
+    async def scenario():
+        q = JobQueue(1, 10, 600)
+        inner = q.submit(Job("score", slow_ollama, priority="interactive"))
+        late = q.submit(Job("score", _idle, priority="interactive", deadline=time.monotonic() + 0.05))
+        await q.wait(inner)
+        await q.wait(late)
+        await q.stop()
+        return inner, late
+
+    inner, late = asyncio.run(scenario())
+    assert (inner.status, inner.error) == ("failed", "Ollama read timed out")
+    assert late.status == "expired"
@@ -0,0 +1,41 @@
+import asyncio
+
+from backend import ollama_client as oc
+from backend.json_stream import TopLevelJSONScanner
+from backend.tests.conftest import MODEL
+
+def _feed(chunks):
+    scanner = TopLevelJSONScanner()
+    return scanner, [[m for m in scanner.feed(c)] for c in chunks]
+
+def test_members_come_out_as_soon_as_they_close():
+    scanner, out = _feed(['```json\n{"sco', 're": 8', '5, "summary": "Go, ', 'Rust", "risks": [', '"a, b"]}', ' trailing'])
+    assert out == [[], [], [("score", 85)], [("summary", "Go, Rust")], [("risks", ["a, b"])], []]
+    assert scanner.closed
+
+def test_nested_commas_and_escaped_quotes_do_not_split_members():
+    scanner, out = _feed(['{"evidence": [{"requirement": "C, C++", "match": "said \\"yes\\", twice"}], "score": 3}'])
+    assert out == [[("evidence", [{"requirement": "C, C++", "match": 'said "yes", twice'}]), ("score", 3)]]
+
+def test_malformed_member_is_skipped_not_fatal():
+    _, out = _feed(['{"score": 8x, "summary": "ok"}'])
+    assert out == [[("summary", "ok")]]
+
+def test_nothing_after_the_object_is_scanned():
+    scanner, out = _feed(['{"score": 1}', '{"score": 2}'])
+    assert out == [[("score", 1)], []] and scanner.text == '{"score": 1}'
+
+def test_fields_stream_before_done(fake_urls, nodes):
+    nodes(fake_urls[0])
+
+    async def scenario():
+        try:
+            return [event async for event in oc._stream_fields("explained", "Rate this resume", model=MODEL,
+                                                              timeout=30, num_ctx=1024)]
+        finally:
+            await oc.aclose_client()
+
+    events = asyncio.run(scenario())
+    fields = [e[1] for e in events if e[0] == "field"]
+    assert events[-1][0] == "done" and [e[0] for e in events].count("done") == 1
+    assert "score" in fields and set(fields) <= set(events[-1][1])
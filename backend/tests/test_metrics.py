@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+
+from backend import main, metrics
+from backend.metrics import Counter, Histogram
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "Test.", ("stage",), buckets=(0.1, 1))
+    for v in (0.05, 0.5, 5):
+        h.observe("pack", value=v)
+    assert h.render()[2:] == [
+        't_seconds_bucket{stage="pack",le="0.1"} 1',
+        't_seconds_bucket{stage="pack",le="1"} 2',
+        't_seconds_bucket{stage="pack",le="+Inf"} 3',
+        't_seconds_sum{stage="pack"} 5.550000',
+        't_seconds_count{stage="pack"} 3',
+    ]
+
+def test_label_values_are_escaped():
+    c = Counter("t_total", "Test.", ("model",))
+    c.inc('a"b\\c', amount=2)
+    assert c.render()[-1] == 't_total{model="a\\"b\\\\c"} 2'
+
+def test_generation_stages_are_recorded_for_the_request():
+    token = metrics._timings.set({})
+    try:
+        metrics.observe_queue("m", 0.25)
+        metrics.observe_generation("m", {"load_duration": 0, "prompt_eval_count": 100, "prompt_eval_duration": 5e8,
+                                         "eval_count": 50, "eval_duration": 1e9}, 1.6)
+        with metrics.stage("pack"):
+            pass
+        timings = metrics._timings.get()
+    finally:
+        metrics._timings.reset(token)
+    assert {k: round(v, 3) for k, v in timings.items() if k != "pack"} == {
+        "queue": 0.25, "ollama": 1.6, "load": 0.0, "prefill": 0.5, "decode": 1.0
+    }
+    header = metrics._server_timing(timings, 2.0).decode()
+    assert header.startswith("queue;dur=250.0, ollama;dur=1600.0, load;dur=0.0, prefill;dur=500.0, decode;dur=1000.0")
+    assert header.endswith("total;dur=2000.0")
+    assert 'ollama_tokens_per_second_count{model="m",phase="decode"}' in metrics.render()
+
+def test_nothing_is_recorded_outside_a_request():
+    metrics.observe_queue("m", 0.1)
+    assert metrics._timings.get() is None
+
+def test_metrics_endpoint_reports_routes_by_template(monkeypatch):
+    monkeypatch.setattr(main, "AUTO_WARMUP", "0")
+    monkeypatch.setattr(metrics, "METRICS_SERVER_TIMING", False)
+    with TestClient(main.app) as client:
+        assert "server-timing" not in client.get("/metrics").headers
+        body = client.get("/metrics").text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/metrics",status="200"}' in body
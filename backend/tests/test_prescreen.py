@@ -0,0 +1,45 @@
+from backend.prescreen import bm25_scores, document_terms, prescreen, skills_in
+from backend.routes.resume import _prescreen_skip
+
+JD = """Senior Platform Engineer
+Requirements:
+- 3+ years of Kubernetes and Terraform
+- Python or Go
+- Strong incident response and postmortem culture
+Nice to have:
+- Kafka
+"""
+
+def test_aliases_map_to_one_skill_and_symbols_end_tokens():
+    assert skills_in("K8s, EKS, golang, C++, C#, .NET and CI/CD") == {
+        "kubernetes", "go", "c++", "c#", ".net", "ci/cd"
+    }
+    assert skills_in("Django-based; rustic; javascripts; cppcheck") == {"django"}
+
+def test_coverage_weighs_nice_to_haves_half():
+    full = prescreen("Kubernetes, Terraform, Python, Go; built an incident response and postmortem culture. Kafka.", JD)
+    assert (full.score, full.covered, full.total, full.missing) == (100, 4, 4, [])
+    assert full.matched == ["go", "kafka", "kubernetes", "python", "terraform"]
+
+    no_kafka = prescreen("Kubernetes, Terraform, Python, Go; built an incident response and postmortem culture.", JD)
+    assert no_kafka.score == round(100 * 3 / 3.5) and no_kafka.missing == ["Kafka"]
+
+    half = prescreen("Kubernetes only.", JD)
+    assert half.covered == 1 and half.score == round(100 * 0.5 / 3.5)
+
+def test_threshold_skips_only_low_scores():
+    screen = prescreen("Kubernetes only.", JD)
+    assert _prescreen_skip(screen, 0) is None
+    assert _prescreen_skip(screen, screen.score) is None
+    skipped = _prescreen_skip(screen, screen.score + 1)
+    assert skipped["relevance_score"] is None and skipped["note"] == "prescreen_skipped"
+
+def test_bm25_ranks_the_matching_resume_first():
+    docs = [document_terms(t) for t in (
+        "Barista and florist, latte art.",
+        "Kubernetes and Terraform platform work; Go services; incident response lead.",
+        "Python scripting; some Kubernetes.",
+    )]
+    scores = bm25_scores(JD, docs)
+    assert scores[1] > scores[2] > scores[0] == 0
+    assert bm25_scores(JD, []) == []
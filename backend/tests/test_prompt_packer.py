@@ -0,0 +1,58 @@
+import pytest
+
+from backend import ollama_client as oc
+from backend.benchmarks.bench_anon import make_resume
+from backend.prompt_packer import SECTION_WINDOW, TRUNCATION_MARK, estimate_tokens, pack_resume, truncate_tokens
+
+RESUME = (
+    "Jane Doe\nBerlin, Germany\njane@example.com\n"
+    "Education\nBSc Computer Science, 2015\n"
+    "Experience\nSRE at Acme, 2016-2023: ran Kubernetes on AWS.\n"
+    "Skills\nGo, Python, Terraform\n"
+    "Summary\nPlatform engineer.\n"
+)
+
+def test_estimate_counts_words_digits_and_symbols():
+    assert estimate_tokens("Kubernetes") == 3      # 10 letters, 4 per token
+    assert estimate_tokens("2019") == 2            # 4 digits, 3 per token
+    assert estimate_tokens("C++ / CI-CD") == 7     # every symbol is a token
+    assert estimate_tokens("Zürich") == 3          # a non-ASCII letter is a token of its own
+    assert estimate_tokens("") == estimate_tokens(None) == 0
+
+def test_truncate_fits_the_budget_and_marks_the_cut():
+    text = make_resume(4000)
+    for budget in (50, 200, 700):
+        cut = truncate_tokens(text, budget)
+        assert estimate_tokens(cut) <= budget
+        assert cut.endswith(TRUNCATION_MARK) and text.startswith(cut[: -len(TRUNCATION_MARK)])
+    assert truncate_tokens(text, 2) == ""
+    assert truncate_tokens("short", 10) == "short"
+
+def test_sections_follow_the_header_and_nothing_is_repeated():
+    filler = lambda tag: f" {tag} detail" * (SECTION_WINDOW // 10)
+    text = "Jane Doe\nBerlin\n" + "".join(
+        f"\n{name}\n{filler(name.lower())}" for name in ("Education", "Experience", "Hobbies", "Skills", "Summary")
+    )
+    packed = pack_resume(text)
+    order = [packed.index(s) for s in ("Jane Doe", "experience detail", "skills detail", "summary detail",
+                                       "education detail", "hobbies detail")]
+    assert order == sorted(order)
+    assert sorted("".join(packed.split())) == sorted("".join(text.split()))  # windows may end mid-word
+
+@pytest.mark.parametrize("max_tokens, max_chars", [(40, None), (None, 120), (60, 120), (1000, 120)])
+def test_pack_respects_both_limits(max_tokens, max_chars):
+    packed = pack_resume(RESUME * 5, max_tokens=max_tokens, max_chars=max_chars)
+    assert packed.endswith(TRUNCATION_MARK)
+    if max_tokens is not None:
+        assert estimate_tokens(packed) <= max_tokens
+    if max_chars is not None:
+        assert len(packed) <= max_chars + len(TRUNCATION_MARK)
+
+@pytest.mark.parametrize("variant", ["explained", "quick", "compare"])
+@pytest.mark.parametrize("num_ctx", [1024, 2048, 4096])
+def test_fitted_prompt_leaves_room_for_the_answer(variant, num_ctx):
+    jd = "Requirements:\n" + "".join(f"- {make_resume(150, seed=i)}\n" for i in range(60))
+    resumes = [make_resume(20000, seed=1), make_resume(20000, seed=2)][: 2 if variant == "compare" else 1]
+    prompt = oc._fit_prompt(variant, num_ctx=num_ctx, job_description=jd, resumes=resumes)
+    used = estimate_tokens(oc.SYSTEM) + estimate_tokens(prompt) + oc.NUM_PREDICT[variant]
+    assert num_ctx - oc.CTX_RESERVE <= used + 40 and used <= num_ctx  # filled, not overflowing
@@ -0,0 +1,61 @@
+import asyncio
+
+from backend import requirement_scoring as rs
+from backend.cache import ScoreCache
+from backend.requirement_scoring import Requirement, aggregate, split_requirements
+
+JD = """Senior DevOps Engineer
+
+About us: We are a fintech scale-up in Berlin with 200 engineers.
+
+Requirements:
+- 5+ years running Kubernetes in production
+- Terraform, Helm; CI/CD pipelines (GitHub Actions)
+- Go or Python
+
+Nice to have:
+- AWS certification
+- On-call experience
+
+We offer a hybrid role, a learning budget and a friendly team.
+Benefits: 30 days of holiday, private health insurance
+"""
+
+def test_realistic_jd_splits_into_candidate_requirements_only():
+    assert split_requirements(JD) == [
+        Requirement("5+ years running Kubernetes in production", False),
+        Requirement("Terraform", False),
+        Requirement("Helm", False),
+        Requirement("CI/CD pipelines (GitHub Actions)", False),
+        Requirement("Go or Python", False),
+        Requirement("AWS certification", True),
+        Requirement("On-call experience", True),
+    ]
+
+def test_title_and_benefits_do_not_lower_the_score():
+    requirements = split_requirements(JD)
+    verdicts = {r.text: {"met": "yes", "match": "x"} for r in requirements}
+    result = aggregate(requirements, verdicts)
+    assert result["score"] == 100
+    assert result["risks"] == []
+
+def test_concurrent_requests_judge_each_requirement_once(monkeypatch):
+    judged = []
+
+    async def fake_matches(*, resume_text, requirements, **kw):
+        judged.extend(requirements)
+        await asyncio.sleep(0.05)
+        return [{"met": "yes", "match": "cv"} for _ in requirements]
+
+    cache = ScoreCache(100, 60, persist=False)
+    monkeypatch.setattr(rs, "score_cache", cache)
+    monkeypatch.setattr(rs, "generate_requirement_matches_async", fake_matches)
+
+    async def scenario():
+        one = lambda: rs.score_by_requirements(resume_text="cv", job_description=JD, model="m", num_ctx=1024)
+        return await asyncio.gather(one(), one())
+
+    (first, src1), (second, src2) = asyncio.run(scenario())
+    assert sorted(judged) == sorted(r.text for r in split_requirements(JD))
+    assert (src1, src2) == ("miss", "shared") and first["score"] == second["score"] == 100
+    assert (cache.stats()["misses"], cache.stats()["shared"]) == (7, 7)
@@ -0,0 +1,31 @@
+import asyncio
+import time
+
+from backend import residency as res
+from backend.ollama_router import Node, router
+
+def test_budget_keeps_preloaded_and_loading_models(monkeypatch):
+    node = Node("http://node")
+    gb = 2**30
+    node.sizes = {"old:latest": gb, "compare:latest": gb, "coming:latest": gb}
+    monkeypatch.setattr(router, "nodes", [node])
+    monkeypatch.setattr(res, "RESIDENCY_MEMORY_BUDGET_MB", 1024)
+
+    async def scenario():
+        manager = res.ResidencyManager()
+        released = []
+
+        async def generate(url, payload):
+            if payload.get("keep_alive") == 0:
+                released.append(payload["model"])
+            return {"load_duration": 0}
+
+        manager._generate = generate
+        manager._state("old").last_used = time.monotonic() - 3600
+        await manager._load(manager._state("compare"))  # preloaded, never used yet
+        manager._state("coming").loading = asyncio.ensure_future(asyncio.sleep(10))
+        await manager.tick()
+        manager._state("coming").loading.cancel()
+        return released
+
+    assert asyncio.run(scenario()) == ["old:latest"]
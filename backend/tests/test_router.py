@@ -0,0 +1,102 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+from backend import ollama_client as oc
+from backend.ollama_router import ROUTER_FAIL_THRESHOLD, NodeBusy, router
+from backend.tests.conftest import MODEL, free_port
+
+def _generate(n=1, schema=oc.SCHEMAS["explained"]):
+    async def scenario():
+        try:
+            return await asyncio.gather(*(oc._apost(f"Rate resume {i}", model=MODEL, timeout=10, num_ctx=512,
+                                                    num_predict=120, schema=schema) for i in range(n)))
+        finally:
+            await oc.aclose_client()
+    return asyncio.run(scenario())
+
+def test_limit_is_per_node(nodes):
+    a, b = nodes("http://a", "http://b")
+    assert {router.pick(MODEL, limit=1), router.pick(MODEL, limit=1)} == {a, b}
+    with pytest.raises(NodeBusy):
+        router.pick(MODEL, limit=1)
+    router.done(a, MODEL, elapsed=0.1)
+    assert router.pick(MODEL, limit=1) is a
+
+def test_circuit_opens_then_allows_one_trial(nodes):
+    a, b = nodes("http://a", "http://b")
+    for _ in range(ROUTER_FAIL_THRESHOLD):
+        router.done(router.pick(MODEL, exclude=[b]), MODEL, error=RuntimeError("boom"))
+    assert a.circuit(time.monotonic()) == "open"
+    assert router.pick(MODEL) is b
+    a.open_until = time.monotonic() - 1  # the open period is over
+    assert router.pick(MODEL, exclude=[b]) is a  # the half-open trial
+    assert router.pick(MODEL) is b  # no second trial while the first runs
+    router.done(a, MODEL, elapsed=0.1)
+    assert a.circuit(time.monotonic()) == "closed"
+
+def test_failover_to_live_node(fake_urls, nodes):
+    dead, live = nodes(f"http://127.0.0.1:{free_port()}", fake_urls[0])
+    dead.resident.add(MODEL)  # ranked first
+    data, = _generate()
+    assert '"score"' in data["response"]
+    assert (dead.stats["errors"], dead.stats["retried_elsewhere"], live.stats["requests"]) == (1, 1, 1)
+
+def test_concurrency_spreads_within_node_limits(fake_urls, nodes, monkeypatch):
+    a, b = nodes(*fake_urls[:2])
+    seen = []
+    reserve = router._reserve
+
+    def watch(node, model):
+        reserve(node, model)
+        seen.append(node.running[model])
+
+    monkeypatch.setattr(router, "_reserve", watch)
+    monkeypatch.setattr(oc, "OLLAMA_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(oc, "_async_slots", {})
+    assert len(_generate(8)) == 8
+    assert max(seen) == 2
+    assert a.stats["requests"] and b.stats["requests"]
+
+def test_failover_after_first_token(fake_urls, nodes):
+    broken, live = nodes(fake_urls[3], fake_urls[0])
+    broken.resident.add(MODEL)  # ranked first
+    data, = _generate()
+    assert json.loads(data["response"])["score"]
+    assert (broken.stats["retried_elsewhere"], live.stats["requests"]) == (1, 1)
+
+def test_early_stop_reports_durations(fake_urls, nodes):
+    node, = nodes(fake_urls[2])
+    data, = _generate(schema=None)  # plain "json" format: the fake pads after the object
+    assert data["done_reason"] == "object_closed"
+    assert data["eval_count"] and data["eval_duration"] > 0
+    assert data["load_duration"] > 0 and data["prompt_eval_duration"] == 0  # not resident yet: counted as load
+    data, = _generate(schema=None)
+    assert data["load_duration"] == 0 and data["prompt_eval_duration"] > 0
+
+def test_sync_pick_gives_up_at_the_timeout(nodes):
+    node, = nodes("http://a")
+    router.pick(MODEL, limit=1)  # the node's only slot
+    started = time.monotonic()
+    with pytest.raises(NodeBusy):
+        oc._pick(MODEL, [], 0.2)
+    assert 0.2 <= time.monotonic() - started < 1
+    router.done(node, MODEL, elapsed=0.1)
+    assert oc._pick(MODEL, [], 0.2) is node
+
+def test_our_own_deadline_is_not_a_node_failure(fake_urls, nodes):
+    slow, = nodes(fake_urls[4])
+
+    async def scenario():
+        try:
+            for _ in range(ROUTER_FAIL_THRESHOLD):
+                with pytest.raises(asyncio.TimeoutError):
+                    await oc._apost("Rate resume", model=MODEL, timeout=0.2, num_ctx=512, num_predict=50)
+        finally:
+            await oc.aclose_client()
+
+    asyncio.run(scenario())
+    assert (slow.failures, slow.stats["errors"], slow.outstanding) == (0, 0, 0)
+    assert slow.circuit(time.monotonic()) == "closed"
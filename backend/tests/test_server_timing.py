@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+from backend import main, metrics
+
+JD = "Senior DevOps Engineer. Requirements:\n- Kubernetes\n- Terraform"
+
+def test_every_request_reports_its_own_model_stages(fake_urls, nodes, db, monkeypatch):
+    nodes(fake_urls[0])
+    monkeypatch.setattr(metrics, "METRICS_SERVER_TIMING", True)
+    monkeypatch.setattr(main, "AUTO_WARMUP", "0")
+    headers = []
+    with TestClient(main.app) as client:
+        for i in range(3):
+            # a different resume each time, so none is a cache hit
+            resume = f"Candidate {i}\nSkills\nKubernetes, Terraform, {i} years of Go."
+            r = client.post("/resume/upload", files={"file": (f"cv{i}.txt", resume, "text/plain")},
+                            data={"job_title": "DevOps", "job_description": JD})
+            assert r.status_code == 200, r.text
+            headers.append(r.headers["server-timing"])
+    for header in headers:
+        stages = {part.split(";")[0].strip() for part in header.split(",")}
+        assert {"queue", "ollama", "decode"} <= stages, header
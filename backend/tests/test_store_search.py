@@ -0,0 +1,12 @@
+def _put(db, i, text):
+    resume_id, _ = db.resume_put(content_hash=f"c{i}", text_hash=f"t{i}", filename=f"{i}.txt",
+                                 content_type="text/plain", size=len(text), text=text, packed=text, anonymized=text)
+    return resume_id
+
+def test_search_within_ids_finds_low_ranked_matches(db):
+    strong = [_put(db, i, "kubernetes " * 20 + "terraform") for i in range(5)]
+    weak = _put(db, 9, "Some kubernetes once, mostly Java and Spring.")
+    hits = db.resume_search("kubernetes", limit=1, ids=[weak])
+    assert [r["id"] for r in hits] == [weak]
+    assert {r["id"] for r in db.resume_search("kubernetes", limit=10)} == set(strong) | {weak}
+    assert db.resume_search("terraform", limit=5, ids=[weak]) == []
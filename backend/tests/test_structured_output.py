@@ -0,0 +1,80 @@
+import json
+import asyncio
+
+from backend import ollama_client as oc
+
+def _scripted(monkeypatch, answers):
+    """Replace _apost with canned responses; returns the prompts it was sent."""
+    prompts = []
+
+    async def fake_apost(prompt, **kw):
+        prompts.append(prompt)
+        response, reason = answers.pop(0)
+        return {"response": response, "done_reason": reason, "eval_count": 50}
+
+    monkeypatch.setattr(oc, "_apost", fake_apost)
+    return prompts
+
+def _run(variant, n=1):
+    return asyncio.run(oc._agenerate_json(variant, "PROMPT", model="m", timeout=60, num_ctx=1024, n=n))
+
+GOOD = {"score": 72, "summary": "Fits", "evidence": [{"requirement": "Go", "match": "3y"}], "risks": []}
+
+def test_missing_score_is_regenerated_not_repaired(monkeypatch):
+    prompts = _scripted(monkeypatch, [('{"summary": "Fits the ro', "stop"), (json.dumps(GOOD), "stop")])
+    parsed, _, outcome = _run("explained")
+    assert (parsed["score"], outcome) == (72, "regenerated")
+    assert prompts == ["PROMPT", "PROMPT"]
+
+def test_repair_keeps_only_stated_values(monkeypatch):
+    broken = '{"score": 72, "summary": "Fits", "evidence": [{"requirement": "Go", "match": "3y"}], "risks": ["No'
+    invented = {**GOOD, "evidence": GOOD["evidence"] + [{"requirement": "AWS", "match": "5y"}], "risks": ["No Rust"]}
+    prompts = _scripted(monkeypatch, [(broken, "stop"), (json.dumps(invented), "stop")])
+    parsed, _, outcome = _run("explained")
+    assert outcome == "repaired"
+    assert parsed["score"] == 72
+    assert parsed["evidence"] == GOOD["evidence"]
+    assert parsed["risks"] == []
+    assert "TEXT:" in prompts[1]
+
+def test_repair_changing_the_score_falls_back(monkeypatch):
+    broken = '{"score": 72, "summary": "Fits", "evidence": []'
+    _scripted(monkeypatch, [(broken, "stop"), (json.dumps({**GOOD, "score": 90}), "stop")])
+    parsed, _, outcome = _run("explained")
+    assert (parsed["score"], outcome) == (0, "fallback")
+
+def test_repaired_verdicts_cover_only_judged_ids(monkeypatch):
+    broken = '{"requirements": [{"id": 1, "met": "yes", "match": "AKS"}, {"id": 2, "me'
+    invented = {"requirements": [{"id": 1, "met": "yes", "match": "AKS"}, {"id": 2, "met": "no", "match": ""},
+                                 {"id": 3, "met": "yes", "match": "Go"}]}
+    _scripted(monkeypatch, [(broken, "stop"), (json.dumps(invented), "stop")])
+    verdicts = asyncio.run(oc.generate_requirement_matches_async(
+        resume_text="AKS", requirements=["Kubernetes", "Terraform", "Go"], model="m", timeout=60,
+    ))
+    assert verdicts == [{"met": "yes", "match": "AKS", "repaired": True}, None, None]
+
+def _timed(monkeypatch, answers, seconds):
+    """Like _scripted, each answer taking `seconds`; returns the timeouts the attempts were given."""
+    timeouts = []
+
+    async def fake_apost(prompt, **kw):
+        timeouts.append(kw["timeout"])
+        await asyncio.sleep(seconds)
+        response, reason = answers.pop(0)
+        return {"response": response, "done_reason": reason, "eval_count": 50}
+
+    monkeypatch.setattr(oc, "_apost", fake_apost)
+    return timeouts
+
+def test_attempts_share_one_deadline(monkeypatch):
+    monkeypatch.setattr(oc, "RETRY_MIN_SECONDS", 0.05)
+    timeouts = _timed(monkeypatch, [('{"summary": "Fits the ro', "stop"), (json.dumps(GOOD), "stop")], 0.1)
+    parsed, _, outcome = asyncio.run(oc._agenerate_json("explained", "PROMPT", model="m", timeout=1, num_ctx=1024))
+    assert outcome == "regenerated"
+    assert timeouts[0] == 1 and timeouts[1] < 0.95  # the first attempt used ~0.1 s of it
+
+def test_no_retry_without_time_left(monkeypatch):
+    monkeypatch.setattr(oc, "RETRY_MIN_SECONDS", 0.5)
+    timeouts = _timed(monkeypatch, [('{"summary": "Fits the ro', "stop")], 0.6)
+    parsed, _, outcome = asyncio.run(oc._agenerate_json("explained", "PROMPT", model="m", timeout=1, num_ctx=1024))
+    assert (parsed["score"], outcome, len(timeouts)) == (0, "fallback", 1)